@@ -1,18 +1,69 @@
 # -*- coding: utf-8 -*-
+import click
 from flask import (
+    current_app,
     Flask,
     jsonify,
     Response,
 )
+from flask.cli import with_appcontext
 from pydantic import ValidationError
 from werkzeug.exceptions import HTTPException
+from werkzeug.utils import import_string
 
 from .models import db
+from .deadlines import RequestDeadline
+from .events import EventBroker
 from .exceptions import BaseLocalException
-from . import (
-    settings,
-    views,
+from .free_window_cache import FreeWindowCache
+from .jobs import (
+    jobs_worker_command,
+    JobQueue,
 )
+from .metrics import (
+    Metrics,
+    register_cache,
+)
+from .profiling import RequestProfiler
+from .rate_limiting import RateLimiter
+from .routing import (
+    ReadReplicaRouting,
+    REPLICA_BIND,
+)
+from .schema import (
+    create_schema,
+    db_init_command,
+)
+from .seed import seed_command
+from .sharding import Shards
+from .sql_tracing import SlowQueryLog
+from .timing import ServerTiming
+from .traffic import (
+    replay_command,
+    TrafficCapture,
+)
+from . import settings
+
+
+class LazyView:
+    # imports the view on its first request: views pull in forms, logic and db_actions, which a worker
+    # does not need to import before it serves anything
+    def __init__(self, import_name: str, endpoint: str):
+        self.import_name = import_name
+        self.__name__ = endpoint  # flask takes the endpoint from it
+        self.view = None
+
+    def __call__(self, **kwargs) -> Response:
+        if self.view is None:
+            view = import_string(self.import_name)
+            self.view = view.as_view(self.__name__) if hasattr(view, 'as_view') else view
+        return self.view(**kwargs)
+
+
+def recurrence_rules_cache_info() -> tuple:
+    # app.recurrence is imported by views, so not before the first request
+    from .recurrence import compile_rule
+    return compile_rule.cache_info()
 
 
 def pydantic_validation_error_handler(error: ValidationError) -> (Response, int):
@@ -27,25 +78,124 @@ def local_exception_handler(error: BaseLocalException) -> (Response, int):
     return jsonify(dict(status='error', error=error.args[0])), error.code
 
 
+@click.command('reminders')
+@with_appcontext
+def reminders_command() -> None:
+    """Log reminders of meetings until stopped, run a single such process."""
+    from .notifications import ReminderScheduler  # imports app.logic
+    ReminderScheduler(current_app).work(current_app._get_current_object())
+
+
 def create_app(test_config: dict = None) -> Flask:
     app = Flask(__name__)
     app.config['SQLALCHEMY_DATABASE_URI'] = settings.SQLALCHEMY_DATABASE_URI
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['READ_REPLICA_DATABASE_URI'] = settings.READ_REPLICA_DATABASE_URI
+    app.config['READ_YOUR_WRITES_WINDOW'] = settings.READ_YOUR_WRITES_WINDOW
+    app.config['SHARD_DATABASE_URIS'] = settings.SHARD_DATABASE_URIS
+    app.config['REMINDERS_POLL_INTERVAL'] = settings.REMINDERS_POLL_INTERVAL
+    app.config['CAPTURE_FILE'] = settings.CAPTURE_FILE
+    app.config['CAPTURE_AUTHORIZATION'] = settings.CAPTURE_AUTHORIZATION
+    app.config['FREE_WINDOW_HORIZON'] = settings.FREE_WINDOW_HORIZON
+    app.config['FREE_WINDOW_EXPANSION_BUDGET'] = settings.FREE_WINDOW_EXPANSION_BUDGET
+    app.config['FREE_WINDOW_CACHE_SIZE'] = settings.FREE_WINDOW_CACHE_SIZE
+    app.config['FREE_WINDOW_CACHE_BUCKET'] = settings.FREE_WINDOW_CACHE_BUCKET
+    app.config['SERVER_TIMING_ENABLED'] = settings.SERVER_TIMING_ENABLED
+    app.config['REQUEST_DEADLINE'] = settings.REQUEST_DEADLINE
+    app.config['REQUEST_DEADLINE_MAX'] = settings.REQUEST_DEADLINE_MAX
+    app.config['SLOW_QUERY_THRESHOLD'] = settings.SLOW_QUERY_THRESHOLD
+    app.config['SLOW_QUERY_EXPLAIN'] = settings.SLOW_QUERY_EXPLAIN
+    app.config['REPEATED_QUERY_THRESHOLD'] = settings.REPEATED_QUERY_THRESHOLD
+    app.config['METRICS_ENABLED'] = settings.METRICS_ENABLED
+    app.config['METRICS_DIR'] = settings.METRICS_DIR
+    app.config['METRICS_FLUSH_INTERVAL'] = settings.METRICS_FLUSH_INTERVAL
+    app.config['PROFILING_TOKEN'] = settings.PROFILING_TOKEN
+    app.config['PROFILING_DIR'] = settings.PROFILING_DIR
+    app.config['PROFILING_TOP'] = settings.PROFILING_TOP
+    app.config['CREATE_SCHEMA_ON_STARTUP'] = settings.CREATE_SCHEMA_ON_STARTUP
+    app.config['RATE_LIMIT_DATABASE'] = settings.RATE_LIMIT_DATABASE
+    app.config['RATE_LIMIT_CAPACITY'] = settings.RATE_LIMIT_CAPACITY
+    app.config['RATE_LIMIT_RATE'] = settings.RATE_LIMIT_RATE
+    app.config['RATE_LIMIT_COSTS'] = settings.RATE_LIMIT_COSTS
+    app.config['RATE_LIMIT_CONCURRENCY'] = settings.RATE_LIMIT_CONCURRENCY
+    app.config['RATE_LIMIT_SLOT_TIMEOUT'] = settings.RATE_LIMIT_SLOT_TIMEOUT
+    app.config['RATE_LIMIT_CREDENTIALS_TTL'] = settings.RATE_LIMIT_CREDENTIALS_TTL
+    app.config['WARMUP_ENABLED'] = settings.WARMUP_ENABLED
+    app.config['WARMUP_USERS'] = settings.WARMUP_USERS
+    app.config['WARMUP_IN_BACKGROUND'] = settings.WARMUP_IN_BACKGROUND
+    app.config['MEETING_CHANGES_LIMIT'] = settings.MEETING_CHANGES_LIMIT
+    app.config['EVENTS_ENABLED'] = settings.EVENTS_ENABLED
+    app.config['EVENTS_POLL_INTERVAL'] = settings.EVENTS_POLL_INTERVAL
+    app.config['EVENTS_STREAM_TIMEOUT'] = settings.EVENTS_STREAM_TIMEOUT
+    app.config['EVENTS_RETENTION'] = settings.EVENTS_RETENTION
+    app.config['JOBS_DATABASE'] = settings.JOBS_DATABASE
+    app.config['JOBS_WORKER_CONCURRENCY'] = settings.JOBS_WORKER_CONCURRENCY
+    app.config['JOBS_POLL_INTERVAL'] = settings.JOBS_POLL_INTERVAL
+    app.config['JOBS_STALE_TIMEOUT'] = settings.JOBS_STALE_TIMEOUT
+    app.config['JOBS_MAX_ATTEMPTS'] = settings.JOBS_MAX_ATTEMPTS
     if test_config is not None:
         app.config.update(test_config)
+    if app.config['READ_REPLICA_DATABASE_URI']:
+        app.config['SQLALCHEMY_BINDS'] = dict(
+            app.config.get('SQLALCHEMY_BINDS') or {},
+            **{REPLICA_BIND: app.config['READ_REPLICA_DATABASE_URI']},
+        )
     db.init_app(app)
 
-    # TODO proper migrations in case of actually using this app
-    with app.app_context():
-        db.create_all()
-
-    app.add_url_rule('/ping', view_func=views.ping, methods=['GET'])
-    app.add_url_rule('/users', view_func=views.UsersView.as_view('users'), methods=['POST'])
-    app.add_url_rule('/users/<username>/meetings', view_func=views.UserMeetingsForRangeView.as_view('user_meetings'), methods=['GET'])
-    app.add_url_rule('/meetings', view_func=views.MeetingsView.as_view('meetings'), methods=['POST'])
-    app.add_url_rule('/meetings/<int:meeting_id>', view_func=views.MeetingsView.as_view('get_meeting'), methods=['GET'])
-    app.add_url_rule('/invitations', view_func=views.AnswerInvitationView.as_view('answer_invitations'), methods=['POST'])
-    app.add_url_rule('/find_free_window_for_users', view_func=views.FindFreeWindowForUsersView.as_view('find_free_window'), methods=['GET'])
+    if app.config['SHARD_DATABASE_URIS']:
+        Shards(app)
+    if app.config['CREATE_SCHEMA_ON_STARTUP']:
+        create_schema(app)
+    if app.config['READ_REPLICA_DATABASE_URI']:
+        ReadReplicaRouting(app)
+    if app.config['EVENTS_ENABLED']:
+        EventBroker(app)
+    if app.config['JOBS_DATABASE']:
+        JobQueue(app)
+    if app.config['FREE_WINDOW_CACHE_SIZE']:
+        FreeWindowCache(app)
+    if app.config['CAPTURE_FILE']:
+        TrafficCapture(app)
+    if app.config['SERVER_TIMING_ENABLED']:
+        ServerTiming(app)
+    if app.config['SLOW_QUERY_THRESHOLD'] is not None:
+        SlowQueryLog(app)
+    if app.config['METRICS_ENABLED']:
+        Metrics(app)
+        register_cache('recurrence_rules', recurrence_rules_cache_info)
+        if 'free_window_cache' in app.extensions:
+            register_cache('free_windows', app.extensions['free_window_cache'].cache_info)
+    if app.config['PROFILING_TOKEN']:
+        RequestProfiler(app)
+    # after the instrumentation, before_request hooks which answer by themselves skip the hooks registered later
+    if app.config['REQUEST_DEADLINE'] is not None:
+        RequestDeadline(app)
+    if app.config['RATE_LIMIT_DATABASE']:
+        RateLimiter(app)
+    if app.config['WARMUP_ENABLED']:
+        from .warmup import Warmup  # imports app.db_actions and app.logic
+        Warmup(app)
+
+    app.add_url_rule('/ping', view_func=LazyView('app.views.ping', 'ping'), methods=['GET'])
+    app.add_url_rule('/ready', view_func=LazyView('app.views.ready', 'ready'), methods=['GET'])
+    app.add_url_rule('/users', view_func=LazyView('app.views.UsersView', 'users'), methods=['POST'])
+    app.add_url_rule('/users/<username>/meetings', view_func=LazyView('app.views.UserMeetingsForRangeView', 'user_meetings'), methods=['GET'])
+    app.add_url_rule('/users/<username>/meetings/changes', view_func=LazyView('app.views.UserMeetingChangesView', 'user_meeting_changes'), methods=['GET'])
+    if 'event_broker' in app.extensions:
+        app.add_url_rule('/users/<username>/events', view_func=LazyView('app.views.UserEventsView', 'user_events'), methods=['GET'])
+    app.add_url_rule('/meetings', view_func=LazyView('app.views.MeetingsView', 'meetings'), methods=['POST'])
+    app.add_url_rule('/meetings/<int:meeting_id>', view_func=LazyView('app.views.MeetingsView', 'get_meeting'), methods=['GET'])
+    app.add_url_rule('/invitations', view_func=LazyView('app.views.AnswerInvitationView', 'answer_invitations'), methods=['POST'])
+    app.add_url_rule('/find_free_window_for_users', view_func=LazyView('app.views.FindFreeWindowForUsersView', 'find_free_window'), methods=['GET'])
+    if 'job_queue' in app.extensions:
+        app.add_url_rule('/jobs', view_func=LazyView('app.views.JobsView', 'jobs'), methods=['POST'])
+        app.add_url_rule('/jobs/<int:job_id>', view_func=LazyView('app.views.JobsView', 'get_job'), methods=['GET'])
+
+    app.cli.add_command(db_init_command)
+    app.cli.add_command(seed_command)
+    app.cli.add_command(replay_command)
+    app.cli.add_command(jobs_worker_command)
+    app.cli.add_command(reminders_command)
 
     app.register_error_handler(400, error_handler)
     app.register_error_handler(401, error_handler)
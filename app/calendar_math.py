@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+# utc calendar arithmetic on integers: days since 1970-01-01 and unix timestamps, without datetime objects
+from typing import Iterator
+
+DAY = 60 * 60 * 24
+WEEK = 7 * DAY
+
+_MONTH_LENGTHS = (
+    (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31),
+    (31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31),
+)
+# days before the first day of a month, by leap year flag and month - 1
+_DAYS_BEFORE_MONTH = tuple(
+    tuple(sum(lengths[:month]) for month in range(12)) for lengths in _MONTH_LENGTHS
+)
+_FIRST_MONDAY = 4  # 1970-01-05
+
+
+def is_leap_year(year: int) -> bool:
+    return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+
+
+def days_in_month(year: int, month: int) -> int:
+    return _MONTH_LENGTHS[is_leap_year(year)][month - 1]
+
+
+def days_from_civil(year: int, month: int, day: int) -> int:
+    previous = year - 1
+    days_before_year = previous * 365 + previous // 4 - previous // 100 + previous // 400 - 719162
+    return days_before_year + _DAYS_BEFORE_MONTH[is_leap_year(year)][month - 1] + day - 1
+
+
+def civil_from_days(days: int) -> tuple[int, int, int]:
+    # years are counted from march, so that february, the only month of variable length, is the last one
+    days += 719468
+    era = days // 146097
+    day_of_era = days - era * 146097
+    year_of_era = (day_of_era - day_of_era // 1460 + day_of_era // 36524 - day_of_era // 146096) // 365
+    day_of_year = day_of_era - (365 * year_of_era + year_of_era // 4 - year_of_era // 100)
+    mp = (5 * day_of_year + 2) // 153
+    day = day_of_year - (153 * mp + 2) // 5 + 1
+    month = mp + (3 if mp < 10 else -9)
+    return year_of_era + era * 400 + (month <= 2), month, day
+
+
+def weekday(days: int) -> int:
+    return (days + 3) % 7  # monday is 0, 1970-01-01 was thursday
+
+
+def add_months(timestamp: int, months: int) -> int:
+    # the day of month is clamped to the length of the resulting month: jan 31 + 1 month is feb 28 (or 29),
+    # feb 29 + 12 months is feb 28 of the next year; the time of day is kept
+    days, seconds = divmod(timestamp, DAY)
+    year, month, day = civil_from_days(days)
+    year, month = divmod(year * 12 + month - 1 + months, 12)
+    month += 1
+    return days_from_civil(year, month, min(day, days_in_month(year, month))) * DAY + seconds
+
+
+def iterate_months(timestamp: int, step: int, first: int = 0) -> Iterator[int]:
+    # add_months(timestamp, step * i) for i = first, first + 1, ..., without converting the timestamp every time
+    days, seconds = divmod(timestamp, DAY)
+    year, month, day = civil_from_days(days)
+    index = year * 12 + month - 1 + first * step
+    while True:
+        year, month = divmod(index, 12)
+        leap = year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+        previous = year - 1
+        days = (
+            previous * 365 + previous // 4 - previous // 100 + previous // 400 - 719162
+            + _DAYS_BEFORE_MONTH[leap][month] + min(day, _MONTH_LENGTHS[leap][month]) - 1
+        )
+        yield days * DAY + seconds
+        index += step
+
+
+def month_index(timestamp: int) -> int:
+    # months since year 0, so that the difference of two indices is the number of calendar months between them
+    year, month, _ = civil_from_days(timestamp // DAY)
+    return year * 12 + month - 1
+
+
+def _working_day_number(days: int) -> int:
+    # working days are numbered in a row, saturday and sunday get the number of the following monday
+    weeks, day_of_week = divmod(days - _FIRST_MONDAY, 7)
+    return weeks * 5 + min(day_of_week, 5)
+
+
+def _day_of_working_day_number(number: int) -> int:
+    weeks, day_of_week = divmod(number, 5)
+    return _FIRST_MONDAY + weeks * 7 + day_of_week
+
+
+def add_working_days(timestamp: int, count: int) -> int:
+    # count steps to the next working day; from a weekend the first step goes to monday
+    if count == 0:
+        return timestamp
+    days, seconds = divmod(timestamp, DAY)
+    number = _working_day_number(days) - (weekday(days) >= 5)
+    return _day_of_working_day_number(number + count) * DAY + seconds
+
+
+def iterate_working_days(timestamp: int, first: int = 0) -> Iterator[int]:
+    # add_working_days(timestamp, i) for i = first, first + 1, ...
+    timestamp = add_working_days(timestamp, first)
+    day_of_week = weekday(timestamp // DAY)
+    yield timestamp  # only the first one may be a weekend
+    if day_of_week >= 5:
+        timestamp += (7 - day_of_week) * DAY
+        day_of_week = 0
+        yield timestamp
+    while True:
+        if day_of_week == 4:
+            timestamp += 3 * DAY
+            day_of_week = 0
+        else:
+            timestamp += DAY
+            day_of_week += 1
+        yield timestamp
+
+
+def count_working_days(timestamp: int, not_before: int) -> int:
+    # the smallest count for which add_working_days(timestamp, count) is not before not_before
+    if timestamp >= not_before:
+        return 0
+    days, seconds = divmod(timestamp, DAY)
+    target = -((seconds - not_before) // DAY)  # the first day on which the time of day is not before not_before
+    return _working_day_number(target) - _working_day_number(days) + (weekday(days) >= 5)
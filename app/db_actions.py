@@ -1,26 +1,110 @@
 # -*- coding: utf-8 -*-
+from dataclasses import dataclass
 from datetime import (
     datetime,
     timezone,
 )
+import heapq
+import json
+import time
+from typing import Iterator
+
 from sqlalchemy import (
+    delete,
+    func,
+    insert,
     or_,
+    select,
+    tuple_,
+    union,
+    union_all,
+    update,
+)
+from sqlalchemy.engine import Row
+from sqlalchemy.sql import (
+    CompoundSelect,
+    Executable,
+    Select,
 )
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import (
+    object_session,
+    selectinload,
+    Session,
+)
 
+from . import request_stats
 from .exceptions import (
     AlreadyExistsException,
+    BadRequestException,
     NotFoundException,
 )
-from .types import RepeatTypeEnum
+from .events import get_event_broker
+from .types import (
+    EventKindEnum,
+    RepeatTypeEnum,
+)
 from .models import (
+    ChangeSequence,
     db,
+    Event,
     Invitation,
     Meeting,
     User,
 )
+from .sharding import get_shards
+
+IN_CHUNK_SIZE = 500  # sqlite limits number of query parameters
+STREAM_CHUNK_SIZE = 100
+
+
+@dataclass
+class MeetingChanges:
+    meetings: list[Meeting]
+    sync_token: list[tuple[int, int]]  # updated_seq and id of the last meeting seen in every database
+    more: bool  # not all changes fit into the limit
+
+
+@dataclass
+class UserEvents:
+    events: list[tuple[int, Event]]  # index of the database and the event
+    more: bool  # not all events fit into the limit
+
+
+def _bump_calendar_versions(session: Session, user_ids: list[int]) -> None:
+    # in the transaction of the change; users are copied to every shard, so with sharding every shard counts changes
+    # of its own meetings and a version of the user is the sum over shards, see get_calendar_versions
+    session.execute(
+        update(User).where(User.id.in_(user_ids)).values(calendar_version=User.calendar_version + 1),
+        execution_options={'synchronize_session': False},
+    )
 
 
+def _next_change_seq(session: Session) -> int:
+    # like meeting ids with sharding, the row is inserted in the transaction of the change, so numbers are never
+    # reused and, as sqlite runs writes one at a time, changes are committed in the order of their numbers
+    return session.execute(insert(ChangeSequence)).inserted_primary_key[0]
+
+
+def _log_events(session: Session, events: list[dict]) -> None:
+    # in the transaction of the change, with sharding every shard has events of its own meetings with its own ids;
+    # rows are dicts of user_id, kind, data
+    broker = get_event_broker()
+    if broker is None:
+        return
+    now = int(time.time())
+    session.execute(insert(Event), [dict(event, data=json.dumps(event['data']), created=now) for event in events])
+    if broker.prune_due(len(events)):
+        session.execute(delete(Event).where(Event.created < now - broker.retention))
+
+
+def _publish_events(user_ids: list[int]) -> None:
+    broker = get_event_broker()
+    if broker is not None:
+        broker.publish(user_ids)
+
+
+@request_stats.timed('db')
 def get_user_by_name(name: str) -> User:
     user = db.session.query(User).filter_by(name=name).first()
     if user is None:
@@ -28,6 +112,55 @@ def get_user_by_name(name: str) -> User:
     return user
 
 
+@request_stats.timed('db')
+def get_user_by_id(id: int) -> User:
+    user = db.session.get(User, id)
+    if user is None:
+        raise NotFoundException('User with id "{}" does not exist'.format(id))
+    return user
+
+
+@request_stats.timed('db')
+def get_users_by_names(names: list[str]) -> list[User]:
+    # one query per IN_CHUNK_SIZE names instead of one per name; users are returned in the order of names,
+    # repeated names are returned once
+    names = list(dict.fromkeys(names))
+    users = {}
+    for i in range(0, len(names), IN_CHUNK_SIZE):
+        for user in db.session.query(User).filter(User.name.in_(names[i:i + IN_CHUNK_SIZE])):
+            users[user.name] = user
+    missing = [name for name in names if name not in users]
+    if len(missing) == 1:
+        raise NotFoundException('User "{}" does not exist'.format(missing[0]))
+    if missing:
+        raise NotFoundException('Users {} do not exist'.format(', '.join('"{}"'.format(name) for name in missing)))
+    return [users[name] for name in names]
+
+
+@request_stats.timed('db')
+def get_most_active_users(limit: int) -> list[User]:
+    # users with the most meetings, created or invited to, the most active first; with sharding every shard
+    # contributes its own top, which is close enough to the overall one
+    meetings = union_all(
+        select(Meeting.creator_id.label('user_id')),
+        select(Invitation.invitee_id.label('user_id')),
+    ).subquery()
+    count = func.count().label('count')
+    statement = select(meetings.c.user_id, count).group_by(meetings.c.user_id).order_by(count.desc()).limit(limit)
+    shards = get_shards()
+    if shards is None:
+        rows = db.session.execute(statement).all()
+    else:
+        rows = shards.map(lambda session: session.execute(statement).all())
+    counts = {}
+    for row in rows:
+        counts[row.user_id] = counts.get(row.user_id, 0) + row.count
+    user_ids = sorted(counts, key=lambda user_id: (-counts[user_id], user_id))[:limit]
+    users = {user.id: user for user in db.session.query(User).filter(User.id.in_(user_ids))}
+    return [users[user_id] for user_id in user_ids if user_id in users]
+
+
+@request_stats.timed('db')
 def create_user(name: str, password: str) -> User:
     try:
         user = User(
@@ -36,11 +169,15 @@ def create_user(name: str, password: str) -> User:
         )
         db.session.add(user)
         db.session.commit()
-        return user
     except IntegrityError:
         raise AlreadyExistsException('user already exists')
+    shards = get_shards()
+    if shards is not None:
+        shards.add_user(user)
+    return user
 
 
+@request_stats.timed('db')
 def create_meeting(
         creator: User,
         start: int | datetime,
@@ -48,7 +185,9 @@ def create_meeting(
         description: str = None,
         invitees: list[User] = None,
         repeat_type: RepeatTypeEnum = RepeatTypeEnum.none,
+        recurrence_rule: str = None,
         is_private: bool = None,
+        remind_before: int = None,
 ) -> Meeting:
     if isinstance(start, datetime):
         assert start.tzinfo is not None
@@ -58,58 +197,331 @@ def create_meeting(
         end = int(end.astimezone(tz=timezone.utc).timestamp())
     if invitees is None:
         invitees = []
+    shards = get_shards()
+    if shards is None:
+        session = db.session
+        meeting_id = None
+    else:
+        index = shards.index_for_user(creator.id)
+        session = shards.session(index)
+        meeting_id = shards.allocate_meeting_id(index)
+        # users are copied to every shard, so the creator object is just moved to the shard session
+        creator = session.merge(creator, load=False)
+    updated_seq = _next_change_seq(session)
     meeting = Meeting(
+        id=meeting_id,
         creator=creator,
         start=start,
         end=end,
         description=description,
         repeat_type=repeat_type,
+        recurrence_rule=recurrence_rule,
         is_private=is_private,
+        remind_before=remind_before,
+        updated_seq=updated_seq,
     )
-    db.session.add(meeting)
+    session.add(meeting)
+    session.flush()  # to get meeting id
+    if invitees:
+        session.execute(insert(Invitation), [
+            dict(meeting_id=meeting.id, invitee_id=invitee.id, updated_seq=updated_seq) for invitee in invitees
+        ])
+    user_ids = [creator.id] + [invitee.id for invitee in invitees]  # objects are expired by the commit
+    _bump_calendar_versions(session, user_ids)
+    events = [dict(user_id=creator.id, kind=EventKindEnum.meeting_created, data=dict(meeting_id=meeting.id))]
+    events.extend(
+        dict(user_id=invitee.id, kind=EventKindEnum.invited, data=dict(meeting_id=meeting.id, creator=creator.name))
+        for invitee in invitees
+    )
+    _log_events(session, events)
+    session.commit()
+    _publish_events(user_ids)
+    return meeting
 
-    for invitee in invitees:
-        db.session.add(Invitation(invitee=invitee, meeting=meeting))
 
-    db.session.add(meeting)
-    db.session.commit()
-    return meeting
+@request_stats.timed('db')
+def get_calendar_versions(users: list[User]) -> tuple[int, ...]:
+    # calendar versions of the users in the order of their ids, they grow with every change of the users meetings
+    shards = get_shards()
+    if shards is None:
+        return tuple(version for _, version in sorted((user.id, user.calendar_version) for user in users))
+    user_ids = sorted(user.id for user in users)
+    statement = select(User.id, User.calendar_version).where(User.id.in_(user_ids))
+    versions = dict.fromkeys(user_ids, 0)
+    for user_id, version in shards.map(lambda session: session.execute(statement).all()):
+        versions[user_id] += version
+    return tuple(versions[user_id] for user_id in user_ids)
 
 
+@request_stats.timed('db')
 def get_meeting_by_id(id: int) -> Meeting:
-    meeting = db.session.query(Meeting).filter_by(id=id).first()
+    shards = get_shards()
+    session = db.session if shards is None else shards.session(shards.index_for_meeting(id))
+    meeting = session.query(Meeting).filter_by(id=id).first()
     if meeting is None:
         raise NotFoundException('Meeting with id "{}" does not exist'.format(id))
     return meeting
 
 
+@request_stats.timed('db')
 def get_invitation(invitee: User, meeting: Meeting) -> Invitation:
-    invitation = db.session.query(Invitation).filter_by(invitee=invitee, meeting=meeting).first()
+    invitation = object_session(meeting).query(Invitation).filter_by(invitee_id=invitee.id, meeting=meeting).first()
     if invitation is None:
         raise NotFoundException('User was not invited to this meeting')
     return invitation
 
 
+@request_stats.timed('db')
 def set_answer_for_invitation(invitee: User, meeting: Meeting, answer: bool) -> None:
+    session = object_session(meeting)
     get_invitation(invitee=invitee, meeting=meeting).answer = answer
-    db.session.commit()
+    # all invitations of the meeting get the number, its other invitees see the answer in their changes too
+    meeting.updated_seq = _next_change_seq(session)
+    session.execute(
+        update(Invitation).where(Invitation.meeting_id == meeting.id).values(updated_seq=meeting.updated_seq),
+        execution_options={'synchronize_session': False},
+    )
+    _bump_calendar_versions(session, [invitee.id])
+    user_ids = list(dict.fromkeys([meeting.creator_id, invitee.id]))  # objects are expired by the commit
+    data = dict(meeting_id=meeting.id, username=invitee.name, answer=answer)
+    _log_events(session, [
+        dict(user_id=user_id, kind=EventKindEnum.invitation_answered, data=data) for user_id in user_ids
+    ])
+    session.commit()
+    _publish_events(user_ids)
+
+
+def _query_events(session: Session, user_id: int, after_id: int, limit: int) -> list[Event]:
+    return (
+        session.query(Event)
+        .filter(Event.user_id == user_id, Event.id > after_id)
+        .order_by(Event.id)
+        .limit(limit)
+        .all()
+    )
+
+
+@request_stats.timed('db')
+def get_events_for_user(user: User, after_ids: list[int], limit: int) -> UserEvents:
+    # events of the user after after_ids, an id for every database like sync_token of get_meeting_changes_for_user,
+    # not more than limit from every database
+    shards = get_shards()
+    if shards is None:
+        events = [_query_events(db.session, user.id, after_ids[0], limit)]
+    else:
+        after = dict(zip(shards.sessions(), after_ids))
+        events = shards.map(lambda session: [_query_events(session, user.id, after[session], limit)])
+    return UserEvents(
+        # merged by time, events of every database stay in the order of ids
+        events=list(heapq.merge(
+            *([(index, event) for event in database_events] for index, database_events in enumerate(events)),
+            key=lambda pair: pair[1].created,
+        )),
+        more=any(len(database_events) == limit for database_events in events),
+    )
+
+
+@request_stats.timed('db')
+def get_event_id_range() -> list[tuple[int | None, int | None]]:
+    # the oldest event which was not deleted yet and the latest one, of all users, in every database
+    shards = get_shards()
+    if shards is None:
+        return [tuple(db.session.query(func.min(Event.id), func.max(Event.id)).one())]
+    return shards.map(lambda session: [tuple(session.query(func.min(Event.id), func.max(Event.id)).one())])
+
+
+def _query_meeting_changes(
+        session: Session,
+        user_id: int,
+        after: tuple[int, int],
+        limit: int,
+) -> MeetingChanges:
+    # meetings are ordered by (updated_seq, id), several of them can have the same updated_seq (e.g. 0 of those
+    # inserted by flask seed), so a page ends on a meeting, not on a number; both parts are range scans of
+    # (creator_id, updated_seq, id) and (invitee_id, updated_seq, meeting_id) indexes
+    created = session.query(Meeting).filter(
+        Meeting.creator_id == user_id,
+        tuple_(Meeting.updated_seq, Meeting.id) > tuple_(*after),
+    )
+    invited = session.query(Meeting).join(Meeting.invitations).filter(
+        Invitation.invitee_id == user_id,
+        tuple_(Invitation.updated_seq, Invitation.meeting_id) > tuple_(*after),
+    )
+    meetings = (
+        created.union(invited)
+        .order_by(Meeting.updated_seq, Meeting.id)
+        .limit(limit + 1)
+        .options(
+            selectinload(Meeting.creator),
+            selectinload(Meeting.invitations).selectinload(Invitation.invitee),
+        )
+        .all()
+    )
+    meetings, more = meetings[:limit], len(meetings) > limit
+    last = (meetings[-1].updated_seq, meetings[-1].id) if meetings else after
+    return MeetingChanges(meetings=meetings, sync_token=[last], more=more)
+
+
+@request_stats.timed('db')
+def get_meeting_changes_for_user(
+        user: User,
+        sync_token: list[tuple[int, int]] | None,
+        limit: int,
+) -> MeetingChanges:
+    # meetings of the user (created or invited to, whatever the answer) which were created or changed after
+    # sync_token, in the order of changes, not more than limit from every database; None means all meetings.
+    # The token has a position for every database, meetings of every shard have their own change sequence
+    shards = get_shards()
+    sessions = [db.session] if shards is None else shards.sessions()
+    if sync_token is None:
+        sync_token = [(0, 0)] * len(sessions)  # numbers start from 1, meetings inserted without them have 0
+    if len(sync_token) != len(sessions):
+        # e.g. the number of shards changed
+        raise BadRequestException('sync_token is not valid, sync again without it')
+    if shards is None:
+        return _query_meeting_changes(db.session, user.id, sync_token[0], limit)
+    after = dict(zip(sessions, sync_token))
+    changes = shards.map(lambda session: [_query_meeting_changes(session, user.id, after[session], limit)])
+    return MeetingChanges(
+        meetings=[meeting for shard_changes in changes for meeting in shard_changes.meetings],
+        sync_token=[last for shard_changes in changes for last in shard_changes.sync_token],
+        more=any(shard_changes.more for shard_changes in changes),
+    )
 
 
+def _query_meetings_for_several_users(session: Session, user_ids: list[int], start: int) -> list[Meeting]:
+    m1 = session.query(Meeting).join(Meeting.invitations).filter(
+        Invitation.invitee_id.in_(user_ids),
+        Invitation.answer.is_not(False),  # maybe there should be .is(True) instead
+    )
+    m2 = session.query(Meeting).filter(Meeting.creator_id.in_(user_ids))
+    all_meetings = m2.union(m1)
+    filtered_meetings = all_meetings.filter(
+        or_(
+            Meeting.end >= start,
+            Meeting.repeat_type != RepeatTypeEnum.none,
+        ),
+    )
+    return filtered_meetings.all()
+
+
+@request_stats.timed('db')
 def get_all_meetings_for_several_users(users: list[User], start: int | datetime) -> list[Meeting]:
     if isinstance(start, datetime):
         assert start.tzinfo is not None
         start = int(start.astimezone(tz=timezone.utc).timestamp())
     user_ids = [user.id for user in users]
-    m1 = db.session.query(Meeting).join(Meeting.invitations).filter(
+    shards = get_shards()
+    if shards is None:
+        return _query_meetings_for_several_users(db.session, user_ids, start)
+    # users can be invited to meetings on any shard
+    return shards.map(lambda session: _query_meetings_for_several_users(session, user_ids, start))
+
+
+def _select_busy_interval_branches(user_ids: list[int], *conditions, by_user: bool = False) -> tuple[Select, Select]:
+    # meetings created by the users and the ones they are invited to and did not decline
+    columns = (Meeting.start, Meeting.end, Meeting.repeat_type, Meeting.recurrence_rule)
+    created_columns, invited_columns = columns, columns
+    if by_user:
+        created_columns += (Meeting.creator_id.label('user_id'),)
+        invited_columns += (Invitation.invitee_id.label('user_id'),)
+    created = select(*created_columns).where(Meeting.creator_id.in_(user_ids), *conditions)
+    invited = select(*invited_columns).join(Invitation, Invitation.meeting_id == Meeting.id).where(
         Invitation.invitee_id.in_(user_ids),
-        Invitation.answer.is_not(False),  # maybe there should be .is(True) instead
+        Invitation.answer.is_not(False),
+        *conditions,
     )
-    m2 = db.session.query(Meeting).filter(Meeting.creator_id.in_(user_ids))
-    all_meetings = m2.union(m1)
-    filtered_meetings = all_meetings.filter(
+    return created, invited
+
+
+def _select_busy_intervals(user_ids: list[int], *conditions, by_user: bool = False) -> CompoundSelect:
+    return union(*_select_busy_interval_branches(user_ids, *conditions, by_user=by_user))
+
+
+@request_stats.timed('db')
+def get_busy_intervals_for_several_users(
+        users: list[User],
+        start: int | datetime,
+        repeated_only: bool = False,
+) -> list[Row]:
+    # the same meetings as get_all_meetings_for_several_users, but only the columns needed to expand occurrences
+    # and without ORM objects; meetings with equal columns are merged by UNION, they make the same busy intervals
+    if isinstance(start, datetime):
+        assert start.tzinfo is not None
+        start = int(start.astimezone(tz=timezone.utc).timestamp())
+    if repeated_only:
+        condition = Meeting.repeat_type != RepeatTypeEnum.none
+    else:
+        condition = or_(
+            Meeting.end >= start,
+            Meeting.repeat_type != RepeatTypeEnum.none,
+        )
+    statement = _select_busy_intervals([user.id for user in users], condition)
+    shards = get_shards()
+    if shards is None:
+        return db.session.execute(statement).all()
+    return shards.map(lambda session: session.execute(statement).all())
+
+
+@request_stats.timed('db')
+def get_busy_intervals_by_user(users: list[User], start: int | datetime) -> dict[int, list[Row]]:
+    # like get_busy_intervals_for_several_users, but intervals of every user separately, keyed by user id
+    if isinstance(start, datetime):
+        assert start.tzinfo is not None
+        start = int(start.astimezone(tz=timezone.utc).timestamp())
+    statement = _select_busy_intervals(
+        [user.id for user in users],
         or_(
             Meeting.end >= start,
             Meeting.repeat_type != RepeatTypeEnum.none,
         ),
+        by_user=True,
     )
-    return filtered_meetings.all()
+    shards = get_shards()
+    if shards is None:
+        rows = db.session.execute(statement).all()
+    else:
+        rows = shards.map(lambda session: session.execute(statement).all())
+    intervals = {user.id: [] for user in users}
+    for row in rows:
+        intervals[row.user_id].append(row)
+    return intervals
+
+
+def _stream_rows(session: Session, statement: Executable) -> Iterator[Row]:
+    result = session.execute(statement.execution_options(stream_results=True))
+    try:
+        yield from result.yield_per(STREAM_CHUNK_SIZE)
+    finally:
+        result.close()
+
+
+def stream_one_off_busy_intervals_for_several_users(users: list[User], start: int | datetime) -> Iterator[Row]:
+    # one-off meetings which end after start, ordered by start and fetched STREAM_CHUNK_SIZE rows at a time,
+    # so a search which finishes early does not read the rest; the generator should be closed when it is not
+    # needed anymore, it holds cursors. Not timed as 'db', rows are fetched while the caller iterates.
+    # Created and invited meetings are separate ordered selects merged here: a UNION would be deduplicated
+    # and sorted as a whole before the first row. A meeting can come twice, the same busy interval again
+    if isinstance(start, datetime):
+        assert start.tzinfo is not None
+        start = int(start.astimezone(tz=timezone.utc).timestamp())
+    statements = [
+        statement.order_by(Meeting.start, Meeting.end)
+        for statement in _select_busy_interval_branches(
+            [user.id for user in users],
+            Meeting.repeat_type == RepeatTypeEnum.none,
+            Meeting.end > start,
+        )
+    ]
+    shards = get_shards()
+    sessions = [db.session] if shards is None else shards.sessions()
+    return _merge_streams([_stream_rows(session, statement) for session in sessions for statement in statements])
+
+
+def _merge_streams(streams: list[Iterator[Row]]) -> Iterator[Row]:
+    # every stream is ordered by itself; closing the merged stream closes the cursors of all of them
+    try:
+        yield from heapq.merge(*streams, key=lambda row: (row.start, row.end))
+    finally:
+        for stream in streams:
+            stream.close()
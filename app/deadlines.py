@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import time
+
+from flask import (
+    abort,
+    Flask,
+    g,
+    has_request_context,
+    request,
+)
+
+DEADLINE_HEADER = 'X-Request-Timeout'
+
+
+class RequestDeadline:
+    # every request gets a deadline REQUEST_DEADLINE seconds after it started, a client may ask for another one
+    # with DEADLINE_HEADER, but not for more than REQUEST_DEADLINE_MAX; long searches check it between occurrences
+    # and return what they found so far, see app.logic
+    def __init__(self, app: Flask = None):
+        self.default = 0.0
+        self.max = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        self.default = app.config['REQUEST_DEADLINE']
+        self.max = app.config['REQUEST_DEADLINE_MAX']
+        app.extensions['request_deadline'] = self
+        app.before_request(self._before_request)
+
+    def _before_request(self) -> None:
+        timeout = self.default
+        if DEADLINE_HEADER in request.headers:
+            try:
+                timeout = float(request.headers[DEADLINE_HEADER])
+            except ValueError:
+                timeout = 0
+            if not 0 < timeout < float('inf'):
+                abort(400, '{} should be a positive number of seconds'.format(DEADLINE_HEADER))
+        g.deadline = time.monotonic() + min(timeout, self.max)
+
+
+def get_deadline() -> float | None:
+    # time.monotonic() value, None outside of requests or without deadlines
+    if has_request_context():
+        return g.get('deadline')
+    return None
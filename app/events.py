@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+from contextlib import contextmanager
+import threading
+from typing import Iterator
+
+from flask import (
+    current_app,
+    Flask,
+)
+
+PRUNE_EVERY = 1000  # logged events of a process between deletions of expired ones
+
+
+class EventBroker:
+    # changes of calendars are written to the events table in the transaction of the change (see app.db_actions)
+    # and then published here to the streams of the affected users in this process, which read the new events
+    # from the table right away. Events written by other processes are noticed by polling the table every
+    # EVENTS_POLL_INTERVAL seconds; streams are closed after EVENTS_STREAM_TIMEOUT seconds and clients resume from
+    # the last event id they got. Events older than EVENTS_RETENTION seconds are deleted
+    def __init__(self, app: Flask = None):
+        self.poll_interval = 0.0
+        self.stream_timeout = 0.0
+        self.retention = 0
+        self._subscribers: dict[int, set[threading.Event]] = {}
+        self._lock = threading.Lock()
+        self._logged = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        self.poll_interval = app.config['EVENTS_POLL_INTERVAL']
+        self.stream_timeout = app.config['EVENTS_STREAM_TIMEOUT']
+        self.retention = app.config['EVENTS_RETENTION']
+        app.extensions['event_broker'] = self
+
+    @contextmanager
+    def subscribe(self, user_id: int) -> Iterator[threading.Event]:
+        # the event is set when new events of the user are committed in this process
+        notified = threading.Event()
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(notified)
+        try:
+            yield notified
+        finally:
+            with self._lock:
+                subscribers = self._subscribers[user_id]
+                subscribers.discard(notified)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def publish(self, user_ids: list[int]) -> None:
+        with self._lock:
+            for user_id in user_ids:
+                for notified in self._subscribers.get(user_id, ()):
+                    notified.set()
+
+    def prune_due(self, logged: int) -> bool:
+        with self._lock:
+            before = self._logged
+            self._logged += logged
+            return before // PRUNE_EVERY != self._logged // PRUNE_EVERY
+
+
+def get_event_broker() -> 'EventBroker | None':
+    return current_app.extensions.get('event_broker')
@@ -9,3 +9,7 @@ class NotFoundException(BaseLocalException):
 
 class AlreadyExistsException(BaseLocalException):
     code: int = 400
+
+
+class BadRequestException(BaseLocalException):
+    code: int = 400
@@ -5,6 +5,8 @@ from datetime import (
 )
 from pydantic import (
     BaseModel,
+    conint,
+    conlist,
     constr,
     root_validator,
     validator,
@@ -13,7 +15,11 @@ from typing import (
     Optional,
 )
 
-from .types import RepeatTypeEnum
+from .recurrence import parse_rule
+from .types import (
+    JobKindEnum,
+    RepeatTypeEnum,
+)
 
 UsernameField = constr(min_length=2, max_length=30, regex='^[a-zA-Z_]\\w*$')
 
@@ -45,12 +51,24 @@ class MeetingsModel(RangeModel):
     description: Optional[str]
     invitees: Optional[list[UsernameField]]
     repeat_type: RepeatTypeEnum = RepeatTypeEnum.none
+    recurrence_rule: Optional[str]
     is_private: bool = False
+    remind_before: Optional[conint(ge=0)]
 
     @validator('invitees', pre=True)
     def split_invitees(cls, value: str) -> list[str]:
         return value.split(',')
 
+    @validator('recurrence_rule')
+    def normalize_recurrence_rule(cls, value: str) -> str:
+        return str(parse_rule(value))
+
+    @root_validator(skip_on_failure=True)
+    def check_recurrence_rule_is_given_for_custom_repeat_type(cls, values: dict) -> dict:
+        if (values.get('repeat_type') == RepeatTypeEnum.custom) != (values.get('recurrence_rule') is not None):
+            raise ValueError('recurrence_rule should be given if and only if repeat_type is custom')
+        return values
+
 
 class AnswerInvitationModel(BaseModel):
     username: UsernameField
@@ -62,10 +80,25 @@ class UserMeetingsForRangeModel(RangeModel):
     username: UsernameField
 
 
+class MeetingChangesModel(BaseModel):
+    username: UsernameField
+    sync_token: Optional[list[tuple[conint(ge=0), conint(ge=0)]]]
+
+    @validator('sync_token', pre=True)
+    def split_sync_token(cls, value: str) -> list[list[str]] | None:
+        # <updated_seq>_<id> of every database joined by dots, an empty token is the same as none
+        if not value:
+            return None
+        return [part.split('_') for part in value.split('.')]
+
+
 class FindFreeWindowForUsersModel(BaseModel):
     usernames: list[UsernameField]
+    optional_usernames: Optional[list[UsernameField]]
+    min_attendees: Optional[conint(gt=0)]
     window_size: int
     start: datetime
+    horizon: Optional[conint(gt=0)]
 
     @validator('start')
     def treat_tz_naive_dates_as_utc(cls, value: datetime) -> datetime:
@@ -73,6 +106,32 @@ class FindFreeWindowForUsersModel(BaseModel):
             value = value.replace(tzinfo=timezone.utc)
         return value
 
-    @validator('usernames', pre=True)
+    @validator('usernames', 'optional_usernames', pre=True)
     def split_usernames(cls, value: str) -> list[str]:
         return value.split(',')
+
+    @root_validator(skip_on_failure=True)
+    def check_min_attendees_is_not_greater_than_attendees(cls, values: dict) -> dict:
+        attendees = set(values.get('usernames')) | set(values.get('optional_usernames') or [])
+        if values.get('min_attendees') is not None and values.get('min_attendees') > len(attendees):
+            raise ValueError('min_attendees should not be greater than the number of attendees')
+        return values
+
+
+class JobsModel(BaseModel):
+    kind: JobKindEnum
+    params: dict
+
+
+class ImportMeetingsModel(BaseModel):
+    meetings: conlist(MeetingsModel, min_items=1, max_items=10_000)
+
+
+class ExportMeetingsModel(UserMeetingsForRangeModel):
+    pass
+
+
+JOB_PARAMS_MODELS = {
+    JobKindEnum.import_meetings: ImportMeetingsModel,
+    JobKindEnum.export_meetings: ExportMeetingsModel,
+}
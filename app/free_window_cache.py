@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+from collections import (
+    namedtuple,
+    OrderedDict,
+)
+from dataclasses import dataclass
+import threading
+from typing import TYPE_CHECKING
+
+from flask import (
+    current_app,
+    Flask,
+)
+
+from .models import User
+from .types import FreeWindowSearchStatusEnum
+
+if TYPE_CHECKING:
+    # app.logic is not imported before the first search
+    from .logic import FreeWindowSearch
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'currsize'])
+
+
+@dataclass(frozen=True)
+class _Entry:
+    start: int
+    versions: tuple[int, ...]
+    search: 'FreeWindowSearch'
+
+
+class FreeWindowCache:
+    # results of free window searches, keyed by users, window size, horizon and FREE_WINDOW_CACHE_BUCKET of start;
+    # an entry is valid while calendar versions of all the users (db_actions.get_calendar_versions, read before the
+    # search) are the same as when it was stored, they grow with every change of the users meetings, so a hit does
+    # not query meetings at all.
+    # Entries live in the memory of the process, FREE_WINDOW_CACHE_SIZE of them, least recently used are evicted
+    def __init__(self, app: Flask = None):
+        self.size = 0
+        self.bucket = 1
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        self.size = app.config['FREE_WINDOW_CACHE_SIZE']
+        self.bucket = app.config['FREE_WINDOW_CACHE_BUCKET']
+        app.extensions['free_window_cache'] = self
+
+    def _key(self, users: list[User], window_size: int, horizon: int, start: int) -> tuple:
+        return tuple(sorted(user.id for user in users)), window_size, horizon, start // self.bucket
+
+    @staticmethod
+    def _applies(entry: _Entry, start: int, horizon: int) -> bool:
+        # a search from an earlier start saw everything a search from a later one would see: there is no window
+        # between them, so the first window is the same if it is not before the new start; an answer that there is
+        # no window is the same if it covers the whole horizon of the new start
+        if start < entry.start:
+            return False
+        if entry.search.status == FreeWindowSearchStatusEnum.found:
+            return start <= entry.search.start
+        return entry.search.searched_until - start >= horizon
+
+    def get(
+            self, users: list[User], versions: tuple[int, ...], window_size: int, horizon: int, start: int,
+    ) -> 'FreeWindowSearch | None':
+        key = self._key(users, window_size, horizon, start)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.versions != versions or not self._applies(entry, start, horizon):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.search
+
+    def put(
+            self,
+            users: list[User],
+            versions: tuple[int, ...],
+            window_size: int,
+            horizon: int,
+            start: int,
+            search: 'FreeWindowSearch',
+    ) -> None:
+        # searches which ran out of budget or time are not stored, neither depends on the calendars
+        if search.status in (FreeWindowSearchStatusEnum.budget_exhausted, FreeWindowSearchStatusEnum.deadline_exceeded):
+            return
+        key = self._key(users, window_size, horizon, start)
+        with self._lock:
+            self._entries[key] = _Entry(start=start, versions=versions, search=search)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(hits=self.hits, misses=self.misses, currsize=len(self._entries))
+
+
+def get_free_window_cache() -> FreeWindowCache | None:
+    return current_app.extensions.get('free_window_cache')
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+from datetime import timezone
+import time
+
+from . import forms
+from .db_actions import (
+    create_meeting,
+    get_user_by_id,
+    get_user_by_name,
+    get_users_by_names,
+)
+from .jobs import (
+    get_job_queue,
+    Job,
+    Progress,
+)
+from .logic import (
+    make_meeting_description,
+    search_user_meetings_for_range,
+)
+
+PROGRESS_EVERY = 100  # meetings between progress reports
+
+
+def import_meetings(job: Job, progress: Progress) -> dict:
+    # all users are looked up before the first meeting is created, so a missing one fails the whole job;
+    # every meeting is created by create_meeting in its own transaction, like with POST /meetings, and recorded
+    # in the job right after, so a job queued again skips the meetings created by the previous attempts
+    # (except the one a killed worker could have created and not recorded yet)
+    form = forms.ImportMeetingsModel(**job.params)
+    names = [meeting.creator_username for meeting in form.meetings]
+    names.extend(name for meeting in form.meetings for name in meeting.invitees or [])
+    users = {user.name: user for user in get_users_by_names(names)}
+    queue = get_job_queue()
+    meeting_ids = queue.get_items(job.id)
+    progress(len(meeting_ids), len(form.meetings))
+    for position, meeting in enumerate(form.meetings):
+        if position in meeting_ids:
+            continue
+        meeting_ids[position] = create_meeting(
+            creator=users[meeting.creator_username],
+            start=int(meeting.start.astimezone(tz=timezone.utc).timestamp()),
+            end=int(meeting.end.astimezone(tz=timezone.utc).timestamp()),
+            description=meeting.description,
+            invitees=[users[name] for name in meeting.invitees or []],
+            repeat_type=meeting.repeat_type,
+            recurrence_rule=meeting.recurrence_rule,
+            is_private=meeting.is_private,
+            remind_before=meeting.remind_before,
+        ).id
+        queue.record_item(job.id, position, meeting_ids[position], time.time())
+        if len(meeting_ids) % PROGRESS_EVERY == 0 or len(meeting_ids) == len(form.meetings):
+            progress(len(meeting_ids), len(form.meetings))
+    return dict(meeting_ids=[meeting_ids[position] for position in range(len(form.meetings))])
+
+
+def export_meetings(job: Job, progress: Progress) -> dict:
+    # the same as GET /users/<username>/meetings requested by the job owner, but without a deadline: the worker
+    # keeps the job alive with heartbeats while the search runs
+    form = forms.ExportMeetingsModel(**job.params)
+    owner = get_user_by_id(job.owner_id)
+    search = search_user_meetings_for_range(
+        user=get_user_by_name(form.username),
+        start=int(form.start.astimezone(tz=timezone.utc).timestamp()),
+        end=int(form.end.astimezone(tz=timezone.utc).timestamp()),
+    )
+    progress(0, len(search.meetings))
+    meetings = []
+    for meeting in search.meetings:
+        meetings.append(make_meeting_description(meeting, requester=owner))
+        if len(meetings) % PROGRESS_EVERY == 0 or len(meetings) == len(search.meetings):
+            progress(len(meetings), len(search.meetings))
+    return dict(meetings=meetings)
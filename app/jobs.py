@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+from contextlib import (
+    closing,
+    contextmanager,
+)
+from dataclasses import dataclass
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sqlite3
+import threading
+import time
+from typing import (
+    Callable,
+    Iterator,
+)
+
+import click
+from flask import (
+    current_app,
+    Flask,
+)
+from flask.cli import with_appcontext
+from werkzeug.utils import import_string
+
+from .exceptions import BaseLocalException
+from .models import db
+from .types import (
+    JobKindEnum,
+    JobStateEnum,
+)
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = (
+    'PRAGMA journal_mode = WAL',
+    # what was asked, never changes
+    'CREATE TABLE IF NOT EXISTS jobs ('
+    ' id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, params TEXT NOT NULL,'
+    ' owner_id INTEGER NOT NULL, created REAL NOT NULL)',
+    # where it is, updated by workers
+    'CREATE TABLE IF NOT EXISTS job_status ('
+    ' job_id INTEGER PRIMARY KEY REFERENCES jobs (id), state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,'
+    ' worker TEXT, done INTEGER NOT NULL DEFAULT 0, total INTEGER, result TEXT, error TEXT,'
+    ' started REAL, finished REAL, updated REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS job_status_state ON job_status (state, job_id)',
+    # what was already done, kept across attempts: e.g. ids of the meetings created by an import by their position
+    'CREATE TABLE IF NOT EXISTS job_items ('
+    ' job_id INTEGER NOT NULL REFERENCES jobs (id), position INTEGER NOT NULL, item_id INTEGER NOT NULL,'
+    ' PRIMARY KEY (job_id, position))',
+)
+HANDLERS = {
+    # imported by workers only, web workers do not need them
+    JobKindEnum.import_meetings: 'app.job_handlers.import_meetings',
+    JobKindEnum.export_meetings: 'app.job_handlers.export_meetings',
+}
+LOCK_TIMEOUT = 5  # seconds to wait for the write lock of the database
+
+Progress = Callable[[int, int | None], None]
+
+
+class JobLostException(Exception):
+    # the job was queued again and given to another worker, this one should stop it
+    pass
+
+
+@dataclass(frozen=True)
+class Job:
+    id: int
+    kind: JobKindEnum
+    params: dict
+    owner_id: int
+    created: float
+    state: JobStateEnum
+    attempts: int = 0
+    done: int = 0
+    total: int | None = None
+    result: dict | None = None
+    error: str | None = None
+    started: float | None = None
+    finished: float | None = None
+
+
+class JobQueue:
+    # heavy operations (bulk imports and exports) are queued by POST /jobs and run by `flask jobs-worker`
+    # processes instead of request threads. Jobs and their statuses live in the sqlite file JOBS_DATABASE shared
+    # by web and job workers. A running job is kept alive by a heartbeat of its worker; a job which was not
+    # updated for JOBS_STALE_TIMEOUT seconds, e.g. because its worker was killed, is queued again, but not more
+    # than JOBS_MAX_ATTEMPTS times in total. A handler learns that its job was taken away from a JobLostException
+    # raised by progress and record_item, and continues a queued again job from the items it recorded
+    def __init__(self, app: Flask = None):
+        self.path = ''
+        self.concurrency = 1
+        self.poll_interval = 0.0
+        self.stale_timeout = 0
+        self.max_attempts = 0
+        self.worker = ''
+        self._local = threading.local()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        self.path = app.config['JOBS_DATABASE']
+        self.concurrency = app.config['JOBS_WORKER_CONCURRENCY']
+        self.poll_interval = app.config['JOBS_POLL_INTERVAL']
+        self.stale_timeout = app.config['JOBS_STALE_TIMEOUT']
+        self.max_attempts = app.config['JOBS_MAX_ATTEMPTS']
+        self.worker = '{}:{}'.format(socket.gethostname(), os.getpid())
+        # not kept: connections should not be inherited by forked worker processes
+        with closing(self._connect()) as connection:
+            for statement in SCHEMA:
+                connection.execute(statement)
+        app.extensions['job_queue'] = self
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=LOCK_TIMEOUT, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        connection.execute('PRAGMA synchronous = NORMAL')
+        return connection
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # the same as in app.rate_limiting: BEGIN IMMEDIATE, so workers claiming jobs wait for each other
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+            connection.execute('COMMIT')
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+            raise
+
+    def submit(self, kind: JobKindEnum, params: dict, owner_id: int, now: float) -> int:
+        with self._transaction() as connection:
+            job_id = connection.execute(
+                'INSERT INTO jobs (kind, params, owner_id, created) VALUES (?, ?, ?, ?)',
+                (kind, json.dumps(params), owner_id, now),
+            ).lastrowid
+            connection.execute(
+                'INSERT INTO job_status (job_id, state, updated) VALUES (?, ?, ?)', (job_id, JobStateEnum.queued, now),
+            )
+        return job_id
+
+    def get(self, job_id: int) -> Job | None:
+        row = self._connection().execute(
+            'SELECT * FROM jobs JOIN job_status ON job_status.job_id = jobs.id WHERE jobs.id = ?', (job_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        return Job(
+            id=row['id'],
+            kind=JobKindEnum(row['kind']),
+            params=json.loads(row['params']),
+            owner_id=row['owner_id'],
+            created=row['created'],
+            state=JobStateEnum(row['state']),
+            attempts=row['attempts'],
+            done=row['done'],
+            total=row['total'],
+            result=None if row['result'] is None else json.loads(row['result']),
+            error=row['error'],
+            started=row['started'],
+            finished=row['finished'],
+        )
+
+    def claim(self, now: float) -> Job | None:
+        # the oldest queued job becomes running on this worker
+        with self._transaction() as connection:
+            stale = (JobStateEnum.running, now - self.stale_timeout)
+            connection.execute(
+                'UPDATE job_status SET state = ?, worker = NULL, updated = ?'
+                ' WHERE state = ? AND updated < ? AND attempts < ?',
+                (JobStateEnum.queued, now) + stale + (self.max_attempts,),
+            )
+            connection.execute(
+                'UPDATE job_status SET state = ?, error = ?, finished = ?, updated = ? WHERE state = ? AND updated < ?',
+                (JobStateEnum.failed, 'Worker stopped responding', now, now) + stale,
+            )
+            row = connection.execute(
+                'SELECT job_id FROM job_status WHERE state = ? ORDER BY job_id LIMIT 1', (JobStateEnum.queued,),
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                'UPDATE job_status SET state = ?, attempts = attempts + 1, worker = ?, done = 0, total = NULL,'
+                ' started = ?, updated = ? WHERE job_id = ?',
+                (JobStateEnum.running, self.worker, now, now, row['job_id']),
+            )
+        return self.get(row['job_id'])
+
+    def _execute_update(self, connection: sqlite3.Connection, job_id: int, now: float, **values) -> bool:
+        # only while the job is still running on this worker, it could have been given to another one meanwhile;
+        # False if it was
+        columns = ''.join('{} = ?, '.format(column) for column in values)
+        return connection.execute(
+            'UPDATE job_status SET {}updated = ? WHERE job_id = ? AND state = ? AND worker = ?'.format(columns),
+            tuple(values.values()) + (now, job_id, JobStateEnum.running, self.worker),
+        ).rowcount > 0
+
+    def _update(self, job_id: int, now: float, **values) -> bool:
+        with self._transaction() as connection:
+            return self._execute_update(connection, job_id, now, **values)
+
+    def heartbeat(self, job_id: int, now: float) -> bool:
+        return self._update(job_id, now)
+
+    def set_progress(self, job_id: int, done: int, total: int | None, now: float) -> bool:
+        return self._update(job_id, now, done=done, total=total)
+
+    def finish(self, job_id: int, result: dict, now: float) -> bool:
+        return self._update(job_id, now, state=JobStateEnum.done, result=json.dumps(result), finished=now)
+
+    def fail(self, job_id: int, error: str, now: float) -> bool:
+        return self._update(job_id, now, state=JobStateEnum.failed, error=error, finished=now)
+
+    def record_item(self, job_id: int, position: int, item_id: int, now: float) -> None:
+        with self._transaction() as connection:
+            if not self._execute_update(connection, job_id, now):
+                raise JobLostException(job_id)
+            connection.execute(
+                'INSERT OR REPLACE INTO job_items (job_id, position, item_id) VALUES (?, ?, ?)',
+                (job_id, position, item_id),
+            )
+
+    def get_items(self, job_id: int) -> dict[int, int]:
+        rows = self._connection().execute('SELECT position, item_id FROM job_items WHERE job_id = ?', (job_id,))
+        return {row['position']: row['item_id'] for row in rows}
+
+    def _run_handler(self, job: Job) -> dict:
+        # with a heartbeat every third of JOBS_STALE_TIMEOUT in a thread of its own, so a long step of the handler
+        # does not make the job look stale
+        handler = import_string(HANDLERS[job.kind])
+        lost = threading.Event()
+        stopped = threading.Event()
+
+        def heartbeat() -> None:
+            while not stopped.wait(self.stale_timeout / 3):
+                try:
+                    if not self.heartbeat(job.id, time.time()):
+                        lost.set()
+                        return
+                except sqlite3.Error:
+                    logger.exception('Heartbeat of job %s failed', job.id)
+
+        def progress(done: int, total: int | None) -> None:
+            if lost.is_set() or not self.set_progress(job.id, done, total, time.time()):
+                raise JobLostException(job.id)
+
+        thread = threading.Thread(target=heartbeat, name='job-{}-heartbeat'.format(job.id), daemon=True)
+        thread.start()
+        try:
+            result = handler(job, progress)
+        finally:
+            stopped.set()
+            thread.join()
+        if lost.is_set():
+            raise JobLostException(job.id)
+        return result
+
+    def run_next(self) -> Job | None:
+        # runs the oldest queued job in the current app context, returns it or None if the queue is empty
+        job = self.claim(time.time())
+        if job is None:
+            return None
+        logger.info('Job %s (%s) started, attempt %s', job.id, job.kind.value, job.attempts)
+        started = time.perf_counter()
+        try:
+            result = self._run_handler(job)
+        except JobLostException:
+            db.session.rollback()
+            logger.warning('Job %s was given to another worker, stopped', job.id)
+        except BaseLocalException as e:
+            db.session.rollback()
+            self.fail(job.id, e.args[0], time.time())
+        except Exception:
+            logger.exception('Job %s failed', job.id)
+            db.session.rollback()
+            self.fail(job.id, 'Internal error', time.time())
+        else:
+            if not self.finish(job.id, result, time.time()):
+                logger.warning('Job %s was given to another worker, its result is dropped', job.id)
+        logger.info('Job %s is over in %.1f ms', job.id, (time.perf_counter() - started) * 1000)
+        return job
+
+    def work(self, app: Flask, burst: bool = False) -> None:
+        # runs jobs one by one until SIGTERM or SIGINT (the running job is finished first) or, with burst, until
+        # the queue is empty
+        self.worker = '{}:{}'.format(socket.gethostname(), os.getpid())
+        stopped = threading.Event()
+        handlers = {
+            signum: signal.signal(signum, lambda signum, frame: stopped.set())
+            for signum in (signal.SIGTERM, signal.SIGINT)
+        }
+        try:
+            with app.app_context():
+                while not stopped.is_set():
+                    job = self.run_next()
+                    db.session.remove()
+                    if job is None:
+                        if burst:
+                            return
+                        stopped.wait(self.poll_interval)
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+
+
+def get_job_queue() -> 'JobQueue | None':
+    return current_app.extensions.get('job_queue')
+
+
+@click.command('jobs-worker')
+@click.option('--concurrency', type=click.IntRange(min=1), help='worker processes, JOBS_WORKER_CONCURRENCY by default')
+@click.option('--burst', is_flag=True, help='exit when the queue is empty')
+@with_appcontext
+def jobs_worker_command(concurrency: int | None, burst: bool) -> None:
+    """Run queued jobs in several worker processes until stopped."""
+    queue = get_job_queue()
+    if queue is None:
+        raise click.ClickException('JOBS_DATABASE is not set')
+    app = current_app._get_current_object()
+    concurrency = concurrency or queue.concurrency
+    if concurrency == 1:
+        queue.work(app, burst)
+        return
+    # forked, so every process gets the app without loading it again; nothing has connected to the databases
+    # yet, so there are no connections to inherit
+    context = multiprocessing.get_context('fork')
+    processes = [
+        context.Process(target=queue.work, args=(app, burst), name='jobs-worker-{}'.format(i))
+        for i in range(concurrency)
+    ]
+    for process in processes:
+        process.start()
+    # ctrl-c reaches the workers by itself, they stop after their jobs
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: [process.terminate() for process in processes])
+    click.echo('started {} job workers'.format(concurrency))
+    for process in processes:
+        process.join()
@@ -1,53 +1,131 @@
 # -*- coding: utf-8 -*-
-from dataclasses import (
-    dataclass,
-    field,
-)
+from dataclasses import dataclass
 from datetime import (
     datetime,
-    timedelta,
     timezone,
 )
-from queue import PriorityQueue
-from typing import Generator
+import heapq
+import time
+from typing import (
+    Collection,
+    Generator,
+    Iterable,
+    Iterator,
+)
 
+from sqlalchemy.engine import Row
+
+from . import request_stats
+from .calendar_math import (
+    add_months,
+    add_working_days,
+    count_working_days,
+    DAY,
+    iterate_months,
+    iterate_working_days,
+    month_index,
+    WEEK,
+)
 from .db_actions import get_all_meetings_for_several_users
 from .models import (
     Meeting,
     User,
 )
-from .types import RepeatTypeEnum
+from .recurrence import compile_rule
+from .types import (
+    FreeWindowSearchStatusEnum,
+    RepeatTypeEnum,
+)
+
+DEFAULT_FREE_WINDOW_HORIZON = 60*60*24*365*10  # people probably dont want to organize meeting ten years later
+DEADLINE_CHECK_INTERVAL = 1024  # occurrences expanded between checks of the clock
 
 
-def get_repeated_timestamp(timestamp: int, repeat_type: RepeatTypeEnum):
+def get_occurrence_start(start: int, repeat_type: RepeatTypeEnum, index: int) -> int:
+    # occurrences are counted from the first one, so monthly and yearly series clamped to a short month
+    # get back to their day of month afterwards
     if repeat_type == RepeatTypeEnum.daily:
-        return timestamp + 60 * 60 * 24
+        return start + index * DAY
     if repeat_type == RepeatTypeEnum.weekly:
-        return timestamp + 60 * 60 * 24 * 7
+        return start + index * WEEK
     if repeat_type == RepeatTypeEnum.monthly:
-        date = datetime.fromtimestamp(timestamp, tz=timezone.utc)
-        new_date = date.replace(month=date.month + 1)
-        return int(new_date.timestamp())
+        return add_months(start, index)
     if repeat_type == RepeatTypeEnum.yearly:
-        date = datetime.fromtimestamp(timestamp, tz=timezone.utc)
-        new_date = date.replace(year=date.year + 1)
-        return int(new_date.timestamp())
+        return add_months(start, 12 * index)
     if repeat_type == RepeatTypeEnum.every_working_day:
-        date = datetime.fromtimestamp(timestamp, tz=timezone.utc)
-        new_date = date + timedelta(days=1)
-        while new_date.weekday() in [5, 6]:  # increase while it is sunday or saturday
-            new_date += timedelta(days=1)
-        return int(new_date.timestamp())
+        return add_working_days(start, index)
     assert False
 
 
+def get_next_occurrence_index(start: int, repeat_type: RepeatTypeEnum, not_before: int) -> int:
+    # index of the first occurrence which starts not before not_before
+    if start >= not_before:
+        return 0
+    if repeat_type in (RepeatTypeEnum.daily, RepeatTypeEnum.weekly):
+        step = DAY if repeat_type == RepeatTypeEnum.daily else WEEK
+        return -((start - not_before) // step)
+    if repeat_type in (RepeatTypeEnum.monthly, RepeatTypeEnum.yearly):
+        step = 1 if repeat_type == RepeatTypeEnum.monthly else 12
+        # the occurrence in the month of not_before may still be before it
+        index = (month_index(not_before) - month_index(start)) // step
+        if get_occurrence_start(start, repeat_type, index) < not_before:
+            index += 1
+        return index
+    if repeat_type == RepeatTypeEnum.every_working_day:
+        return count_working_days(start, not_before)
+    assert False
+
+
+def get_next_occurrence_start(
+        start: int,
+        repeat_type: RepeatTypeEnum,
+        not_before: int,
+        recurrence_rule: str = None,
+) -> int | None:
+    if repeat_type == RepeatTypeEnum.custom:
+        return next(compile_rule(recurrence_rule).iterate(start, not_before), None)
+    if repeat_type == RepeatTypeEnum.none:
+        return start if start >= not_before else None
+    return get_occurrence_start(start, repeat_type, get_next_occurrence_index(start, repeat_type, not_before))
+
+
+def iterate_occurrence_starts(meeting: Meeting | Row, after: int = None) -> Iterator[int]:
+    if meeting.repeat_type == RepeatTypeEnum.custom:
+        return compile_rule(meeting.recurrence_rule).iterate(meeting.start, after)
+    return _iterate_repeated_starts(meeting.start, meeting.repeat_type, after)
+
+
+def _iterate_repeated_starts(start: int, repeat_type: RepeatTypeEnum, after: int = None) -> Iterator[int]:
+    if repeat_type == RepeatTypeEnum.none:
+        if after is None or start >= after:
+            yield start
+        return
+    index = 0 if after is None else get_next_occurrence_index(start, repeat_type, after)
+    if repeat_type in (RepeatTypeEnum.daily, RepeatTypeEnum.weekly):
+        step = DAY if repeat_type == RepeatTypeEnum.daily else WEEK
+        current = start + index * step
+        while True:
+            yield current
+            current += step
+    if repeat_type == RepeatTypeEnum.monthly:
+        yield from iterate_months(start, 1, index)
+    elif repeat_type == RepeatTypeEnum.yearly:
+        yield from iterate_months(start, 12, index)
+    elif repeat_type == RepeatTypeEnum.every_working_day:
+        yield from iterate_working_days(start, index)
+    else:
+        assert False
+
+
+@request_stats.timed('serialization')
 def make_meeting_description(meeting: Meeting, requester: User = None) -> dict:
     if meeting.is_private:
         if requester is not None:
+            # compared by ids, with sharding the meeting users are objects of another session
             people_who_has_rights = [
-                invitation.invitee for invitation in meeting.invitations
-            ] + [meeting.creator]
-            show_full = requester in people_who_has_rights
+                invitation.invitee_id for invitation in meeting.invitations
+            ] + [meeting.creator_id]
+            show_full = requester.id in people_who_has_rights
         else:
             show_full = False
     else:
@@ -70,11 +148,13 @@ def make_meeting_description(meeting: Meeting, requester: User = None) -> dict:
             ],
             is_private=meeting.is_private,
         )
+        if meeting.repeat_type == RepeatTypeEnum.custom:
+            details['recurrence_rule'] = meeting.recurrence_rule
     return details
 
 
 class MeetingRangeWrapper:
-    def __init__(self, meeting: Meeting, start: int, end: int):
+    def __init__(self, meeting: Meeting | Row, start: int, end: int):
         self.meeting = meeting
         self.start = start
         self.end = end
@@ -91,55 +171,265 @@ class MeetingRangeWrapper:
         return getattr(self.meeting, attr)
 
 
-def iterate_meetings(meetings: list[Meeting]) -> Generator[MeetingRangeWrapper, None, None]:
-    @dataclass(order=True)
-    class PrioritizedItem:
-        start: int
-        end: int
-        meeting: Meeting = field(compare=False)
+def iterate_meetings(
+        meetings: list[Meeting | Row],
+        start: int = None,
+        sorted_meetings: Iterable[Meeting | Row] = (),
+) -> Generator[MeetingRangeWrapper, None, None]:
+    # if start is given, occurrences which end before it are skipped without being generated;
+    # sorted_meetings are one-off meetings ordered by start (e.g. a stream from the db), they are merged
+    # in one by one, so only as many of them are read as were needed
+    queue = []
+    for index, meeting in enumerate(meetings):
+        duration = meeting.end - meeting.start
+        starts = iterate_occurrence_starts(meeting, None if start is None else start - duration + 1)
+        first_start = next(starts, None)
+        if first_start is not None:
+            queue.append((first_start, first_start + duration, index, duration, starts, meeting))
+
+    one_off = iter(sorted_meetings)
+    if start is not None:
+        one_off = (meeting for meeting in one_off if meeting.end > start)
+    meeting = next(one_off, None)
+    if meeting is not None:
+        queue.append((meeting.start, meeting.end, len(meetings), None, one_off, meeting))
+    heapq.heapify(queue)
+
+    expanded = 0
+    try:
+        while queue:
+            item_start, item_end, index, duration, starts, meeting = queue[0]
+
+            expanded += 1
+            yield MeetingRangeWrapper(meeting, item_start, item_end)
+
+            if duration is None:
+                meeting = next(starts, None)
+                if meeting is None:
+                    heapq.heappop(queue)
+                else:
+                    heapq.heapreplace(queue, (meeting.start, meeting.end, index, None, starts, meeting))
+                continue
+            new_start = next(starts, None)
+            if new_start is None:
+                heapq.heappop(queue)
+            else:
+                heapq.heapreplace(queue, (new_start, new_start + duration, index, duration, starts, meeting))
+    finally:
+        request_stats.add('occurrences_expanded', expanded)
 
-    queue = PriorityQueue()
-    for meeting in meetings:
-        queue.put(PrioritizedItem(meeting.start, meeting.end, meeting))
 
-    while not queue.empty():
-        item = queue.get()
+@dataclass(frozen=True)
+class FreeWindowSearch:
+    start: int | None
+    status: FreeWindowSearchStatusEnum
+    searched_until: int
+    iterations: int
 
-        yield MeetingRangeWrapper(item.meeting, item.start, item.end)
 
-        if item.meeting.repeat_type != RepeatTypeEnum.none:
-            new_start = get_repeated_timestamp(item.start, item.meeting.repeat_type)
-            new_end = item.end + (new_start - item.start)
-            queue.put(PrioritizedItem(new_start, new_end, item.meeting))
+def search_free_window_among_meetings(
+        meetings: list[Meeting | Row],
+        window_size: int,
+        start: int | datetime,
+        horizon: int = DEFAULT_FREE_WINDOW_HORIZON,
+        budget: int = None,
+        sorted_meetings: Iterable[Meeting | Row] = (),
+        deadline: float = None,
+) -> FreeWindowSearch:
+    # gives up when the window would start later than start + horizon, after budget occurrences were expanded
+    # without finding the window or when time.monotonic() reaches deadline; there is no window starting before
+    # searched_until then, so a search from searched_until continues this one
+    if isinstance(start, datetime):
+        assert start.tzinfo is not None
+        start = int(start.astimezone(tz=timezone.utc).timestamp())
+
+    busy_until = start
+    iterations = 0
+    status = FreeWindowSearchStatusEnum.found
+
+    with request_stats.stage('expansion'):
+        for meeting in iterate_meetings(meetings, start, sorted_meetings):
+            if budget is not None and iterations >= budget:
+                status = FreeWindowSearchStatusEnum.budget_exhausted
+                request_stats.add('free_window_budget_hits')
+                break
+            if deadline is not None and not iterations % DEADLINE_CHECK_INTERVAL and time.monotonic() >= deadline:
+                status = FreeWindowSearchStatusEnum.deadline_exceeded
+                request_stats.add('deadline_hits')
+                break
+            iterations += 1
+            if meeting.start - busy_until >= window_size:
+                break
+            busy_until = max(busy_until, meeting.end)
+
+            if busy_until - start >= horizon:
+                status = FreeWindowSearchStatusEnum.horizon_reached
+                request_stats.add('free_window_horizon_hits')
+                break
+
+    request_stats.add('free_window_iterations', iterations)
+    return FreeWindowSearch(
+        start=busy_until if status == FreeWindowSearchStatusEnum.found else None,
+        status=status,
+        searched_until=busy_until,
+        iterations=iterations,
+    )
 
 
 def find_first_free_window_among_meetings(
-        meetings: list[Meeting],
+        meetings: list[Meeting | Row],
         window_size: int,
         start: int | datetime,
 ) -> int | None:
+    return search_free_window_among_meetings(meetings, window_size, start).start
+
+
+@dataclass(frozen=True)
+class QuorumWindowSearch:
+    start: int | None
+    status: FreeWindowSearchStatusEnum
+    searched_until: int
+    iterations: int
+    unavailable: tuple[int, ...]  # attendees which are busy during the window
+
+
+class _SearchStopped(Exception):
+    def __init__(self, status: FreeWindowSearchStatusEnum):
+        super().__init__(status)
+        self.status = status
+
+
+def search_quorum_window(
+        meetings_by_attendee: dict[int, list[Meeting | Row]],
+        required: Collection[int],
+        window_size: int,
+        start: int | datetime,
+        horizon: int = DEFAULT_FREE_WINDOW_HORIZON,
+        budget: int = None,
+        min_free: int = None,
+        deadline: float = None,
+) -> QuorumWindowSearch:
+    # required attendees have to be free during the window, the others may be busy. With min_free the first window
+    # with at least min_free free attendees is returned, without it - the first one with the fewest busy attendees
+    # among windows starting before start + horizon.
+    # A window starting at t overlaps an occurrence iff start - window_size < t < end, so every attendee is turned
+    # into ordered disjoint ranges of window starts during which the attendee is busy, and a sweep line over the
+    # starts and ends of the ranges keeps the set of busy attendees, O(E log N) for E ranges of N attendees
     if isinstance(start, datetime):
         assert start.tzinfo is not None
         start = int(start.astimezone(tz=timezone.utc).timestamp())
+    limit = start + horizon
+    iterations = 0
 
-    busy_until = start
+    def iterate_busy_ranges(meetings: list[Meeting | Row]) -> Iterator[tuple[int, int]]:
+        nonlocal iterations
+        busy_from = busy_until = None
+        for meeting in iterate_meetings(meetings, start):
+            if budget is not None and iterations >= budget:
+                raise _SearchStopped(FreeWindowSearchStatusEnum.budget_exhausted)
+            if deadline is not None and not iterations % DEADLINE_CHECK_INTERVAL and time.monotonic() >= deadline:
+                raise _SearchStopped(FreeWindowSearchStatusEnum.deadline_exceeded)
+            iterations += 1
+            meeting_from = meeting.start - window_size + 1
+            if meeting_from >= limit:
+                break
+            if busy_from is not None and meeting_from > busy_until:
+                yield busy_from, busy_until
+                busy_from = None
+            if busy_from is None:
+                busy_from, busy_until = meeting_from, meeting.end
+            else:
+                busy_until = max(busy_until, meeting.end)
+        if busy_from is not None:
+            yield busy_from, busy_until
 
-    for meeting in iterate_meetings(meetings):
-        if meeting.start - busy_until >= window_size:
-            return busy_until
-        busy_until = max(busy_until, meeting.end)
+    attendees = list(meetings_by_attendee)
+    required_indexes = {index for index, attendee in enumerate(attendees) if attendee in required}
+    max_busy = None if min_free is None else len(attendees) - min_free
+    best = None
+    t = start
+    busy = set()
 
-        if busy_until - start >= 60*60*24*365*10:  # people probably dont want to organize meeting ten years later
-            return None
+    with request_stats.stage('expansion'):
+        try:
+            starts = []
+            for index, attendee in enumerate(attendees):
+                ranges = iterate_busy_ranges(meetings_by_attendee[attendee])
+                first = next(ranges, None)
+                if first is not None:
+                    starts.append((*first, index, ranges))
+            heapq.heapify(starts)
+            ends = []
 
-    return busy_until
+            while t < limit:
+                while starts and starts[0][0] <= t:
+                    busy_from, busy_until, index, ranges = starts[0]
+                    busy.add(index)
+                    heapq.heappush(ends, (busy_until, index))
+                    following = next(ranges, None)
+                    if following is None:
+                        heapq.heappop(starts)
+                    else:
+                        heapq.heapreplace(starts, (*following, index, ranges))
+                while ends and ends[0][0] <= t:
+                    busy.discard(heapq.heappop(ends)[1])
 
+                if busy.isdisjoint(required_indexes) and (best is None or len(busy) < len(best[1])):
+                    best = (t, tuple(attendees[index] for index in sorted(busy)))
+                    if not busy or max_busy is not None and len(busy) <= max_busy:
+                        break
 
-def get_user_meetings_for_range(
+                if not starts and not ends:
+                    break
+                t = min(starts[0][0] if starts else limit, ends[0][0] if ends else limit)
+        except _SearchStopped as e:
+            if e.status == FreeWindowSearchStatusEnum.budget_exhausted:
+                request_stats.add('free_window_budget_hits')
+            else:
+                request_stats.add('deadline_hits')
+            request_stats.add('free_window_iterations', iterations)
+            return QuorumWindowSearch(
+                start=None,
+                status=e.status,
+                searched_until=t,
+                iterations=iterations,
+                unavailable=(),
+            )
+
+    request_stats.add('free_window_iterations', iterations)
+    if best is None or max_busy is not None and len(best[1]) > max_busy:
+        request_stats.add('free_window_horizon_hits')
+        return QuorumWindowSearch(
+            start=None,
+            status=FreeWindowSearchStatusEnum.horizon_reached,
+            searched_until=limit,
+            iterations=iterations,
+            unavailable=(),
+        )
+    return QuorumWindowSearch(
+        start=best[0],
+        status=FreeWindowSearchStatusEnum.found,
+        searched_until=best[0],
+        iterations=iterations,
+        unavailable=best[1],
+    )
+
+
+@dataclass(frozen=True)
+class MeetingsForRange:
+    meetings: list[Meeting | MeetingRangeWrapper]
+    complete: bool
+    searched_until: int  # all meetings starting before it are in meetings
+
+
+def search_user_meetings_for_range(
         user: User,
         start: int | datetime,
         end: int | datetime,
-) -> list[Meeting | MeetingRangeWrapper]:
+        deadline: float = None,
+) -> MeetingsForRange:
+    # when time.monotonic() reaches deadline, the meetings found so far are returned; a search from searched_until
+    # returns the rest of them, and again the ones which started before searched_until and end after it
     if isinstance(start, datetime):
         assert start.tzinfo is not None
         start = int(start.astimezone(tz=timezone.utc).timestamp())
@@ -150,10 +440,24 @@ def get_user_meetings_for_range(
     meetings = get_all_meetings_for_several_users([user], start)
 
     result = []
-    for meeting in iterate_meetings(meetings):
-        if meeting.start >= end:
-            break
-        if meeting.start < end and meeting.end > start:
-            result.append(meeting)
+    iterations = 0
+    with request_stats.stage('expansion'):
+        for meeting in iterate_meetings(meetings, start):
+            if meeting.start >= end:
+                break
+            if deadline is not None and not iterations % DEADLINE_CHECK_INTERVAL and time.monotonic() >= deadline:
+                request_stats.add('deadline_hits')
+                return MeetingsForRange(meetings=result, complete=False, searched_until=max(start, meeting.start))
+            iterations += 1
+            if meeting.start < end and meeting.end > start:
+                result.append(meeting)
 
-    return result
+    return MeetingsForRange(meetings=result, complete=True, searched_until=end)
+
+
+def get_user_meetings_for_range(
+        user: User,
+        start: int | datetime,
+        end: int | datetime,
+) -> list[Meeting | MeetingRangeWrapper]:
+    return search_user_meetings_for_range(user, start, end).meetings
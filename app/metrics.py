@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+import atexit
+from bisect import bisect_left
+from contextlib import contextmanager
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+from typing import (
+    Callable,
+    Iterator,
+)
+
+from flask import (
+    Flask,
+    g,
+    request,
+    Response,
+)
+from . import request_stats
+
+Labels = tuple[tuple[str, str], ...]
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 50000, 100000)
+HISTOGRAMS = {
+    'http_request_duration_seconds': ('Request latency', LATENCY_BUCKETS),
+    'http_request_sql_statements': ('SQL statements executed per request', COUNT_BUCKETS),
+    'http_request_sql_seconds': ('Time spent in SQL per request', LATENCY_BUCKETS),
+    'http_request_occurrences_expanded': ('Meeting occurrences expanded by iterate_meetings per request', COUNT_BUCKETS),
+    'http_request_free_window_iterations': ('Free window search iterations per request', COUNT_BUCKETS),
+}
+COUNTERS = {
+    'http_requests_total': 'Requests by status',
+    'free_window_horizon_hits_total': 'Free window searches which gave up at the search horizon',
+    'free_window_budget_hits_total': 'Free window searches which gave up after expanding too many occurrences',
+    'deadline_hits_total': 'Searches which returned a partial result at the request deadline',
+    'cache_hits_total': 'Cache hits',
+    'cache_misses_total': 'Cache misses',
+}
+GAUGES = {
+    'cache_entries': 'Cache entries',
+}
+# request stats which are observed as histograms for every request, even if a request did not report them
+PER_REQUEST_STATS = {
+    'sql_statements': 'http_request_sql_statements',
+    'sql_seconds': 'http_request_sql_seconds',
+    'occurrences_expanded': 'http_request_occurrences_expanded',
+    'free_window_iterations': 'http_request_free_window_iterations',
+}
+# request stats which are added to counters when a request reported them
+PER_REQUEST_COUNTERS = {
+    'free_window_horizon_hits': 'free_window_horizon_hits_total',
+    'free_window_budget_hits': 'free_window_budget_hits_total',
+    'deadline_hits': 'deadline_hits_total',
+}
+
+ARCHIVE = 'archived_metrics.json'  # counters and histograms of exited processes
+LOCK = 'metrics.lock'
+
+_caches: dict[str, Callable] = {}
+
+
+def register_cache(name: str, cache_info: Callable) -> None:
+    # cache_info should return an object with hits, misses and currsize, like functools.lru_cache does
+    _caches[name] = cache_info
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, _escape(value)) for name, value in labels) + '}'
+
+
+def _format_bound(bound: float) -> str:
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _load(path: str) -> dict | None:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write(path: str, snapshot: dict) -> None:
+    with open(path + '.tmp', 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(path + '.tmp', path)
+
+
+def _merge(snapshots: list[dict]) -> dict:
+    # sums counters and histograms, gauges are left out
+    merged = dict(counters={}, histograms={}, gauges={})
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = name, tuple(map(tuple, labels))
+            merged['counters'][key] = merged['counters'].get(key, 0) + value
+        for name, labels, buckets, total, count in snapshot['histograms']:
+            key = name, tuple(map(tuple, labels))
+            current = merged['histograms'].setdefault(key, [[0] * len(buckets), 0, 0])
+            current[0] = [a + b for a, b in zip(current[0], buckets)]
+            current[1] += total
+            current[2] += count
+    return merged
+
+
+def _to_snapshot(merged: dict) -> dict:
+    return dict(
+        counters=[[name, labels, value] for (name, labels), value in merged['counters'].items()],
+        histograms=[
+            [name, labels, buckets, total, count]
+            for (name, labels), (buckets, total, count) in merged['histograms'].items()
+        ],
+        gauges=[],
+    )
+
+
+class Metrics:
+    # values live in plain dicts of the process; with METRICS_DIR every process periodically writes a
+    # snapshot there and /metrics sums counters and histograms of the snapshots of all processes. When a process
+    # exits (or /metrics finds that it was killed) its counters and histograms are added to the archive
+    # snapshot and its own one is removed, so the sums never go down. Gauges are not summed, they are the ones
+    # of the process which answers
+    def __init__(self, app: Flask = None):
+        self._lock = threading.Lock()
+        self._counters: dict[tuple[str, Labels], float] = {}
+        self._histograms: dict[tuple[str, Labels], list] = {}
+        self.directory: str | None = None
+        self.flush_interval = 5
+        self._last_flush = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        app.extensions['metrics'] = self
+        self.directory = app.config['METRICS_DIR']
+        self.flush_interval = app.config['METRICS_FLUSH_INTERVAL']
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+            atexit.register(self._archive_own)
+        request_stats.count_sql_statements()
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule('/metrics', 'metrics', view_func=self.view, methods=['GET'])
+
+    def inc(self, name: str, labels: Labels = (), value: float = 1) -> None:
+        with self._lock:
+            self._counters[name, labels] = self._counters.get((name, labels), 0) + value
+
+    def observe(self, name: str, labels: Labels, value: float) -> None:
+        buckets = HISTOGRAMS[name][1]
+        with self._lock:
+            histogram = self._histograms.get((name, labels))
+            if histogram is None:
+                histogram = self._histograms[name, labels] = [[0] * (len(buckets) + 1), 0, 0]
+            histogram[0][bisect_left(buckets, value)] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    @staticmethod
+    def _before_request() -> None:
+        request_stats.reset()
+        g.metrics_started = time.perf_counter()
+
+    def _after_request(self, response: Response) -> Response:
+        endpoint = (('endpoint', request.endpoint or 'unknown'),)
+        self.observe('http_request_duration_seconds', endpoint, time.perf_counter() - g.metrics_started)
+        self.inc('http_requests_total', endpoint + (('status', str(response.status_code)),))
+        stats = request_stats.get()
+        for stat, histogram in PER_REQUEST_STATS.items():
+            self.observe(histogram, endpoint, stats.get(stat, 0))
+        for stat, counter in PER_REQUEST_COUNTERS.items():
+            if stats.get(stat):
+                self.inc(counter, endpoint, stats[stat])
+        if self.directory is not None and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+        return response
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = [[name, labels, value] for (name, labels), value in self._counters.items()]
+            histograms = [
+                [name, labels, list(buckets), total, count]
+                for (name, labels), (buckets, total, count) in self._histograms.items()
+            ]
+        gauges = []
+        for cache, cache_info in _caches.items():
+            info = cache_info()
+            labels = (('cache', cache),)
+            counters.append(['cache_hits_total', labels, info.hits])
+            counters.append(['cache_misses_total', labels, info.misses])
+            gauges.append(['cache_entries', labels, info.currsize])
+        return dict(counters=counters, histograms=histograms, gauges=gauges)
+
+    def _snapshot_path(self, pid: int = None) -> str:
+        return os.path.join(self.directory, 'metrics_{}.json'.format(os.getpid() if pid is None else pid))
+
+    def flush(self) -> None:
+        self._last_flush = time.monotonic()
+        _write(self._snapshot_path(), self.snapshot())
+
+    @contextmanager
+    def _directory_lock(self) -> Iterator[None]:
+        # archiving and reading of the snapshots are not interleaved, so nothing is counted twice or missed
+        with open(os.path.join(self.directory, LOCK), 'w') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def _archive(self, path: str, snapshot: dict) -> None:
+        # the lock should be held
+        archive_path = os.path.join(self.directory, ARCHIVE)
+        archive = _load(archive_path)
+        _write(archive_path, _to_snapshot(_merge([snapshot] if archive is None else [archive, snapshot])))
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _archive_own(self) -> None:
+        with self._directory_lock():
+            self._archive(self._snapshot_path(), self.snapshot())
+
+    def _stored_snapshots(self) -> list[dict]:
+        # snapshots of the other running processes and the archive
+        snapshots = []
+        with self._directory_lock():
+            for path in glob.glob(self._snapshot_path('*')):
+                pid = int(os.path.basename(path)[len('metrics_'):-len('.json')])
+                if pid == os.getpid():
+                    continue
+                snapshot = _load(path)
+                if snapshot is None:
+                    continue
+                if _is_alive(pid):
+                    snapshots.append(snapshot)
+                else:
+                    self._archive(path, snapshot)  # the process was killed before it could do it
+            archive = _load(os.path.join(self.directory, ARCHIVE))
+        if archive is not None:
+            snapshots.append(archive)
+        return snapshots
+
+    def collect(self) -> dict:
+        own = self.snapshot()
+        snapshots = [own]
+        if self.directory is not None:
+            self.flush()
+            snapshots.extend(self._stored_snapshots())
+        merged = _merge(snapshots)
+        for name, labels, value in own['gauges']:
+            merged['gauges'][name, tuple(map(tuple, labels))] = value
+        return merged
+
+    def render(self) -> str:
+        merged = self.collect()
+        lines = []
+        for kind, descriptions in (('counter', COUNTERS), ('gauge', GAUGES)):
+            values = merged['counters' if kind == 'counter' else 'gauges']
+            for name, help_text in descriptions.items():
+                series = sorted((labels, value) for (metric, labels), value in values.items() if metric == name)
+                if not series:
+                    continue
+                lines.append('# HELP {} {}'.format(name, help_text))
+                lines.append('# TYPE {} {}'.format(name, kind))
+                lines.extend('{}{} {}'.format(name, _format_labels(labels), value) for labels, value in series)
+        for name, (help_text, bounds) in HISTOGRAMS.items():
+            series = sorted(
+                (labels, value) for (metric, labels), value in merged['histograms'].items() if metric == name
+            )
+            if not series:
+                continue
+            lines.append('# HELP {} {}'.format(name, help_text))
+            lines.append('# TYPE {} histogram'.format(name))
+            for labels, (buckets, total, count) in series:
+                cumulative = 0
+                for bound, bucket in zip(bounds + (float('inf'),), buckets):
+                    cumulative += bucket
+                    lines.append('{}_bucket{} {}'.format(
+                        name, _format_labels(labels + (('le', _format_bound(bound)),)), cumulative,
+                    ))
+                lines.append('{}_sum{} {}'.format(name, _format_labels(labels), total))
+                lines.append('{}_count{} {}'.format(name, _format_labels(labels), count))
+        return '\n'.join(lines) + '\n'
+
+    def view(self) -> Response:
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
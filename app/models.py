@@ -7,25 +7,36 @@ from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import (
     Column,
     ForeignKey,
+    Index,
     MetaData,
 )
 from sqlalchemy.types import (
     Boolean,
     Integer,
     String,
+    Text,
 )
 from sqlalchemy.orm import (
     declarative_base,
     relationship,
+    sessionmaker,
 )
 from werkzeug.security import (
     check_password_hash,
     generate_password_hash,
 )
 
+from .routing import RoutingSession
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options: dict) -> sessionmaker:
+        return sessionmaker(class_=RoutingSession, db=self, **options)
+
+
 metadata = MetaData()
 Base = declarative_base(metadata=metadata)
-db = SQLAlchemy(metadata=metadata)
+db = RoutingSQLAlchemy(metadata=metadata)
 
 
 class User(Base):
@@ -34,6 +45,8 @@ class User(Base):
     id = Column(Integer, primary_key=True)
     name = Column(String(20), unique=True, nullable=False)
     password_hash = Column(String(120), nullable=False)
+    # bumped whenever meetings of the user change, see app.free_window_cache
+    calendar_version = Column(Integer, nullable=False, default=0, server_default='0')
 
     @classmethod
     def generate_password_hash(cls, password: str) -> str:
@@ -51,8 +64,17 @@ class Meeting(Base):
     start = Column(Integer, nullable=False)
     end = Column(Integer, nullable=False)
     repeat_type = Column(String(20))
+    recurrence_rule = Column(String(200))
     description = Column(String(200))
     is_private = Column(Boolean, nullable=False, default=False)
+    remind_before = Column(Integer)
+    # number of the last change of the meeting or its invitations in the change sequence of its database
+    updated_seq = Column(Integer, nullable=False, default=0, server_default='0')
+
+    __table_args__ = (
+        Index('ix_meetings_creator_id_updated_seq', 'creator_id', 'updated_seq', 'id'),
+        Index('ix_meetings_updated_seq', 'updated_seq'),  # read by `flask reminders`
+    )
 
     creator = relationship("User")
     invitations = relationship("Invitation", back_populates="meeting")
@@ -72,6 +94,41 @@ class Invitation(Base):
     invitee_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
     meeting_id = Column(Integer, ForeignKey("meetings.id"), primary_key=True)
     answer = Column(Boolean)
+    updated_seq = Column(Integer, nullable=False, default=0, server_default='0')  # the same as of the meeting
+
+    __table_args__ = (
+        Index('ix_invitations_invitee_id_updated_seq', 'invitee_id', 'updated_seq', 'meeting_id'),
+    )
 
     invitee = relationship("User")
     meeting = relationship("Meeting", back_populates="invitations")
+
+
+class Event(Base):
+    # changes of calendars streamed by GET /users/<username>/events, see app.events; ids are never reused,
+    # so a client can resume after the last one it got
+    __tablename__ = 'events'
+    __table_args__ = (
+        Index('ix_events_user_id_id', 'user_id', 'id'),
+        {'sqlite_autoincrement': True},
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    kind = Column(String(20), nullable=False)
+    data = Column(Text, nullable=False)  # json
+    created = Column(Integer, nullable=False, index=True)
+
+
+class MeetingIdSequence(Base):
+    # used only with sharding, see app.sharding
+    __tablename__ = 'meeting_id_sequence'
+
+    id = Column(Integer, primary_key=True)
+
+
+class ChangeSequence(Base):
+    # a row per change of meetings, see app.db_actions.get_meeting_changes_for_user
+    __tablename__ = 'change_sequence'
+
+    id = Column(Integer, primary_key=True)
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+from dataclasses import (
+    dataclass,
+    field,
+)
+from datetime import (
+    datetime,
+    timezone,
+)
+import heapq
+import logging
+import signal
+import threading
+import time
+from typing import Iterable
+
+from flask import Flask
+from sqlalchemy import func
+from sqlalchemy.orm import (
+    Query,
+    selectinload,
+)
+
+from .logic import get_next_occurrence_start
+from .models import (
+    db,
+    Invitation,
+    Meeting,
+)
+from .sharding import get_shards
+from .types import RepeatTypeEnum
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Series:
+    start: int
+    end: int
+    repeat_type: RepeatTypeEnum
+    recurrence_rule: str | None
+    remind_before: int
+    attendees: tuple[str, ...]
+
+
+@dataclass(order=True)
+class Reminder:
+    fire_at: int
+    meeting_id: int
+    start: int = field(compare=False)
+    end: int = field(compare=False)
+    series: Series = field(compare=False)
+
+
+def get_attendees(meeting: Meeting) -> tuple[str, ...]:
+    return (meeting.creator.name,) + tuple(
+        invitation.invitee.name for invitation in meeting.invitations if invitation.answer is not False
+    )
+
+
+class ReminderScheduler:
+    # runs in the single `flask reminders` process, so every reminder is logged once. Only the next reminder
+    # of every meeting is kept in the heap; entries replaced by `schedule` stay there and are skipped when popped.
+    # Meetings changed by web workers are read from the databases every REMINDERS_POLL_INTERVAL seconds
+    # by their updated_seq. Everything runs in the thread of `work`, which sleeps until the next reminder or
+    # the next poll, whichever is earlier, so the scheduler has no locks
+    def __init__(self, app: Flask = None):
+        self.poll_interval = 0.0
+        self._heap: list[Reminder] = []
+        self._reminders: dict[int, Reminder] = {}
+        self._seen: list[int] = []  # the last updated_seq read from every database
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        self.poll_interval = app.config['REMINDERS_POLL_INTERVAL']
+        app.extensions['reminder_scheduler'] = self
+
+    def __len__(self) -> int:
+        return len(self._reminders)
+
+    @staticmethod
+    def _make_series(meeting: Meeting) -> Series | None:
+        if meeting.remind_before is None:
+            return None
+        return Series(
+            start=meeting.start,
+            end=meeting.end,
+            repeat_type=meeting.repeat_type,
+            recurrence_rule=meeting.recurrence_rule,
+            remind_before=meeting.remind_before,
+            attendees=get_attendees(meeting),
+        )
+
+    @staticmethod
+    def _make_reminder(meeting_id: int, series: Series | None, not_before: int) -> Reminder | None:
+        if series is None:
+            return None
+        next_start = get_next_occurrence_start(
+            series.start, series.repeat_type, not_before + series.remind_before, series.recurrence_rule,
+        )
+        if next_start is None:
+            return None
+        return Reminder(
+            fire_at=next_start - series.remind_before,
+            meeting_id=meeting_id,
+            start=next_start,
+            end=series.end + (next_start - series.start),
+            series=series,
+        )
+
+    def _set(self, meeting_id: int, reminder: Reminder | None) -> None:
+        if reminder is None:
+            self._reminders.pop(meeting_id, None)
+            return
+        self._reminders[meeting_id] = reminder
+        heapq.heappush(self._heap, reminder)
+        if len(self._heap) > 2 * len(self._reminders) + 1024:
+            self._heap = list(self._reminders.values())
+            heapq.heapify(self._heap)
+
+    def load(self, meetings: Iterable[Meeting], now: int = None) -> None:
+        now = int(time.time()) if now is None else now
+        for meeting in meetings:
+            reminder = self._make_reminder(meeting.id, self._make_series(meeting), now)
+            if reminder is not None:
+                self._reminders[meeting.id] = reminder
+        self._heap = list(self._reminders.values())
+        heapq.heapify(self._heap)
+
+    @staticmethod
+    def _query_meetings(session) -> Query:
+        return session.query(Meeting).options(
+            selectinload(Meeting.creator),
+            selectinload(Meeting.invitations).selectinload(Invitation.invitee),
+        )
+
+    def refresh(self, now: int = None) -> None:
+        # all meetings with reminders on the first call, then the ones changed since the previous call
+        shards = get_shards()
+        sessions = [db.session] if shards is None else shards.sessions()
+        if not self._seen:
+            seen = [session.query(func.max(Meeting.updated_seq)).scalar() or 0 for session in sessions]
+            meetings = []
+            for session in sessions:
+                meetings.extend(self._query_meetings(session).filter(Meeting.remind_before.is_not(None)))
+            self.load(meetings, now)
+            self._seen = seen
+            return
+        for i, session in enumerate(sessions):
+            for meeting in self._query_meetings(session).filter(Meeting.updated_seq > self._seen[i]):
+                self.schedule(meeting, now)
+                self._seen[i] = max(self._seen[i], meeting.updated_seq)
+
+    def schedule(self, meeting: Meeting, now: int = None) -> None:
+        now = int(time.time()) if now is None else now
+        self._set(meeting.id, self._make_reminder(meeting.id, self._make_series(meeting), now))
+
+    def seconds_until_next(self, now: int) -> int | None:
+        if not self._heap:
+            return None
+        return max(0, self._heap[0].fire_at - now)
+
+    def pop_due(self, now: int) -> list[Reminder]:
+        due = []
+        while self._heap and self._heap[0].fire_at <= now:
+            reminder = heapq.heappop(self._heap)
+            if self._reminders.get(reminder.meeting_id) is not reminder:
+                continue
+            due.append(reminder)
+            self._set(reminder.meeting_id, self._make_reminder(
+                reminder.meeting_id, reminder.series, max(now, reminder.fire_at + 1),
+            ))
+        return due
+
+    @staticmethod
+    def fire(reminder: Reminder) -> None:
+        logger.info(
+            'Meeting %s starts at %s, reminding %s',
+            reminder.meeting_id,
+            datetime.fromtimestamp(reminder.start, tz=timezone.utc).isoformat(),
+            ', '.join(reminder.series.attendees),
+        )
+
+    def work(self, app: Flask) -> None:
+        # fires reminders until SIGTERM or SIGINT; every read of the databases is in a fresh app context,
+        # so the sessions do not keep meetings loaded by the previous one
+        stopped = threading.Event()
+        handlers = {
+            signum: signal.signal(signum, lambda signum, frame: stopped.set())
+            for signum in (signal.SIGTERM, signal.SIGINT)
+        }
+        try:
+            while not stopped.is_set():
+                with app.app_context():
+                    self.refresh()
+                for reminder in self.pop_due(int(time.time())):
+                    self.fire(reminder)
+                timeout = self.seconds_until_next(int(time.time()))
+                stopped.wait(self.poll_interval if timeout is None else min(timeout, self.poll_interval))
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import cProfile
+import hmac
+import os
+import pstats
+import uuid
+
+from flask import (
+    Flask,
+    g,
+    request,
+    Response,
+)
+
+PROFILE_HEADER = 'X-Profile'
+
+
+class RequestProfiler:
+    # profiles a single request with cProfile when it comes with PROFILE_HEADER equal to PROFILING_TOKEN;
+    # the hooks are not registered at all unless the token is configured
+    def __init__(self, app: Flask = None):
+        self.token = ''
+        self.directory = ''
+        self.top = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        self.token = app.config['PROFILING_TOKEN']
+        self.directory = app.config['PROFILING_DIR']
+        self.top = app.config['PROFILING_TOP']
+        os.makedirs(self.directory, exist_ok=True)
+        app.extensions['request_profiler'] = self
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def _before_request(self) -> None:
+        token = request.headers.get(PROFILE_HEADER)
+        if token is None or not hmac.compare_digest(token.encode(), self.token.encode()):
+            return
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+    def _after_request(self, response: Response) -> Response:
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return response
+        profiler.disable()
+        request_id = uuid.uuid4().hex
+        filename = '{}_{}.prof'.format(request.endpoint or 'unknown', request_id)
+        profiler.dump_stats(os.path.join(self.directory, filename))
+        response.headers['X-Request-Id'] = request_id
+        response.headers['X-Profile-File'] = filename
+        if self.top:
+            response.headers['X-Profile-Summary'] = summarize(profiler, self.top)
+        return response
+
+    @staticmethod
+    def _teardown_request(error: BaseException | None) -> None:
+        # after_request is skipped when the view raised an unhandled exception
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+
+
+def summarize(profiler: cProfile.Profile, top: int) -> str:
+    # the functions with the largest cumulative time, in a form which fits into a single header line
+    stats = pstats.Stats(profiler).sort_stats(pstats.SortKey.CUMULATIVE)
+    entries = []
+    for function in stats.fcn_list[:top]:
+        filename, line, name = function
+        calls, _, _, cumulative, _ = stats.stats[function]
+        entries.append('{}:{}({}) calls={} cumulative_ms={:.3f}'.format(
+            os.path.basename(filename), line, name, calls, cumulative * 1000,
+        ))
+    return '; '.join(entries)
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+from contextlib import (
+    closing,
+    contextmanager,
+)
+from dataclasses import dataclass
+import hashlib
+import hmac
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterator
+import uuid
+
+from flask import (
+    Flask,
+    g,
+    jsonify,
+    request,
+    Response,
+)
+
+from . import request_stats
+from .models import (
+    db,
+    User,
+)
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = (
+    'PRAGMA journal_mode = WAL',
+    'CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS slots (id TEXT PRIMARY KEY, endpoint TEXT NOT NULL, started REAL NOT NULL)',
+)
+PRUNE_EVERY = 1000  # admitted requests of a process between deletions of full buckets
+LOCK_TIMEOUT = 5  # seconds to wait for the write lock of the database
+CREDENTIALS_CACHE_SIZE = 10000
+
+
+@dataclass(frozen=True)
+class Admission:
+    admitted: bool
+    slot: str | None = None  # concurrency slot to release when the request is over
+    retry_after: float = 0  # seconds, for requests which were not admitted
+
+
+class RateLimiter:
+    # every client has a token bucket of RATE_LIMIT_CAPACITY tokens refilled at RATE_LIMIT_RATE tokens per second,
+    # a request takes RATE_LIMIT_COSTS tokens of its endpoint (1 by default); endpoints in RATE_LIMIT_CONCURRENCY
+    # also have that many slots for requests running at once. Buckets and slots live in the sqlite file
+    # RATE_LIMIT_DATABASE shared by all worker processes, a request is checked in one short transaction.
+    # If the file is not available requests are let through. Checked credentials are kept in the process
+    # for RATE_LIMIT_CREDENTIALS_TTL seconds, so a client does not pay for a password hash on every request
+    def __init__(self, app: Flask = None):
+        self.path = ''
+        self.capacity = 0.0
+        self.rate = 0.0
+        self.costs: dict[str, float] = {}
+        self.concurrency: dict[str, int] = {}
+        self.slot_timeout = 0
+        self.credentials_ttl = 0
+        self._local = threading.local()
+        self._admitted = 0
+        # hmac of user id and password -> (expiry, password hash of the user when it was checked)
+        self._credentials: dict[bytes, tuple[float, str]] = {}
+        self._credentials_lock = threading.Lock()
+        self._secret = os.urandom(32)  # passwords are not kept in memory as they are
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        self.path = app.config['RATE_LIMIT_DATABASE']
+        self.capacity = app.config['RATE_LIMIT_CAPACITY']
+        self.rate = app.config['RATE_LIMIT_RATE']
+        self.costs = app.config['RATE_LIMIT_COSTS']
+        self.concurrency = app.config['RATE_LIMIT_CONCURRENCY']
+        self.slot_timeout = app.config['RATE_LIMIT_SLOT_TIMEOUT']
+        self.credentials_ttl = app.config['RATE_LIMIT_CREDENTIALS_TTL']
+        # not kept: connections should not be inherited by forked worker processes
+        with closing(self._connect()) as connection:
+            for statement in SCHEMA:
+                connection.execute(statement)
+        app.extensions['rate_limiter'] = self
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=LOCK_TIMEOUT, isolation_level=None)
+        # losing the last buckets on a power failure is fine, waiting for fsync on every request is not
+        connection.execute('PRAGMA synchronous = NORMAL')
+        return connection
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # BEGIN IMMEDIATE takes the write lock right away, so checks of other processes wait for it
+        # instead of failing when they upgrade a read lock
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+            connection.execute('COMMIT')
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+            raise
+
+    def admit(self, key: str, endpoint: str | None, cost: float, now: float) -> Admission:
+        cost = min(cost, self.capacity)  # otherwise the request would never be admitted
+        limit = self.concurrency.get(endpoint)
+        with self._transaction() as connection:
+            if limit is not None:
+                connection.execute('DELETE FROM slots WHERE started < ?', (now - self.slot_timeout,))
+                (running,) = connection.execute('SELECT COUNT(*) FROM slots WHERE endpoint = ?', (endpoint,)).fetchone()
+                if running >= limit:
+                    return Admission(admitted=False, retry_after=1)
+            row = connection.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            tokens = self.capacity if row is None else min(self.capacity, row[0] + max(0.0, now - row[1]) * self.rate)
+            if tokens < cost:
+                return Admission(admitted=False, retry_after=(cost - tokens) / self.rate)
+            connection.execute(
+                'INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)', (key, tokens - cost, now),
+            )
+            slot = None
+            if limit is not None:
+                slot = uuid.uuid4().hex
+                connection.execute('INSERT INTO slots (id, endpoint, started) VALUES (?, ?, ?)', (slot, endpoint, now))
+            self._admitted += 1
+            if self._admitted % PRUNE_EVERY == 0:
+                # a bucket which was not used for this long is full, the same as a missing one
+                connection.execute('DELETE FROM buckets WHERE updated < ?', (now - self.capacity / self.rate,))
+        return Admission(admitted=True, slot=slot)
+
+    def release(self, slot: str) -> None:
+        with self._transaction() as connection:
+            connection.execute('DELETE FROM slots WHERE id = ?', (slot,))
+
+    def check_credentials(self, username: str, password: str, now: float) -> User | None:
+        user = db.session.query(User).filter_by(name=username).first()
+        if user is None:
+            return None
+        key = hmac.new(self._secret, '{}:{}'.format(user.id, password).encode(), hashlib.sha256).digest()
+        cached = self._credentials.get(key)
+        # a changed password changes the hash, so the old one is not accepted anymore
+        if cached is not None and cached[0] > now and cached[1] == user.password_hash:
+            return user
+        if not user.check_password(password):
+            return None
+        with self._credentials_lock:
+            if len(self._credentials) >= CREDENTIALS_CACHE_SIZE:
+                self._credentials = {k: v for k, v in self._credentials.items() if v[0] > now}
+                if len(self._credentials) >= CREDENTIALS_CACHE_SIZE:
+                    self._credentials.clear()
+            self._credentials[key] = (now + self.credentials_ttl, user.password_hash)
+        return user
+
+    @request_stats.timed('auth')
+    def _client_key(self) -> str:
+        # only a user whose password matches gets a bucket of their own, otherwise a client could spend buckets
+        # of other users or get a fresh bucket with every made up name; the user is reused by the views
+        auth_info = request.authorization
+        if auth_info is not None:
+            user = self.check_credentials(auth_info.username, auth_info['password'], time.monotonic())
+            if user is not None:
+                g.authenticated_user = user
+                return 'user:{}'.format(user.id)
+        return 'ip:{}'.format(request.remote_addr)
+
+    def _before_request(self) -> Response | None:
+        # g belongs to the app context, which is shared by several requests when it is pushed by hand (e.g. in tests)
+        g.authenticated_user = None
+        g.rate_limit_slot = None
+        cost = self.costs.get(request.endpoint, 1)
+        if not cost and request.endpoint not in self.concurrency:
+            return None
+        try:
+            admission = self.admit(self._client_key(), request.endpoint, cost, time.time())
+        except sqlite3.Error:
+            logger.exception('Rate limiter database is not available, request is let through')
+            return None
+        if not admission.admitted:
+            response = jsonify(dict(status='error', error='Too many requests'))
+            response.status_code = 429
+            response.headers['Retry-After'] = str(max(1, math.ceil(admission.retry_after)))
+            return response
+        g.rate_limit_slot = admission.slot
+        return None
+
+    def _teardown_request(self, error: BaseException | None) -> None:
+        slot = g.pop('rate_limit_slot', None)
+        if slot is None:
+            return
+        try:
+            self.release(slot)
+        except sqlite3.Error:
+            logger.exception('Failed to release a concurrency slot, it is freed after RATE_LIMIT_SLOT_TIMEOUT')
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+from abc import (
+    ABC,
+    abstractmethod,
+)
+from bisect import bisect_left
+from dataclasses import dataclass
+from datetime import (
+    datetime,
+    timezone,
+)
+from functools import lru_cache
+from math import lcm
+import re
+from typing import Iterator
+
+from .calendar_math import (
+    civil_from_days,
+    DAY,
+    days_from_civil,
+    days_in_month,
+    weekday,
+)
+from .types import FrequencyEnum
+
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+BY_DAY_REGEX = re.compile('^([+-]?[1-5])?(MO|TU|WE|TH|FR|SA|SU)$')
+
+
+@dataclass(frozen=True)
+class RecurrenceRule:
+    freq: FrequencyEnum
+    interval: int = 1
+    by_day: tuple[tuple[int, int], ...] = ()  # (n-th occurrence in month or 0 for every, weekday)
+    by_month_day: tuple[int, ...] = ()
+    by_month: tuple[int, ...] = ()
+    count: int | None = None
+    until: int | None = None
+
+    def __str__(self) -> str:
+        parts = ['FREQ={}'.format(self.freq.value.upper())]
+        if self.interval != 1:
+            parts.append('INTERVAL={}'.format(self.interval))
+        if self.by_day:
+            parts.append('BYDAY={}'.format(','.join(
+                '{}{}'.format(n or '', WEEKDAYS[day]) for n, day in self.by_day
+            )))
+        if self.by_month_day:
+            parts.append('BYMONTHDAY={}'.format(','.join(map(str, self.by_month_day))))
+        if self.by_month:
+            parts.append('BYMONTH={}'.format(','.join(map(str, self.by_month))))
+        if self.count is not None:
+            parts.append('COUNT={}'.format(self.count))
+        if self.until is not None:
+            parts.append('UNTIL={}'.format(datetime.fromtimestamp(self.until, tz=timezone.utc).strftime('%Y%m%dT%H%M%SZ')))
+        return ';'.join(parts)
+
+
+def _parse_int(name: str, value: str) -> int:
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError('{} should be an integer'.format(name))
+
+
+def _parse_int_list(name: str, value: str, high: int) -> tuple[int, ...]:
+    result = []
+    for item in value.split(','):
+        number = _parse_int(name, item)
+        if not 1 <= abs(number) <= high:
+            raise ValueError('{} value {} is out of range'.format(name, number))
+        result.append(number)
+    return tuple(sorted(set(result)))
+
+
+def _parse_until(value: str) -> int:
+    try:
+        if 'T' in value:
+            return int(datetime.strptime(value, '%Y%m%dT%H%M%SZ').replace(tzinfo=timezone.utc).timestamp())
+        date = datetime.strptime(value, '%Y%m%d').replace(tzinfo=timezone.utc)
+    except ValueError:
+        raise ValueError('UNTIL should be a date or a utc date-time')
+    return int(date.timestamp()) + DAY - 1
+
+
+def parse_rule(text: str) -> RecurrenceRule:
+    if text.upper().startswith('RRULE:'):
+        text = text[len('RRULE:'):]
+    parts = {}
+    for part in text.strip().upper().split(';'):
+        name, sep, value = part.partition('=')
+        if not sep or not value:
+            raise ValueError('malformed part "{}"'.format(part))
+        if name in parts:
+            raise ValueError('duplicated part "{}"'.format(name))
+        parts[name] = value
+
+    try:
+        freq = FrequencyEnum(parts.pop('FREQ', '').lower())
+    except ValueError:
+        raise ValueError('FREQ should be one of {}'.format(', '.join(f.value.upper() for f in FrequencyEnum)))
+    kwargs = dict(freq=freq)
+    if 'INTERVAL' in parts:
+        kwargs['interval'] = _parse_int('INTERVAL', parts.pop('INTERVAL'))
+        if kwargs['interval'] < 1:
+            raise ValueError('INTERVAL should be positive')
+    if 'COUNT' in parts:
+        kwargs['count'] = _parse_int('COUNT', parts.pop('COUNT'))
+        if kwargs['count'] < 1:
+            raise ValueError('COUNT should be positive')
+    if 'UNTIL' in parts:
+        kwargs['until'] = _parse_until(parts.pop('UNTIL'))
+    if 'BYMONTHDAY' in parts:
+        kwargs['by_month_day'] = _parse_int_list('BYMONTHDAY', parts.pop('BYMONTHDAY'), 31)
+    if 'BYMONTH' in parts:
+        kwargs['by_month'] = _parse_int_list('BYMONTH', parts.pop('BYMONTH'), 12)
+        if min(kwargs['by_month']) < 0:
+            raise ValueError('BYMONTH should be positive')
+    if 'BYDAY' in parts:
+        by_day = []
+        for item in parts.pop('BYDAY').split(','):
+            match = BY_DAY_REGEX.match(item)
+            if match is None:
+                raise ValueError('malformed BYDAY value "{}"'.format(item))
+            by_day.append((int(match.group(1) or 0), WEEKDAYS.index(match.group(2))))
+        kwargs['by_day'] = tuple(sorted(set(by_day)))
+    if parts:
+        raise ValueError('unsupported parts: {}'.format(', '.join(sorted(parts))))
+
+    rule = RecurrenceRule(**kwargs)
+    if rule.count is not None and rule.until is not None:
+        raise ValueError('COUNT and UNTIL should not be used together')
+    if rule.freq in (FrequencyEnum.daily, FrequencyEnum.weekly):
+        if rule.by_month_day or rule.by_month:
+            raise ValueError('BYMONTHDAY and BYMONTH are supported only for MONTHLY and YEARLY rules')
+        if any(n for n, _ in rule.by_day):
+            raise ValueError('n-th weekday is supported only for MONTHLY and YEARLY rules')
+    if rule.freq == FrequencyEnum.monthly and rule.by_month:
+        raise ValueError('BYMONTH is supported only for YEARLY rules')
+    if rule.freq == FrequencyEnum.yearly and not rule.by_month and any(n for n, _ in rule.by_day):
+        # the n-th weekday of the whole year
+        raise ValueError('n-th weekday of a YEARLY rule is supported only with BYMONTH')
+    return rule
+
+
+class CompiledRule(ABC):
+    def __init__(self, rule: RecurrenceRule):
+        self.rule = rule
+
+    def iterate(self, dtstart: int, after: int = None) -> Iterator[int]:
+        # dtstart is always the first occurrence, even if it does not match the rule, as in rfc 5545
+        rule = self.rule
+        if after is None or dtstart >= after:
+            if rule.until is not None and dtstart > rule.until:
+                return
+            yield dtstart
+            after = dtstart + 1
+        if rule.count == 1:
+            return
+        time_of_day = dtstart % DAY
+        after_day = -((time_of_day - after) // DAY)
+        count, until = rule.count, rule.until
+        for index, day in self._iterate_days(dtstart // DAY, after_day):
+            if count is not None and index + 1 >= count:
+                return
+            timestamp = day * DAY + time_of_day
+            if until is not None and timestamp > until:
+                return
+            yield timestamp
+
+    @abstractmethod
+    def _iterate_days(self, start_day: int, after_day: int) -> Iterator[tuple[int, int]]:
+        # yields (index of occurrence after dtstart or -1 if unknown, day since epoch) for days > start_day
+        pass
+
+
+class DayTableRule(CompiledRule):
+    # daily and weekly rules repeat with a fixed period of days, so occurrences are a precomputed
+    # table of offsets inside a period and seeking to any date is a division
+    def __init__(self, rule: RecurrenceRule):
+        super().__init__(rule)
+        by_weekday = {day for _, day in rule.by_day}
+        if rule.freq == FrequencyEnum.daily:
+            self.period = lcm(rule.interval, 7) if by_weekday else rule.interval
+        else:
+            self.period = 7 * rule.interval
+        self.by_weekday = by_weekday
+        self._tables = [self._make_table(start_weekday) for start_weekday in range(7)]
+
+    def _make_table(self, start_weekday: int) -> tuple[int, tuple[int, ...]]:
+        # (shift of the period base from the start day, sorted offsets of occurrences from the period base)
+        if self.rule.freq == FrequencyEnum.daily:
+            weekdays = self.by_weekday or set(range(7))
+            table = tuple(
+                offset for offset in range(0, self.period, self.rule.interval)
+                if (start_weekday + offset) % 7 in weekdays
+            )
+            return 0, table
+        weekdays = self.by_weekday or {start_weekday}
+        return -start_weekday, tuple(sorted(weekdays))
+
+    def _iterate_days(self, start_day: int, after_day: int) -> Iterator[tuple[int, int]]:
+        shift, table = self._tables[weekday(start_day)]
+        if not table:
+            return
+        base = start_day + shift
+        period = self.period
+        size = len(table)
+        first = bisect_left(table, start_day + 1 - base)  # occurrences of the first period up to dtstart are skipped
+
+        target = max(after_day, start_day + 1)
+        k, position = divmod(target - base, period)
+        i = bisect_left(table, position)
+        if i == size:
+            k, i = k + 1, 0
+        index = k * size + i - first
+        day = base + k * period
+        while True:
+            while i < size:
+                yield index, day + table[i]
+                index += 1
+                i += 1
+            day += period
+            i = 0
+
+
+class MonthRule(CompiledRule):
+    # monthly and yearly rules: months are stepped with integer month indices and days inside
+    # a month are computed from the weekday of its first day. The number of occurrences in a month is not
+    # fixed, so with COUNT the months are walked from dtstart to count the occurrences before the target;
+    # the walk stops at the last one, so it is O(COUNT) months at most
+    def __init__(self, rule: RecurrenceRule):
+        super().__init__(rule)
+        if rule.freq == FrequencyEnum.monthly:
+            self.period = rule.interval
+        else:
+            self.period = 12 * rule.interval
+
+    def _month_offsets(self, start_month: int) -> tuple[int, ...]:
+        rule = self.rule
+        if rule.freq == FrequencyEnum.monthly:
+            return (0,)
+        if rule.by_month:
+            return tuple(m - 1 for m in rule.by_month)
+        if rule.by_day or rule.by_month_day:
+            return tuple(range(12))  # days of every month match
+        return (start_month - 1,)
+
+    def _days_of_month(self, year: int, month: int, start_day_of_month: int) -> list[int]:
+        # BYDAY limits BYMONTHDAY when both are given, as in rfc 5545: BYDAY=FR;BYMONTHDAY=13 is Friday the 13th
+        length = days_in_month(year, month)
+        rule = self.rule
+        days = set()
+        for day in rule.by_month_day or (() if rule.by_day else (start_day_of_month,)):
+            day = day if day > 0 else length + day + 1
+            if 1 <= day <= length:
+                days.add(day)
+        if rule.by_day:
+            weekdays = set()
+            first_weekday = weekday(days_from_civil(year, month, 1))
+            for n, day_of_week in rule.by_day:
+                first = 1 + (day_of_week - first_weekday) % 7
+                matching = range(first, length + 1, 7)
+                if n == 0:
+                    weekdays.update(matching)
+                elif n <= len(matching) and -n <= len(matching):
+                    weekdays.add(matching[n - 1] if n > 0 else matching[n])
+            days = days & weekdays if rule.by_month_day else weekdays
+        return sorted(days)
+
+    def _iterate_days(self, start_day: int, after_day: int) -> Iterator[tuple[int, int]]:
+        year, month, day_of_month = civil_from_days(start_day)
+        offsets = self._month_offsets(month)
+        base = year * 12 if self.rule.freq == FrequencyEnum.yearly else year * 12 + month - 1
+        target = max(after_day, start_day + 1)
+
+        k = 0
+        index = 0
+        last_found = 0
+        if self.rule.count is None:
+            # occurrence indices are needed only for COUNT, so without it the search jumps straight to the target
+            target_year, target_month, _ = civil_from_days(target)
+            k = max(0, (target_year * 12 + target_month - 1 - base) // self.period)
+            last_found = k
+            index = -1
+        while k - last_found <= 4800:  # the gregorian calendar repeats every 400 years
+            period_start = base + k * self.period
+            for offset in offsets:
+                year, month = divmod(period_start + offset, 12)
+                month += 1
+                month_start = days_from_civil(year, month, 1)
+                if month_start + 31 <= start_day:
+                    continue
+                for day in self._days_of_month(year, month, day_of_month):
+                    day += month_start - 1
+                    if day <= start_day:
+                        continue
+                    last_found = k
+                    if day >= target:
+                        yield index, day
+                    elif self.rule.count is not None and index + 2 >= self.rule.count:
+                        return  # the series is over before the target
+                    if index >= 0:
+                        index += 1
+            k += 1
+
+
+@lru_cache(maxsize=1024)
+def compile_rule(text: str) -> CompiledRule:
+    rule = parse_rule(text)
+    if rule.freq in (FrequencyEnum.daily, FrequencyEnum.weekly):
+        return DayTableRule(rule)
+    return MonthRule(rule)
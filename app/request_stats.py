@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+from contextlib import contextmanager
+from functools import wraps
+import time
+from typing import (
+    Callable,
+    Iterator,
+)
+
+from flask import (
+    g,
+    has_request_context,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+def add(name: str, value: float = 1) -> None:
+    # per-request counters for instrumentation; outside of a request (cli, tests, benchmarks) it does nothing
+    if has_request_context():
+        stats = g.setdefault('request_stats', {})
+        stats[name] = stats.get(name, 0) + value
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault('request_stats_query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    started = conn.info['request_stats_query_started'].pop()
+    add('sql_statements')
+    add('sql_seconds', time.perf_counter() - started)
+
+
+def count_sql_statements() -> None:
+    # listens to all engines, so it is enough to call it once per process
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def reset() -> None:
+    # g belongs to the app context, which is shared by several requests when it is pushed by hand (e.g. in tests)
+    g.request_stats = {}
+    g.request_timings = {}
+    g.request_stages = []
+
+
+def get() -> dict[str, float]:
+    if has_request_context():
+        return g.get('request_stats', {})
+    return {}
+
+
+def get_timings() -> dict[str, float]:
+    if has_request_context():
+        return g.get('request_timings', {})
+    return {}
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    # stages are exclusive: time spent in a nested stage is not counted in the enclosing one,
+    # so database queries made during authentication are counted as db, not auth
+    if not has_request_context():
+        yield
+        return
+    stages = g.setdefault('request_stages', [])
+    timings = g.setdefault('request_timings', {})
+    now = time.perf_counter()
+    if stages:
+        outer = stages[-1]
+        timings[outer[0]] = timings.get(outer[0], 0) + now - outer[1]
+    stages.append([name, now])
+    try:
+        yield
+    finally:
+        now = time.perf_counter()
+        _, started = stages.pop()
+        timings[name] = timings.get(name, 0) + now - started
+        if stages:
+            stages[-1][1] = now
+
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+from functools import wraps
+import time
+from typing import Callable
+
+from flask import (
+    Flask,
+    g,
+    has_request_context,
+    request,
+    Response,
+)
+from flask_sqlalchemy import SignallingSession
+from sqlalchemy import event
+
+REPLICA_BIND = 'replica'
+LAST_WRITE_COOKIE = 'last_write'
+
+
+def read_only(func: Callable) -> Callable:
+    # marks a view whose queries may go to the read replica
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        g.read_only = True
+        return func(*args, **kwargs)
+    return wrapper
+
+
+class RoutingSession(SignallingSession):
+    # sends queries of read_only views to the replica bind; flushes and everything else go to the primary
+    def __init__(self, db, **options):
+        super().__init__(db, **options)
+        event.listen(self, 'after_flush', _mark_write)
+
+    def get_bind(self, mapper=None, clause=None):
+        routing = self.app.extensions.get('read_replica')
+        if routing is not None and not self._flushing and routing.use_replica():
+            return routing.engine
+        return super().get_bind(mapper, clause)
+
+
+def _mark_write(session, flush_context) -> None:
+    if has_request_context():
+        g.wrote = True
+
+
+class ReadReplicaRouting:
+    # with READ_YOUR_WRITES_WINDOW a client which wrote something reads from the primary for that many seconds,
+    # so that it does not miss its own writes because of replication lag
+    def __init__(self, app: Flask = None):
+        self.engine = None
+        self.read_your_writes_window = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        self.read_your_writes_window = app.config['READ_YOUR_WRITES_WINDOW']
+        app.extensions['read_replica'] = self
+        with app.app_context():
+            self.engine = app.extensions['sqlalchemy'].db.get_engine(bind=REPLICA_BIND)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def use_replica(self) -> bool:
+        return has_request_context() and g.get('read_only', False) and not g.get('recent_write', False)
+
+    def _before_request(self) -> None:
+        # g belongs to the app context, which is shared by several requests when it is pushed by hand (e.g. in tests)
+        g.read_only = False
+        g.wrote = False
+        g.recent_write = False
+        if self.read_your_writes_window:
+            try:
+                last_write = float(request.cookies.get(LAST_WRITE_COOKIE, 0))
+            except ValueError:
+                last_write = 0
+            g.recent_write = time.time() - last_write < self.read_your_writes_window
+
+    def _after_request(self, response: Response) -> Response:
+        if self.read_your_writes_window and g.get('wrote', False):
+            response.set_cookie(
+                LAST_WRITE_COOKIE, str(round(time.time(), 3)), max_age=int(self.read_your_writes_window) + 1,
+            )
+        return response
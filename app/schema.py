@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import click
+from flask import (
+    current_app,
+    Flask,
+)
+from flask.cli import with_appcontext
+from sqlalchemy import inspect
+from sqlalchemy.engine import Engine
+
+from .models import (
+    db,
+    metadata,
+)
+
+
+def create_schema(app: Flask) -> None:
+    # creates missing tables in the main database and in every shard, existing tables are not touched
+    # TODO proper migrations in case of actually using this app
+    with app.app_context():
+        db.create_all()
+    shards = app.extensions.get('shards')
+    if shards is not None:
+        for engine in shards.engines:
+            metadata.create_all(engine)
+
+
+def find_missing_columns(engine: Engine) -> list[str]:
+    # create_all does not touch existing tables, so a database created by an older version lacks newer columns
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    missing = []
+    for table in metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        missing.extend(
+            '{}.{}'.format(table.name, column.name) for column in table.columns if column.name not in existing
+        )
+    return missing
+
+
+@click.command('db-init')
+@with_appcontext
+def db_init_command() -> None:
+    """Create missing tables of the main database and of the shards, run it before the first start."""
+    create_schema(current_app)
+    shards = current_app.extensions.get('shards')
+    engines = [db.engine] + ([] if shards is None else shards.engines)
+    for engine in engines:
+        missing = find_missing_columns(engine)
+        if missing:
+            raise click.ClickException('{} has no columns {}, migrate or recreate it'.format(
+                engine.url.render_as_string(hide_password=True), ', '.join(missing),
+            ))
+    click.echo('schema is up to date')
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+from dataclasses import (
+    dataclass,
+    field,
+)
+from datetime import (
+    datetime,
+    timezone,
+)
+from collections import defaultdict
+import random
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import (
+    func,
+    insert,
+)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .models import (
+    db,
+    Invitation,
+    Meeting,
+    MeetingIdSequence,
+    User,
+)
+from .sharding import (
+    get_shards,
+    Shards,
+)
+from .types import RepeatTypeEnum
+
+DAY = 60 * 60 * 24
+YEAR = 365 * DAY
+CHUNK_SIZE = 50_000
+DURATIONS = (900, 1800, 3600, 7200)
+RECURRENCE_RULES = (
+    'FREQ=WEEKLY;BYDAY=MO,WE,FR',
+    'FREQ=MONTHLY;BYDAY=-1FR',
+    'FREQ=DAILY;INTERVAL=2;COUNT=30',
+)
+DEFAULT_REPEAT_TYPES = {
+    RepeatTypeEnum.none: 80,
+    RepeatTypeEnum.daily: 4,
+    RepeatTypeEnum.weekly: 6,
+    RepeatTypeEnum.every_working_day: 3,
+    RepeatTypeEnum.monthly: 3,
+    RepeatTypeEnum.yearly: 2,
+    RepeatTypeEnum.custom: 2,
+}
+DEFAULT_INVITEES = {0: 30, 1: 30, 2: 20, 3: 10, 10: 10}
+DEFAULT_NOW = '2022-06-22'
+
+
+@dataclass
+class SeedConfig:
+    users: int = 100
+    meetings: int = 1000
+    seed: int = 0
+    now: int = 0
+    repeat_types: dict[RepeatTypeEnum, float] = field(default_factory=lambda: dict(DEFAULT_REPEAT_TYPES))
+    invitees: dict[int, float] = field(default_factory=lambda: dict(DEFAULT_INVITEES))
+    private_ratio: float = 0.1
+    accept_ratio: float = 0.5
+    decline_ratio: float = 0.1
+    username_prefix: str = 'user'
+    password: str = 'password'
+
+
+def _insert_chunked(session: Session, model, rows: list[dict]) -> None:
+    for i in range(0, len(rows), CHUNK_SIZE):
+        session.execute(insert(model), rows[i:i + CHUNK_SIZE])
+
+
+def _insert_meetings(meetings: list[dict], invitations: list[dict], shards: Shards | None, sequences: list[int]) -> None:
+    if shards is None:
+        _insert_chunked(db.session, Meeting, meetings)
+        _insert_chunked(db.session, Invitation, invitations)
+        return
+    # generated ids are replaced with ids of the creator shards, see app.sharding
+    ids = {}
+    rows = defaultdict(lambda: ([], []))
+    for meeting in meetings:
+        index = shards.index_for_user(meeting['creator_id'])
+        sequences[index] += 1
+        ids[meeting['id']] = meeting['id'] = sequences[index] * len(shards) + index
+        rows[index][0].append(meeting)
+    for invitation in invitations:
+        invitation['meeting_id'] = ids[invitation['meeting_id']]
+        rows[shards.index_for_meeting(invitation['meeting_id'])][1].append(invitation)
+    for index, (shard_meetings, shard_invitations) in rows.items():
+        _insert_chunked(shards.session(index), Meeting, shard_meetings)
+        _insert_chunked(shards.session(index), Invitation, shard_invitations)
+
+
+def _next_id(model) -> int:
+    return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+
+def _make_meeting(meeting_id: int, user_ids: range, config: SeedConfig, rng: random.Random) -> dict:
+    repeat_type = rng.choices(list(config.repeat_types), weights=list(config.repeat_types.values()))[0]
+    if repeat_type == RepeatTypeEnum.none:
+        start = config.now + rng.randrange(-YEAR, YEAR)
+    else:
+        start = config.now - rng.randrange(5 * YEAR)  # both old and new series
+    start -= start % 900
+    return dict(
+        id=meeting_id,
+        creator_id=rng.choice(user_ids),
+        start=start,
+        end=start + rng.choice(DURATIONS),
+        repeat_type=repeat_type,
+        recurrence_rule=rng.choice(RECURRENCE_RULES) if repeat_type == RepeatTypeEnum.custom else None,
+        description='meeting {}'.format(meeting_id),
+        is_private=rng.random() < config.private_ratio,
+    )
+
+
+def _make_answer(config: SeedConfig, rng: random.Random) -> bool | None:
+    value = rng.random()
+    if value < config.accept_ratio:
+        return True
+    if value < config.accept_ratio + config.decline_ratio:
+        return False
+    return None
+
+
+def generate(config: SeedConfig) -> tuple[int, int, int]:
+    # writes straight into the tables of the current app context, returns numbers of created users, meetings
+    # and invitations; the same config always produces the same rows
+    rng = random.Random(config.seed)
+    shards = get_shards()
+    first_user_id = _next_id(User)
+    user_ids = range(first_user_id, first_user_id + config.users)
+    password_hash = User.generate_password_hash(config.password)
+    users = [
+        dict(id=user_id, name='{}{}'.format(config.username_prefix, user_id), password_hash=password_hash)
+        for user_id in user_ids
+    ]
+    _insert_chunked(db.session, User, users)
+    sequences = []
+    if shards is not None:
+        for session in shards.sessions():
+            _insert_chunked(session, User, users)
+            sequences.append(session.query(func.max(MeetingIdSequence.id)).scalar() or 0)
+        last_sequences = list(sequences)
+
+    invitee_counts = list(config.invitees)
+    invitee_weights = list(config.invitees.values())
+    first_meeting_id = _next_id(Meeting)
+    meetings = []
+    invitations = []
+    invitations_count = 0
+    for meeting_id in range(first_meeting_id, first_meeting_id + config.meetings):
+        meeting = _make_meeting(meeting_id, user_ids, config, rng)
+        meetings.append(meeting)
+        invitees_count = min(rng.choices(invitee_counts, weights=invitee_weights)[0], len(user_ids))
+        invitations.extend(
+            dict(meeting_id=meeting_id, invitee_id=invitee_id, answer=_make_answer(config, rng))
+            for invitee_id in rng.sample(user_ids, invitees_count) if invitee_id != meeting['creator_id']
+        )
+        if len(meetings) >= CHUNK_SIZE:
+            invitations_count += len(invitations)
+            _insert_meetings(meetings, invitations, shards, sequences)
+            meetings, invitations = [], []
+    invitations_count += len(invitations)
+    _insert_meetings(meetings, invitations, shards, sequences)
+    db.session.commit()
+    if shards is not None:
+        for index, session in enumerate(shards.sessions()):
+            if sequences[index] != last_sequences[index]:
+                session.add(MeetingIdSequence(id=sequences[index]))
+            session.commit()
+    return config.users, config.meetings, invitations_count
+
+
+def parse_weights(text: str, key_type: type) -> dict:
+    weights = {}
+    for part in text.split(','):
+        key, sep, weight = part.partition('=')
+        if not sep:
+            raise ValueError('expected <value>=<weight>, got "{}"'.format(part))
+        weights[key_type(key.strip())] = float(weight)
+    if any(weight < 0 for weight in weights.values()) or not sum(weights.values()):
+        raise ValueError('weights should be non-negative and not all zero')
+    return weights
+
+
+def _weights_option(key_type: type):
+    def callback(ctx: click.Context, param: click.Parameter, value: str | None) -> dict | None:
+        if value is None:
+            return None
+        try:
+            return parse_weights(value, key_type)
+        except ValueError as e:
+            raise click.BadParameter(str(e))
+    return callback
+
+
+def _now_option(ctx: click.Context, param: click.Parameter, value: str) -> int:
+    # a fixed date by default, so that the same --seed gives the same data on any day
+    if value == 'today':
+        timestamp = int(datetime.now(tz=timezone.utc).timestamp())
+        return timestamp - timestamp % DAY
+    date = datetime.fromisoformat(value)
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return int(date.timestamp())
+
+
+@click.command('seed')
+@click.option('--users', type=click.IntRange(min=1), default=100, show_default=True)
+@click.option('--meetings', type=click.IntRange(min=0), default=1000, show_default=True)
+@click.option('--seed', type=int, default=0, show_default=True)
+@click.option(
+    '--now', callback=_now_option, default=DEFAULT_NOW, show_default=True,
+    help='iso date the meetings are generated around, or "today"',
+)
+@click.option(
+    '--repeat-types', callback=_weights_option(RepeatTypeEnum),
+    help='weights of repeat types, e.g. "none=80,daily=10,custom=10"',
+)
+@click.option('--invitees', callback=_weights_option(int), help='weights of invitee counts, e.g. "0=50,2=30,10=20"')
+@click.option('--private-ratio', type=click.FloatRange(0, 1), default=0.1, show_default=True)
+@click.option('--accept-ratio', type=click.FloatRange(0, 1), default=0.5, show_default=True)
+@click.option('--decline-ratio', type=click.FloatRange(0, 1), default=0.1, show_default=True)
+@click.option('--username-prefix', default='user', show_default=True)
+@click.option('--password', default='password', show_default=True)
+@with_appcontext
+def seed_command(repeat_types: dict | None, invitees: dict | None, **kwargs) -> None:
+    """Fill the database with generated users, meetings and invitations."""
+    if kwargs['accept_ratio'] + kwargs['decline_ratio'] > 1:
+        raise click.BadParameter('accept and decline ratios should not sum to more than 1')
+    config = SeedConfig(**kwargs)
+    if repeat_types is not None:
+        config.repeat_types = repeat_types
+    if invitees is not None:
+        config.invitees = invitees
+    try:
+        users, meetings, invitations = generate(config)
+    except IntegrityError:
+        db.session.rollback()
+        raise click.ClickException('some of generated usernames already exist, use another --username-prefix')
+    click.echo('created {} users, {} meetings, {} invitations'.format(users, meetings, invitations))
@@ -3,3 +3,66 @@ import os
 basedir = os.path.abspath(os.path.dirname(__file__))
 
 SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, '../app.db')
+# workers do not touch the schema on start, tables are created by `flask db-init`
+CREATE_SCHEMA_ON_STARTUP = False
+# queries of the main views are run for the most active users before /ready reports the worker ready
+WARMUP_ENABLED = False
+WARMUP_USERS = 50
+WARMUP_IN_BACKGROUND = True  # otherwise create_app waits for the warm-up
+# database replicated from the main one, get views read from it
+READ_REPLICA_DATABASE_URI = os.environ.get('READ_REPLICA_DATABASE_URI')
+READ_YOUR_WRITES_WINDOW = 5  # seconds, 0 to always read from the replica
+# comma separated, meetings and invitations are partitioned across these databases if given
+SHARD_DATABASE_URIS = [uri for uri in os.environ.get('SHARD_DATABASE_URIS', '').split(',') if uri]
+
+REMINDERS_POLL_INTERVAL = 5  # seconds between reads of changed meetings by `flask reminders`
+
+CAPTURE_FILE = os.environ.get('CAPTURE_FILE')
+CAPTURE_AUTHORIZATION = False
+
+FREE_WINDOW_HORIZON = 60 * 60 * 24 * 365 * 10  # seconds, default for requests which do not pass horizon
+FREE_WINDOW_EXPANSION_BUDGET = 100_000  # meeting occurrences, None for unlimited
+FREE_WINDOW_CACHE_SIZE = 10_000  # cached search results per process, 0 disables the cache
+FREE_WINDOW_CACHE_BUCKET = 60 * 60  # seconds, searches with start in the same bucket share a cache entry
+
+SERVER_TIMING_ENABLED = True
+
+# seconds, searches return a partial result after it; clients may ask for another one with X-Request-Timeout
+REQUEST_DEADLINE = 10  # None disables deadlines
+REQUEST_DEADLINE_MAX = 30
+
+SLOW_QUERY_THRESHOLD = 0.1  # seconds, None disables sql tracing
+SLOW_QUERY_EXPLAIN = False
+REPEATED_QUERY_THRESHOLD = 20
+
+METRICS_ENABLED = True
+METRICS_DIR = os.environ.get('METRICS_DIR')  # has to be shared by all worker processes
+METRICS_FLUSH_INTERVAL = 5
+
+# sqlite file with token buckets of clients, shared by all worker processes; None disables rate limiting
+RATE_LIMIT_DATABASE = os.environ.get('RATE_LIMIT_DATABASE')
+RATE_LIMIT_CAPACITY = 100  # tokens, the largest burst of a client
+RATE_LIMIT_RATE = 2  # tokens per second
+RATE_LIMIT_COSTS = {'find_free_window': 10, 'user_meetings': 2, 'ping': 0, 'ready': 0, 'metrics': 0}  # 1 by default
+RATE_LIMIT_CONCURRENCY = {'find_free_window': 4}  # requests running at once in all worker processes
+RATE_LIMIT_SLOT_TIMEOUT = 60  # seconds, slots of a crashed worker are freed after it
+RATE_LIMIT_CREDENTIALS_TTL = 60  # seconds a checked password is trusted without hashing it again
+
+MEETING_CHANGES_LIMIT = 500  # meetings per response of GET /users/<username>/meetings/changes and database
+
+# GET /users/<username>/events streams changes of calendars, see app.events
+EVENTS_ENABLED = True
+EVENTS_POLL_INTERVAL = 5  # seconds, events written by other processes are noticed after it
+EVENTS_STREAM_TIMEOUT = 300  # seconds, streams are closed after it, clients reconnect from the last event
+EVENTS_RETENTION = 60 * 60 * 24 * 7  # seconds
+
+# sqlite file with jobs queued by POST /jobs and run by `flask jobs-worker`, None disables jobs
+JOBS_DATABASE = os.environ.get('JOBS_DATABASE')
+JOBS_WORKER_CONCURRENCY = 2  # processes started by `flask jobs-worker`
+JOBS_POLL_INTERVAL = 1  # seconds between checks of an empty queue
+JOBS_STALE_TIMEOUT = 300  # seconds without progress after which a running job is queued again
+JOBS_MAX_ATTEMPTS = 3
+
+PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN')  # requests with this X-Profile header are profiled
+PROFILING_DIR = os.path.join(basedir, '../profiles')
+PROFILING_TOP = 20
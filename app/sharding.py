@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from typing import (
+    Callable,
+    TypeVar,
+)
+import zlib
+
+from flask import (
+    current_app,
+    Flask,
+    g,
+)
+from sqlalchemy import (
+    create_engine,
+    insert,
+)
+from sqlalchemy.engine import (
+    Engine,
+    make_url,
+)
+from sqlalchemy.orm import Session
+
+from .models import (
+    MeetingIdSequence,
+    User,
+)
+
+T = TypeVar('T')
+
+
+class Shards:
+    # meetings and their invitations live on the shard of the meeting creator, users are copied to every shard
+    # so that relationships keep working inside a shard; meeting ids are <sequence number> * N + <shard index>,
+    # so the shard of a meeting is known from its id
+    def __init__(self, app: Flask = None):
+        self.engines: list[Engine] = []
+        self._executor: ThreadPoolExecutor | None = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        self.engines = [_create_engine(uri) for uri in app.config['SHARD_DATABASE_URIS']]
+        self._executor = ThreadPoolExecutor(max_workers=len(self.engines), thread_name_prefix='shards')
+        app.extensions['shards'] = self
+        app.teardown_appcontext(self._close_sessions)
+
+    def __len__(self) -> int:
+        return len(self.engines)
+
+    def index_for_user(self, user_id: int) -> int:
+        return zlib.crc32(str(user_id).encode()) % len(self.engines)
+
+    def index_for_meeting(self, meeting_id: int) -> int:
+        return meeting_id % len(self.engines)
+
+    def session(self, index: int) -> Session:
+        # one session per shard and app context, like db.session
+        sessions = g.setdefault('shard_sessions', {})
+        if index not in sessions:
+            sessions[index] = Session(bind=self.engines[index])
+        return sessions[index]
+
+    def sessions(self) -> list[Session]:
+        return [self.session(index) for index in range(len(self.engines))]
+
+    def allocate_meeting_id(self, index: int) -> int:
+        # the sequence row is inserted in the transaction of the meeting, so ids are never reused
+        sequence = self.session(index).execute(insert(MeetingIdSequence)).inserted_primary_key[0]
+        return sequence * len(self.engines) + index
+
+    def map(self, func: Callable[[Session], list[T]]) -> list[T]:
+        # runs func for every shard in parallel and concatenates the results; sessions are only handed over
+        # to the pool threads, the calling thread does not touch them until all of them are done
+        return list(chain.from_iterable(self._executor.map(func, self.sessions())))
+
+    def add_user(self, user: User) -> None:
+        # attributes are read here, the user object belongs to the session of the calling thread
+        values = dict(id=user.id, name=user.name, password_hash=user.password_hash)
+
+        def add(session: Session) -> list:
+            session.add(User(**values))
+            session.commit()
+            return []
+        self.map(add)
+
+    @staticmethod
+    def _close_sessions(error: BaseException | None) -> None:
+        for session in g.pop('shard_sessions', {}).values():
+            session.close()
+
+
+def _create_engine(uri: str) -> Engine:
+    if make_url(uri).get_backend_name() == 'sqlite':
+        # sessions are used by the pool threads and then by the request thread
+        return create_engine(uri, connect_args={'check_same_thread': False})
+    return create_engine(uri)
+
+
+def get_shards() -> Shards | None:
+    return current_app.extensions.get('shards')
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+from collections import Counter
+import logging
+import time
+
+from flask import (
+    Flask,
+    g,
+    has_request_context,
+    request,
+    Response,
+)
+from sqlalchemy import event
+
+from .models import db
+
+logger = logging.getLogger(__name__)
+
+MAX_PARAMETERS_LENGTH = 1000
+
+
+class SlowQueryLog:
+    # times every statement of the app engines (main, binds such as the read replica, shards); statements slower than SLOW_QUERY_THRESHOLD seconds are logged
+    # with their parameters (and query plan if SLOW_QUERY_EXPLAIN), statements repeated more than
+    # REPEATED_QUERY_THRESHOLD times during a request are logged as a probable N+1
+    def __init__(self, app: Flask = None):
+        self.threshold = 0.0
+        self.explain = False
+        self.repeated_threshold = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        self.threshold = app.config['SLOW_QUERY_THRESHOLD']
+        self.explain = app.config['SLOW_QUERY_EXPLAIN']
+        self.repeated_threshold = app.config['REPEATED_QUERY_THRESHOLD']
+        app.extensions['slow_query_log'] = self
+        with app.app_context():
+            engines = [db.get_engine()] + [db.get_engine(bind=bind) for bind in app.config.get('SQLALCHEMY_BINDS') or {}]
+        shards = app.extensions.get('shards')
+        if shards is not None:
+            engines.extend(shards.engines)
+        # not on the Engine class, engines of other apps in the process have settings of their own
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+        conn.info.setdefault('slow_query_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        elapsed = time.perf_counter() - conn.info['slow_query_started'].pop()
+        if has_request_context() and 'sql_statement_counts' in g:
+            g.sql_statement_counts[statement] += 1
+        if elapsed < self.threshold:
+            return
+        message = 'Slow query took %.1f ms: %s; parameters: %s'
+        args = [elapsed * 1000, statement, _format_parameters(parameters)]
+        if self.explain and not executemany and statement.lstrip().upper().startswith('SELECT'):
+            message += '\n%s'
+            args.append(self._explain(conn, cursor, statement, parameters))
+        logger.warning(message, *args)
+
+    @staticmethod
+    def _explain(conn, cursor, statement, parameters) -> str:
+        # goes straight to the dbapi cursor so that the explain statement does not trigger the events again
+        prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+        explain_cursor = cursor.connection.cursor()
+        try:
+            explain_cursor.execute(prefix + statement, parameters)
+            return '\n'.join(' '.join(str(value) for value in row) for row in explain_cursor.fetchall())
+        except Exception as e:
+            return 'explain failed: {}'.format(e)
+        finally:
+            explain_cursor.close()
+
+    @staticmethod
+    def _before_request() -> None:
+        g.sql_statement_counts = Counter()
+
+    def _after_request(self, response: Response) -> Response:
+        counts = g.pop('sql_statement_counts', None)
+        if counts:
+            statement, count = counts.most_common(1)[0]
+            if count > self.repeated_threshold:
+                logger.warning(
+                    'Statement executed %s times during %s %s (%s statements in total): %s',
+                    count, request.method, request.path, sum(counts.values()), statement,
+                )
+        return response
+
+
+def _format_parameters(parameters) -> str:
+    text = repr(parameters)
+    if len(text) > MAX_PARAMETERS_LENGTH:
+        text = text[:MAX_PARAMETERS_LENGTH] + '...'
+    return text
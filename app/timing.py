@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import time
+
+from flask import (
+    Flask,
+    g,
+    request,
+    Response,
+)
+
+from . import request_stats
+
+logger = logging.getLogger(__name__)
+
+# stages are timed by request_stats.stage, every stage is reported even if a request did not enter it,
+# so that dashboards always see the same set of metrics
+STAGES = ('validation', 'auth', 'db', 'expansion', 'serialization')
+
+
+class ServerTiming:
+    # adds Server-Timing header with per-stage durations to every response and logs the same as a json line
+    def __init__(self, app: Flask = None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        app.extensions['server_timing'] = self
+        request_stats.count_sql_statements()
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    @staticmethod
+    def _before_request() -> None:
+        request_stats.reset()
+        g.timing_started = time.perf_counter()
+
+    @staticmethod
+    def _after_request(response: Response) -> Response:
+        timings = request_stats.get_timings()
+        durations = {stage: timings.get(stage, 0) * 1000 for stage in STAGES}
+        # sql overlaps with the stages: it includes queries made outside of db_actions, e.g. lazy loads
+        durations['sql'] = request_stats.get().get('sql_seconds', 0) * 1000
+        durations['total'] = (time.perf_counter() - g.timing_started) * 1000
+        response.headers['Server-Timing'] = ', '.join(
+            '{};dur={:.3f}'.format(name, duration) for name, duration in durations.items()
+        )
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(dict(
+                method=request.method,
+                path=request.path,
+                endpoint=request.endpoint,
+                status=response.status_code,
+                sql_statements=request_stats.get().get('sql_statements', 0),
+                **{'{}_ms'.format(name): round(duration, 3) for name, duration in durations.items()},
+            )))
+        return response
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import json
+import threading
+import time
+from typing import (
+    Callable,
+    Iterable,
+    TextIO,
+)
+from urllib.error import (
+    HTTPError,
+    URLError,
+)
+from urllib.parse import urlencode
+from urllib.request import (
+    Request,
+    urlopen,
+)
+
+import click
+from flask import (
+    current_app,
+    Flask,
+    g,
+    request,
+    Response,
+)
+from flask.cli import with_appcontext
+
+CREDENTIAL_FIELDS = ('password',)
+# still a valid password, so replayed requests are not rejected by validation
+REDACTED = 'redacted'
+
+
+class TrafficCapture:
+    # appends one json line per request to CAPTURE_FILE; lines are written with a single write call
+    # to a file opened for appending, so several worker processes can share the file. Credentials (the
+    # Authorization header and passwords in bodies) are written only with CAPTURE_AUTHORIZATION
+    def __init__(self, app: Flask = None):
+        self._lock = threading.Lock()
+        self._file: TextIO | None = None
+        self.capture_authorization = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        self._file = open(app.config['CAPTURE_FILE'], 'a', encoding='utf-8')
+        self.capture_authorization = app.config['CAPTURE_AUTHORIZATION']
+        app.extensions['traffic_capture'] = self
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    @staticmethod
+    def _before_request() -> None:
+        g.capture_started = time.perf_counter()
+
+    def _after_request(self, response: Response) -> Response:
+        record = dict(
+            ts=round(time.time(), 3),
+            method=request.method,
+            path=request.path,
+            endpoint=request.endpoint,
+            args=request.args.to_dict(flat=False),
+            json=self._redact(request.get_json(silent=True)),
+            status=response.status_code,
+            duration_ms=round((time.perf_counter() - g.capture_started) * 1000, 3),
+        )
+        if self.capture_authorization and 'Authorization' in request.headers:
+            record['authorization'] = request.headers['Authorization']
+        line = json.dumps(record) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+        return response
+
+    def _redact(self, body):
+        if self.capture_authorization or not isinstance(body, dict):
+            return body
+        return {key: REDACTED if key in CREDENTIAL_FIELDS else value for key, value in body.items()}
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_records(lines: Iterable[str]) -> list[dict]:
+    return [json.loads(line) for line in lines if line.strip()]
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+
+def _make_headers(record: dict) -> dict[str, str]:
+    headers = {}
+    if 'authorization' in record:
+        headers['Authorization'] = record['authorization']
+    return headers
+
+
+def make_in_process_sender(app: Flask) -> Callable[[dict], int]:
+    local = threading.local()
+
+    def send(record: dict) -> int:
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        response = local.client.open(
+            record['path'],
+            method=record['method'],
+            query_string=record['args'],
+            json=record['json'],
+            headers=_make_headers(record),
+        )
+        return response.status_code
+
+    return send
+
+
+def make_http_sender(base_url: str, timeout: float) -> Callable[[dict], int]:
+    def send(record: dict) -> int:
+        url = base_url.rstrip('/') + record['path']
+        if record['args']:
+            url += '?' + urlencode(record['args'], doseq=True)
+        headers = _make_headers(record)
+        data = None
+        if record['json'] is not None:
+            data = json.dumps(record['json']).encode()
+            headers['Content-Type'] = 'application/json'
+        try:
+            with urlopen(Request(url, data=data, headers=headers, method=record['method']), timeout=timeout) as response:
+                return response.status
+        except HTTPError as e:
+            return e.code
+        except (URLError, TimeoutError):
+            return 0
+
+    return send
+
+
+def replay(records: list[dict], send: Callable[[dict], int], concurrency: int = 1, rate: float = 0) -> list[dict]:
+    # open loop: with a rate, requests are issued on schedule no matter how long previous ones take
+    results = defaultdict(list)
+    lock = threading.Lock()
+
+    def run(record: dict) -> None:
+        started = time.perf_counter()
+        status = send(record)
+        elapsed = time.perf_counter() - started
+        with lock:
+            results['{} {}'.format(record['method'], record['endpoint'])].append((elapsed, status))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for i, record in enumerate(records):
+            if rate:
+                delay = started + i / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            executor.submit(run, record)
+    elapsed = time.perf_counter() - started
+
+    report = []
+    for endpoint, samples in sorted(results.items()):
+        latencies = sorted(latency for latency, _ in samples)
+        statuses = [status for _, status in samples]
+        report.append(dict(
+            endpoint=endpoint,
+            requests=len(samples),
+            throughput_per_s=round(len(samples) / elapsed, 3) if elapsed else None,
+            p50_ms=round(percentile(latencies, 0.50) * 1000, 3),
+            p90_ms=round(percentile(latencies, 0.90) * 1000, 3),
+            p99_ms=round(percentile(latencies, 0.99) * 1000, 3),
+            client_error_rate=round(sum(400 <= s < 500 for s in statuses) / len(samples), 4),
+            error_rate=round(sum(s >= 500 or s == 0 for s in statuses) / len(samples), 4),
+        ))
+    return report
+
+
+@click.command('replay')
+@click.argument('capture_file', type=click.File('r'))
+@click.option('--url', help='base url of a running server, requests are sent in-process via the test client if omitted')
+@click.option('--concurrency', type=click.IntRange(min=1), default=1, show_default=True)
+@click.option('--rate', type=click.FloatRange(min=0), default=0, help='requests per second, 0 for as fast as possible')
+@click.option('--timeout', type=float, default=30, show_default=True, help='http timeout in seconds')
+@with_appcontext
+def replay_command(capture_file: TextIO, url: str | None, concurrency: int, rate: float, timeout: float) -> None:
+    """Replay captured traffic and print per-endpoint latency percentiles and error rates as json lines."""
+    records = read_records(capture_file)
+    if url is None:
+        send = make_in_process_sender(current_app._get_current_object())
+    else:
+        send = make_http_sender(url, timeout)
+    for line in replay(records, send, concurrency=concurrency, rate=rate):
+        click.echo(json.dumps(line))
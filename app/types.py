@@ -7,4 +7,37 @@ class RepeatTypeEnum(str, Enum):
     weekly = 'weekly'
     every_working_day = 'every_working_day'
     yearly = 'yearly'
-    monthly = 'monthly'
\ No newline at end of file
+    monthly = 'monthly'
+    custom = 'custom'
+
+
+class FrequencyEnum(str, Enum):
+    daily = 'daily'
+    weekly = 'weekly'
+    monthly = 'monthly'
+    yearly = 'yearly'
+
+
+class FreeWindowSearchStatusEnum(str, Enum):
+    found = 'found'
+    horizon_reached = 'horizon_reached'
+    budget_exhausted = 'budget_exhausted'
+    deadline_exceeded = 'deadline_exceeded'
+
+
+class EventKindEnum(str, Enum):
+    meeting_created = 'meeting_created'
+    invited = 'invited'
+    invitation_answered = 'invitation_answered'
+
+
+class JobKindEnum(str, Enum):
+    import_meetings = 'import_meetings'
+    export_meetings = 'export_meetings'
+
+
+class JobStateEnum(str, Enum):
+    queued = 'queued'
+    running = 'running'
+    done = 'done'
+    failed = 'failed'
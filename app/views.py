@@ -1,42 +1,89 @@
 # -*- coding: utf-8 -*-
+from contextlib import closing
 from datetime import (
     datetime,
     timezone,
 )
+import time
+from typing import Iterator
+
 from flask import (
     abort,
+    current_app,
+    g,
     jsonify,
     request,
     Response,
+    stream_with_context,
 )
 from flask.views import MethodView
 
-from . import forms
+from . import (
+    forms,
+    request_stats,
+)
+from .deadlines import get_deadline
 from .db_actions import (
     create_meeting,
     create_user,
-    get_all_meetings_for_several_users,
+    get_busy_intervals_by_user,
+    get_busy_intervals_for_several_users,
+    get_calendar_versions,
+    get_event_id_range,
+    get_events_for_user,
     get_meeting_by_id,
+    get_meeting_changes_for_user,
     get_user_by_name,
+    get_users_by_names,
     set_answer_for_invitation,
+    stream_one_off_busy_intervals_for_several_users,
+)
+from .events import get_event_broker
+from .exceptions import NotFoundException
+from .free_window_cache import get_free_window_cache
+from .jobs import (
+    get_job_queue,
+    Job,
 )
 from .logic import (
-    find_first_free_window_among_meetings,
-    get_user_meetings_for_range,
+    FreeWindowSearch,
     make_meeting_description,
+    search_free_window_among_meetings,
+    search_quorum_window,
+    search_user_meetings_for_range,
+)
+from .models import (
+    db,
+    User,
+)
+from .routing import read_only
+from .types import (
+    FreeWindowSearchStatusEnum,
+    JobKindEnum,
 )
-from .models import User
 
 
 def ping():
     return 'pong'
 
 
+def ready() -> Response:
+    # unlike ping, stays unavailable until the warm-up of the worker is over, see app.warmup
+    warmup = current_app.extensions.get('warmup')
+    if warmup is not None and not warmup.ready.is_set():
+        return jsonify(dict(status='error', error='warming up')), 503
+    return jsonify(dict(status='ok'))
+
+
 class AuthenticationMixin:
+    @request_stats.timed('auth')
     def get_authenticated_user(self) -> User | None:
         auth_info = request.authorization
         if auth_info is None:
             return None
+        user = g.get('authenticated_user')  # already checked by app.rate_limiting
+        if user is not None and user.name == auth_info.username:
+            return user
         user = get_user_by_name(auth_info.username)
         if not user.check_password(auth_info['password']):
             abort(403, 'Wrong password')
@@ -52,14 +99,17 @@ class AuthenticationMixin:
 
 class UsersView(MethodView):
     def post(self) -> Response:
-        form = forms.UsersModel(**request.json)
+        with request_stats.stage('validation'):
+            form = forms.UsersModel(**request.json)
         create_user(name=form.username, password=form.password)
-        return jsonify(dict(status='ok'))
+        with request_stats.stage('serialization'):
+            return jsonify(dict(status='ok'))
 
 
 class MeetingsView(MethodView, AuthenticationMixin):
     def post(self) -> Response:
-        form = forms.MeetingsModel(**request.json)
+        with request_stats.stage('validation'):
+            form = forms.MeetingsModel(**request.json)
 
         creator = get_user_by_name(form.creator_username)
         self.assert_user_is_authenticated(creator)
@@ -68,22 +118,28 @@ class MeetingsView(MethodView, AuthenticationMixin):
             start=int(form.start.astimezone(tz=timezone.utc).timestamp()),
             end=int(form.end.astimezone(tz=timezone.utc).timestamp()),
             description=form.description,
-            invitees=[get_user_by_name(name=name) for name in (form.invitees or [])],
+            invitees=get_users_by_names(form.invitees or []),
             repeat_type=form.repeat_type,
+            recurrence_rule=form.recurrence_rule,
             is_private=form.is_private,
+            remind_before=form.remind_before,
         )
 
-        return jsonify(dict(status='ok', meeting_id=meeting.id))
+        with request_stats.stage('serialization'):
+            return jsonify(dict(status='ok', meeting_id=meeting.id))
 
+    @read_only
     def get(self, meeting_id: int) -> Response:
         meeting = get_meeting_by_id(id=meeting_id)
         desc = make_meeting_description(meeting, requester=self.get_authenticated_user())
-        return jsonify(dict(status='ok', meeting_description=desc))
+        with request_stats.stage('serialization'):
+            return jsonify(dict(status='ok', meeting_description=desc))
 
 
 class AnswerInvitationView(MethodView, AuthenticationMixin):
     def post(self) -> Response:
-        form = forms.AnswerInvitationModel(**request.json)
+        with request_stats.stage('validation'):
+            form = forms.AnswerInvitationModel(**request.json)
         user = get_user_by_name(form.username)
         self.assert_user_is_authenticated(user)
         set_answer_for_invitation(
@@ -91,43 +147,231 @@ class AnswerInvitationView(MethodView, AuthenticationMixin):
             meeting=get_meeting_by_id(form.meeting_id),
             answer=form.answer,
         )
-        return jsonify(dict(status='ok'))
+        with request_stats.stage('serialization'):
+            return jsonify(dict(status='ok'))
 
 
 class UserMeetingsForRangeView(MethodView, AuthenticationMixin):
+    @read_only
     def get(self, username: str) -> Response:
-        form = forms.UserMeetingsForRangeModel(username=username, **request.args)
-        meetings = get_user_meetings_for_range(
+        with request_stats.stage('validation'):
+            form = forms.UserMeetingsForRangeModel(username=username, **request.args)
+        search = search_user_meetings_for_range(
             user=get_user_by_name(form.username),
             start=int(form.start.astimezone(tz=timezone.utc).timestamp()),
             end=int(form.end.astimezone(tz=timezone.utc).timestamp()),
+            deadline=get_deadline(),
         )
-        return jsonify(dict(
-            status='ok',
-            meetings=[
-                make_meeting_description(m, requester=self.get_authenticated_user())
-                for m in meetings
-            ]
+        with request_stats.stage('serialization'):
+            result = dict(
+                status='ok',
+                meetings=[
+                    make_meeting_description(m, requester=self.get_authenticated_user())
+                    for m in search.meetings
+                ]
+            )
+            if not search.complete:
+                # all meetings starting before searched_until are there, the rest can be requested from it
+                result['status'] = 'partial'
+                result['searched_until'] = datetime.fromtimestamp(search.searched_until, tz=timezone.utc).isoformat()
+            return jsonify(result)
+
+
+class UserMeetingChangesView(MethodView, AuthenticationMixin):
+    @read_only
+    def get(self, username: str) -> Response:
+        with request_stats.stage('validation'):
+            form = forms.MeetingChangesModel(username=username, **request.args)
+        changes = get_meeting_changes_for_user(
+            user=get_user_by_name(form.username),
+            sync_token=form.sync_token,
+            limit=current_app.config['MEETING_CHANGES_LIMIT'],
+        )
+        with request_stats.stage('serialization'):
+            return jsonify(dict(
+                status='ok',
+                meetings=[
+                    make_meeting_description(m, requester=self.get_authenticated_user())
+                    for m in changes.meetings
+                ],
+                sync_token='.'.join('{}_{}'.format(seq, id) for seq, id in changes.sync_token),
+                more=changes.more,
+            ))
+
+
+class UserEventsView(MethodView, AuthenticationMixin):
+    RETRY = 1000  # ms, how soon clients reconnect after a stream is closed
+    BATCH_SIZE = 100
+
+    def get(self, username: str) -> Response:
+        user = get_user_by_name(username)
+        self.assert_user_is_authenticated(user)
+        # browsers send the header when they reconnect, the parameter is for the first connection
+        last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+        id_ranges = get_event_id_range()
+        if last_event_id is None:
+            return self.stream(user, [last_id or 0 for _, last_id in id_ranges], reset=False)
+        # with sharding every shard has its own event ids, the id of a message has all of them joined by dots
+        try:
+            after_ids = [int(part) for part in last_event_id.split('.')]
+        except ValueError:
+            after_ids = [-1]
+        if min(after_ids) < 0:
+            abort(400, 'Last-Event-ID should be an event id')
+        if len(after_ids) != len(id_ranges):
+            # e.g. the number of shards changed
+            abort(400, 'Last-Event-ID is not valid, reload the calendar and connect without it')
+        # events after the given one could be deleted already, the client has to reload the calendar then
+        return self.stream(user, after_ids, reset=any(
+            first_id is not None and after_id < first_id - 1 for after_id, (first_id, _) in zip(after_ids, id_ranges)
         ))
 
+    def stream(self, user: User, after_ids: list[int], reset: bool) -> Response:
+        return Response(
+            stream_with_context(self.iterate_messages(user, after_ids, reset)),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+        )
+
+    def iterate_messages(self, user: User, after_ids: list[int], reset: bool) -> Iterator[str]:
+        broker = get_event_broker()
+        yield 'retry: {}\n\n'.format(self.RETRY)
+        if reset:
+            yield 'event: reset\ndata: {}\n\n'
+        with broker.subscribe(user.id) as notified:
+            closes_at = time.monotonic() + broker.stream_timeout
+            while True:
+                notified.clear()  # before reading, so events committed meanwhile are not missed
+                events = get_events_for_user(user, after_ids, self.BATCH_SIZE)
+                db.session.close()  # the connection is not held while waiting
+                for index, event in events.events:
+                    after_ids[index] = event.id
+                    yield 'id: {}\nevent: {}\ndata: {}\n\n'.format(
+                        '.'.join(map(str, after_ids)), event.kind, event.data,
+                    )
+                if events.more:
+                    continue
+                remaining = closes_at - time.monotonic()
+                if remaining <= 0:
+                    return
+                if not notified.wait(min(broker.poll_interval, remaining)):
+                    yield ': keepalive\n\n'  # also finds out that the client is gone
+
 
 class FindFreeWindowForUsersView(MethodView):
+    @read_only
     def get(self) -> Response:
-        form = forms.FindFreeWindowForUsersModel(**request.args)
+        with request_stats.stage('validation'):
+            form = forms.FindFreeWindowForUsersModel(**request.args)
         start_timestamp = int(form.start.astimezone(tz=timezone.utc).timestamp())
-        meetings = get_all_meetings_for_several_users(
-            users=[get_user_by_name(name) for name in form.usernames],
-            start=start_timestamp,
-        )
-        window_start_timestamp = find_first_free_window_among_meetings(
-            meetings=meetings,
-            window_size=form.window_size,
-            start=start_timestamp,
-        )
-        if window_start_timestamp is None:
-            abort(404, 'Impossible to find window for meeting')
+        horizon = form.horizon or current_app.config['FREE_WINDOW_HORIZON']
+        users = get_users_by_names(form.usernames)
+        if form.optional_usernames or form.min_attendees is not None:
+            optional_users = [
+                user for user in get_users_by_names(form.optional_usernames or []) if user not in users
+            ]
+            search = search_quorum_window(
+                meetings_by_attendee=get_busy_intervals_by_user(users + optional_users, start_timestamp),
+                required={user.id for user in users},
+                window_size=form.window_size,
+                start=start_timestamp,
+                horizon=horizon,
+                budget=current_app.config['FREE_WINDOW_EXPANSION_BUDGET'],
+                min_free=form.min_attendees,
+                deadline=get_deadline(),
+            )
+            names = {user.id: user.name for user in optional_users}
+            unavailable = [names[user_id] for user_id in search.unavailable]
+        else:
+            search = self.search_free_window(users, form.window_size, horizon, start_timestamp)
+            unavailable = None
+
+        with request_stats.stage('serialization'):
+            searched_until = datetime.fromtimestamp(search.searched_until, tz=timezone.utc).isoformat()
+            report = dict(result=search.status, searched_until=searched_until, occurrences_checked=search.iterations)
+            if search.status == FreeWindowSearchStatusEnum.horizon_reached:
+                return jsonify(dict(status='error', error='Impossible to find window for meeting', search=report)), 404
+            if search.status in (
+                    FreeWindowSearchStatusEnum.budget_exhausted, FreeWindowSearchStatusEnum.deadline_exceeded,
+            ):
+                # like partial meetings for a range: there is no window before searched_until, the search can be
+                # continued from it
+                return jsonify(dict(status='partial', searched_until=searched_until, search=report))
+            result = dict(status='ok', window={
+                'start': datetime.fromtimestamp(search.start, tz=timezone.utc).isoformat(),
+                'end': datetime.fromtimestamp(search.start + form.window_size, tz=timezone.utc).isoformat(),
+            })
+            if unavailable is not None:
+                result['unavailable'] = unavailable
+            return jsonify(result)
+
+    @staticmethod
+    def search_free_window(users: list[User], window_size: int, horizon: int, start: int) -> FreeWindowSearch:
+        cache = get_free_window_cache()
+        # versions are read before the search, a change made meanwhile makes the stored entry stale right away
+        versions = None if cache is None else get_calendar_versions(users)
+        search = None if cache is None else cache.get(users, versions, window_size, horizon, start)
+        if search is None:
+            meetings = get_busy_intervals_for_several_users(users=users, start=start, repeated_only=True)
+            with closing(stream_one_off_busy_intervals_for_several_users(users, start)) as one_off_meetings:
+                search = search_free_window_among_meetings(
+                    meetings=meetings,
+                    window_size=window_size,
+                    start=start,
+                    horizon=horizon,
+                    budget=current_app.config['FREE_WINDOW_EXPANSION_BUDGET'],
+                    sorted_meetings=one_off_meetings,
+                    deadline=get_deadline(),
+                )
+            if cache is not None:
+                cache.put(users, versions, window_size, horizon, start, search)
+        return search
+
 
-        return jsonify(dict(status='ok', window={
-            'start': datetime.fromtimestamp(window_start_timestamp, tz=timezone.utc).isoformat(),
-            'end': datetime.fromtimestamp(window_start_timestamp + form.window_size, tz=timezone.utc).isoformat(),
-        }))
+class JobsView(MethodView, AuthenticationMixin):
+    def post(self) -> Response:
+        with request_stats.stage('validation'):
+            form = forms.JobsModel(**request.json)
+            params = forms.JOB_PARAMS_MODELS[form.kind](**form.params)
+        user = self.get_authenticated_user()
+        if user is None:
+            abort(401, 'Not authenticated')
+        if form.kind == JobKindEnum.import_meetings and any(
+                meeting.creator_username != user.name for meeting in params.meetings
+        ):
+            abort(403, 'Wrong user')
+        # params are validated again by the job worker, see app.job_handlers
+        job_id = get_job_queue().submit(form.kind, form.params, owner_id=user.id, now=time.time())
+        with request_stats.stage('serialization'):
+            return jsonify(dict(status='ok', job_id=job_id)), 202
+
+    def get(self, job_id: int) -> Response:
+        user = self.get_authenticated_user()
+        if user is None:
+            abort(401, 'Not authenticated')
+        job = get_job_queue().get(job_id)
+        if job is None:
+            raise NotFoundException('Job with id "{}" does not exist'.format(job_id))
+        if job.owner_id != user.id:
+            abort(403, 'Wrong user')
+        with request_stats.stage('serialization'):
+            return jsonify(dict(status='ok', job=self.make_job_description(job)))
+
+    @staticmethod
+    def make_job_description(job: Job) -> dict:
+        description = dict(
+            id=job.id,
+            kind=job.kind,
+            state=job.state,
+            progress=dict(done=job.done, total=job.total),
+            attempts=job.attempts,
+        )
+        for name in ('created', 'started', 'finished'):
+            timestamp = getattr(job, name)
+            if timestamp is not None:
+                description[name] = datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+        if job.result is not None:
+            description['result'] = job.result
+        if job.error is not None:
+            description['error'] = job.error
+        return description
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+from contextlib import closing
+from importlib import import_module
+import logging
+import threading
+import time
+
+from flask import (
+    current_app,
+    Flask,
+)
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from .db_actions import (
+    get_all_meetings_for_several_users,
+    get_busy_intervals_by_user,
+    get_busy_intervals_for_several_users,
+    get_most_active_users,
+    get_user_by_name,
+    get_users_by_names,
+    stream_one_off_busy_intervals_for_several_users,
+)
+from .models import db
+from .recurrence import compile_rule
+from .sharding import get_shards
+
+logger = logging.getLogger(__name__)
+
+
+class Warmup:
+    # runs the queries of the main views once for the WARMUP_USERS most active users before the worker reports
+    # itself ready on /ready: connections are opened, statements are compiled and cached by sqlalchemy, pages of
+    # the busy calendars get into the page cache and recurrence rules of the users are compiled.
+    # With WARMUP_IN_BACKGROUND the worker serves requests meanwhile, they are just not as fast yet
+    def __init__(self, app: Flask = None):
+        self.users = 0
+        self.ready = threading.Event()
+        self.duration: float | None = None
+        self._thread: threading.Thread | None = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        self.users = app.config['WARMUP_USERS']
+        app.extensions['warmup'] = self
+        if app.config['WARMUP_IN_BACKGROUND']:
+            self._thread = threading.Thread(target=self.run, args=(app,), name='warmup', daemon=True)
+            self._thread.start()
+        else:
+            self.run(app)
+
+    def run(self, app: Flask) -> None:
+        # a failed warm-up is logged and the worker becomes ready anyway, it only makes the first requests faster
+        started = time.perf_counter()
+        try:
+            import_module('.views', __package__)  # instead of the first request, see app.LazyView
+            with app.app_context():
+                self._prime_pools()
+                self._run_queries()
+        except Exception:
+            logger.exception('Warm-up failed')
+        self.duration = time.perf_counter() - started
+        logger.info('Warm-up took %.1f ms', self.duration * 1000)
+        self.ready.set()
+
+    def join(self, timeout: float = None) -> None:
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @staticmethod
+    def _prime_pools() -> None:
+        # the first connection of an engine also initializes its dialect
+        engines: list[Engine] = [db.engine]
+        routing = current_app.extensions.get('read_replica')
+        if routing is not None:
+            engines.append(routing.engine)
+        shards = get_shards()
+        if shards is not None:
+            engines.extend(shards.engines)
+        for engine in engines:
+            with engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+
+    def _run_queries(self) -> None:
+        names = [user.name for user in get_most_active_users(self.users)]
+        if not names:
+            return
+        now = int(time.time())
+        get_user_by_name(names[0])
+        users = get_users_by_names(names)
+        calendars = get_busy_intervals_by_user(users, now)
+        for rule in {row.recurrence_rule for rows in calendars.values() for row in rows if row.recurrence_rule}:
+            compile_rule(rule)
+        get_all_meetings_for_several_users(users, now)
+        get_busy_intervals_for_several_users(users, now, repeated_only=True)
+        with closing(stream_one_off_busy_intervals_for_several_users(users, now)) as meetings:
+            next(meetings, None)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import random
+import time
+
+from app.models import (
+    Meeting,
+    User,
+)
+from app.notifications import ReminderScheduler
+from app.types import RepeatTypeEnum
+
+from .harness import (
+    measure,
+    Reporter,
+)
+
+SERIES = 100_000
+DAY = 60 * 60 * 24
+NOW = 1_700_000_000
+
+
+def make_series(count: int, rng: random.Random) -> list[Meeting]:
+    creator = User(name='creator')
+    repeat_types = [
+        RepeatTypeEnum.daily,
+        RepeatTypeEnum.weekly,
+        RepeatTypeEnum.every_working_day,
+        RepeatTypeEnum.monthly,
+        RepeatTypeEnum.yearly,
+    ]
+    meetings = []
+    for meeting_id in range(count):
+        start = NOW - rng.randrange(5 * 365 * DAY)
+        meetings.append(Meeting(
+            id=meeting_id,
+            creator=creator,
+            start=start,
+            end=start + 1800,
+            repeat_type=rng.choice(repeat_types),
+            remind_before=rng.choice([300, 600, 3600]),
+        ))
+    return meetings
+
+
+def main() -> None:
+    reporter = Reporter()
+    meetings = make_series(SERIES, random.Random(0))
+    scheduler = ReminderScheduler()
+
+    started = time.perf_counter()
+    scheduler.load(meetings, now=NOW)
+    reporter.report(dict(benchmark='reminders_load', size=len(scheduler), seconds=round(time.perf_counter() - started, 3)))
+
+    reporter.report(measure(
+        'reminders_schedule', SERIES, lambda i: scheduler.schedule(meetings[i], now=NOW), 10_000,
+    ))
+    # every call pops one simulated minute of a day of reminders
+    reporter.report(measure(
+        'reminders_pop_due', SERIES, lambda i: scheduler.pop_due(NOW + 60 * i), 24 * 60,
+    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import argparse
+from multiprocessing import Pool
+import os
+import tempfile
+import time
+
+from app import create_app
+from app.db_actions import (
+    create_meeting,
+    create_user,
+)
+from app.models import (
+    db,
+    User,
+)
+
+from .harness import Reporter
+
+USERS = 64
+
+
+def make_config(directory: str, shards: int) -> dict:
+    return {
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(directory, 'main.db'),
+        'SHARD_DATABASE_URIS': ['sqlite:///' + os.path.join(directory, 'shard{}.db'.format(i)) for i in range(shards)],
+        'METRICS_ENABLED': False,
+        'SLOW_QUERY_THRESHOLD': None,
+    }
+
+
+def write_meetings(args: tuple[dict, int, int]) -> int:
+    # every writer is a separate process with its own app, like a worker of a multi-process server
+    config, writer, count = args
+    app = create_app(config)
+    with app.app_context():
+        users = db.session.query(User).order_by(User.id).all()
+        for i in range(count):
+            creator = users[(writer + i) % len(users)]
+            create_meeting(creator=creator, start=i * 3600, end=i * 3600 + 1800, invitees=[users[i % len(users)]])
+    return count
+
+
+def run(shards: int, writers: int, meetings: int) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        config = make_config(directory, shards)
+        app = create_app(dict(config, CREATE_SCHEMA_ON_STARTUP=True))
+        with app.app_context():
+            for i in range(USERS):
+                create_user('user{}'.format(i), password='password')
+
+        per_writer = meetings // writers
+        with Pool(writers) as pool:
+            started = time.perf_counter()
+            written = sum(pool.map(write_meetings, [(config, writer, per_writer) for writer in range(writers)]))
+            elapsed = time.perf_counter() - started
+    return dict(
+        benchmark='sharded_create_meeting',
+        shards=shards,
+        writers=writers,
+        meetings=written,
+        seconds=round(elapsed, 3),
+        throughput_per_s=round(written / elapsed, 3),
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Write throughput of create_meeting with different shard counts.')
+    parser.add_argument('--shards', default='1,2,4,8', help='comma separated shard counts')
+    parser.add_argument('--writers', type=int, default=8, help='writer processes')
+    parser.add_argument('--meetings', type=int, default=4000, help='meetings written by all writers together')
+    args = parser.parse_args()
+
+    reporter = Reporter()
+    baseline = None
+    for shards in map(int, args.shards.split(',')):
+        result = run(shards, args.writers, args.meetings)
+        baseline = baseline or result['throughput_per_s']
+        reporter.report(dict(result, speedup=round(result['throughput_per_s'] / baseline, 2)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from app.traffic import percentile
+
+from .harness import Reporter
+
+# runs in a fresh interpreter, like a worker process which has just been forked off
+WORKER = '''
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app(json.loads(sys.argv[1]))
+booted = time.perf_counter()
+assert app.test_client().get('/ping').status_code == 200
+served = time.perf_counter()
+print(json.dumps(dict(import_ms=(imported - started) * 1000, boot_ms=(booted - imported) * 1000,
+                      first_request_ms=(served - booted) * 1000)))
+'''
+
+
+def run(config: dict, processes: int) -> dict:
+    results = []
+    for _ in range(processes):
+        started = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, '-c', WORKER, json.dumps(config)], capture_output=True, text=True, check=True,
+        ).stdout
+        results.append(dict(json.loads(output), process_ms=(time.perf_counter() - started) * 1000))
+    return {
+        '{}_p50'.format(name): round(percentile(sorted(result[name] for result in results), 0.5), 2)
+        for name in ('import_ms', 'boot_ms', 'first_request_ms', 'process_ms')
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Import, boot and first request time of a fresh worker process.')
+    parser.add_argument('--processes', type=int, default=10, help='worker processes started for every mode')
+    args = parser.parse_args()
+
+    reporter = Reporter()
+    with tempfile.TemporaryDirectory() as directory:
+        config = {'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(directory, 'app.db')}
+        for create_schema in (True, False):  # the first run also creates the tables for the second one
+            result = run(dict(config, CREATE_SCHEMA_ON_STARTUP=create_schema), args.processes)
+            reporter.report(dict(result, benchmark='worker_startup', create_schema_on_startup=create_schema))
+
+
+if __name__ == '__main__':
+    main()
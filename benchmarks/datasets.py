@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+from app.seed import (
+    generate as generate_seed,
+    SeedConfig,
+)
+
+NOW = 1_700_000_000
+DAY = 60 * 60 * 24
+MEETINGS_PER_USER = 50
+
+
+def generate(meetings_count: int, seed: int = 0) -> int:
+    # fills the database of the current app context and returns the number of users
+    users_count = max(10, meetings_count // MEETINGS_PER_USER)
+    generate_seed(SeedConfig(users=users_count, meetings=meetings_count, seed=seed, now=NOW))
+    return users_count
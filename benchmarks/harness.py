@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+import gc
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import (
+    Callable,
+    TextIO,
+)
+
+from app.traffic import percentile
+
+
+def get_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(name: str, size: int, func: Callable[[int], object], iterations: int, **extra) -> dict:
+    # func gets the iteration number, so every call can pick its own arguments
+    func(0)  # warm up caches and lazy loads before timing
+
+    gc.collect()
+    tracemalloc.start()
+    func(1)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        call_started = time.perf_counter()
+        func(i)
+        latencies.append(time.perf_counter() - call_started)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+
+    return dict(
+        benchmark=name,
+        size=size,
+        iterations=iterations,
+        throughput_per_s=round(iterations / elapsed, 3) if elapsed else None,
+        p50_ms=round(percentile(latencies, 0.50) * 1000, 4),
+        p99_ms=round(percentile(latencies, 0.99) * 1000, 4),
+        peak_memory_kb=round(peak / 1024, 1),
+        **extra,
+    )
+
+
+class Reporter:
+    # every result is a single json line, so runs can be concatenated and compared with any json tool
+    def __init__(self, output: TextIO = sys.stdout):
+        self.output = output
+        self.context = dict(
+            revision=get_revision(),
+            python=platform.python_version(),
+            machine=platform.machine(),
+        )
+
+    def report(self, result: dict) -> None:
+        self.output.write(json.dumps(dict(result, **self.context)) + '\n')
+        self.output.flush()
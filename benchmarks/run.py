@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+import argparse
+from contextlib import closing
+from itertools import islice
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy.orm import selectinload
+
+from app import create_app
+from app.db_actions import (
+    get_all_meetings_for_several_users,
+    get_busy_intervals_for_several_users,
+    stream_one_off_busy_intervals_for_several_users,
+)
+from app.logic import (
+    find_first_free_window_among_meetings,
+    search_free_window_among_meetings,
+    get_user_meetings_for_range,
+    iterate_meetings,
+    make_meeting_description,
+)
+from app.models import (
+    db,
+    Invitation,
+    Meeting,
+    User,
+)
+
+from . import datasets
+from .harness import (
+    measure,
+    Reporter,
+)
+
+GROUP_SIZE = 5
+WINDOW_SIZE = 60 * 60
+RANGE_SIZE = 7 * datasets.DAY
+OCCURRENCES_PER_CALL = 1000
+
+
+def run_size(size: int, iterations: int, reporter: Reporter) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(directory, 'bench.db'),
+            'CREATE_SCHEMA_ON_STARTUP': True,
+        })
+        with app.app_context():
+            started = time.perf_counter()
+            users_count = datasets.generate(size)
+            reporter.report(dict(benchmark='generate_dataset', size=size, seconds=round(time.perf_counter() - started, 3)))
+
+            rng = random.Random(1)
+            users = db.session.query(User).all()
+            groups = [rng.sample(users, min(GROUP_SIZE, users_count)) for _ in range(iterations)]
+
+            def all_meetings(i: int):
+                result = get_all_meetings_for_several_users(groups[i], datasets.NOW)
+                db.session.expunge_all()
+                return result
+
+            def busy_intervals(i: int):
+                return get_busy_intervals_for_several_users(groups[i], datasets.NOW)
+
+            def free_window_loaded(i: int):
+                return find_first_free_window_among_meetings(busy_intervals(i), WINDOW_SIZE, datasets.NOW)
+
+            def free_window_streamed(i: int):
+                repeated = get_busy_intervals_for_several_users(groups[i], datasets.NOW, repeated_only=True)
+                with closing(stream_one_off_busy_intervals_for_several_users(groups[i], datasets.NOW)) as one_off:
+                    return search_free_window_among_meetings(
+                        repeated, WINDOW_SIZE, datasets.NOW, sorted_meetings=one_off,
+                    ).start
+
+            def user_meetings_for_range(i: int):
+                result = get_user_meetings_for_range(groups[i][0], datasets.NOW, datasets.NOW + RANGE_SIZE)
+                db.session.expunge_all()
+                return result
+
+            reporter.report(measure('get_all_meetings_for_several_users', size, all_meetings, iterations))
+            reporter.report(measure('get_busy_intervals_for_several_users', size, busy_intervals, iterations))
+            reporter.report(measure('free_window_loaded', size, free_window_loaded, iterations))
+            reporter.report(measure('free_window_streamed', size, free_window_streamed, iterations))
+            reporter.report(measure('get_user_meetings_for_range', size, user_meetings_for_range, iterations))
+
+            group_meetings = [
+                get_all_meetings_for_several_users(group, datasets.NOW) for group in groups
+            ]
+            reporter.report(measure(
+                'iterate_meetings', size,
+                lambda i: sum(1 for _ in islice(iterate_meetings(group_meetings[i], datasets.NOW), OCCURRENCES_PER_CALL)),
+                iterations,
+                occurrences_per_call=OCCURRENCES_PER_CALL,
+            ))
+            reporter.report(measure(
+                'find_first_free_window_among_meetings', size,
+                lambda i: find_first_free_window_among_meetings(group_meetings[i], WINDOW_SIZE, datasets.NOW),
+                iterations,
+            ))
+            group_intervals = [busy_intervals(i) for i in range(iterations)]
+            reporter.report(measure(
+                'find_first_free_window_among_busy_intervals', size,
+                lambda i: find_first_free_window_among_meetings(group_intervals[i], WINDOW_SIZE, datasets.NOW),
+                iterations,
+            ))
+
+            described = (
+                db.session.query(Meeting)
+                .options(selectinload(Meeting.creator), selectinload(Meeting.invitations).selectinload(Invitation.invitee))
+                .limit(100)
+                .all()
+            )
+            reporter.report(measure(
+                'make_meeting_description', size,
+                lambda i: [make_meeting_description(m, requester=groups[i][0]) for m in described],
+                iterations,
+                meetings_per_call=len(described),
+            ))
+        db.session.remove()
+        db.get_engine(app).dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmarks of the scheduling hot paths, results are json lines')
+    parser.add_argument('--sizes', default='1000,10000,100000', help='comma separated meeting counts, e.g. 1000,1000000')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--output', type=argparse.FileType('w'), default='-')
+    args = parser.parse_args()
+
+    reporter = Reporter(args.output)
+    for size in map(int, args.sizes.split(',')):
+        run_size(size, args.iterations, reporter)
+
+
+if __name__ == '__main__':
+    main()
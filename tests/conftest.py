@@ -11,6 +11,7 @@ def app() -> Flask:
     app = create_app({
         'TESTING': True,
         'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'CREATE_SCHEMA_ON_STARTUP': True,
     })
     with app.app_context():
         yield app
@@ -2,6 +2,7 @@
 from datetime import datetime
 from flask import Flask
 import pytest
+from sqlalchemy import event
 
 from app import db
 from app.db_actions import (
@@ -112,3 +113,17 @@ def test_ok_private():
         is_private=True,
     )
     assert meeting.is_private is True
+
+
+@pytest.mark.parametrize('invitees_count', [1, 3])
+def test_invitations_are_inserted_with_one_statement(invitees_count):
+    statements = []
+    event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    create_meeting(
+        creator=get_user_by_name('creator'),
+        start=1000,
+        end=2000,
+        invitees=[get_user_by_name('user{}'.format(i)) for i in range(1, invitees_count + 1)],
+    )
+    assert len([statement for statement in statements if statement.startswith('INSERT INTO invitations')]) == 1
+    assert db.session.query(Invitation).count() == invitees_count
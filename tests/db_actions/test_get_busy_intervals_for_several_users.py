@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+from contextlib import closing
+from itertools import islice
+
+from flask import Flask
+import pytest
+
+from app.db_actions import (
+    create_meeting,
+    create_user,
+    get_busy_intervals_by_user,
+    get_busy_intervals_for_several_users,
+    get_meeting_by_id,
+    get_user_by_name,
+    set_answer_for_invitation,
+    stream_one_off_busy_intervals_for_several_users,
+)
+from app.logic import find_first_free_window_among_meetings
+from app.models import (
+    db,
+    Meeting,
+)
+from app.types import RepeatTypeEnum
+
+
+@pytest.fixture(autouse=True)
+def prepare(app: Flask):
+    user1 = create_user('user1', password='')
+    user2 = create_user('user2', password='')
+    user3 = create_user('user3', password='')
+
+    create_meeting(creator=user1, start=1000, end=2000, invitees=[user2])
+    create_meeting(creator=user2, start=2000, end=3000, invitees=[user1])
+    create_meeting(creator=user3, start=3000, end=4000, repeat_type=RepeatTypeEnum.daily, invitees=[user2])
+    create_meeting(creator=user3, start=1000, end=2000, invitees=[user1])
+
+
+def get_intervals(usernames: list[str], start: int = 0) -> list[tuple]:
+    intervals = get_busy_intervals_for_several_users([get_user_by_name(name) for name in usernames], start)
+    return sorted(tuple(row) for row in intervals)
+
+
+def test_user1():
+    assert get_intervals(['user1']) == [
+        (1000, 2000, 'none', None),
+        (2000, 3000, 'none', None),
+    ]
+
+
+def test_user2_user3():
+    assert get_intervals(['user2', 'user3']) == [
+        (1000, 2000, 'none', None),
+        (2000, 3000, 'none', None),
+        (3000, 4000, 'daily', None),
+    ]
+
+
+def test_declined_invitation():
+    set_answer_for_invitation(get_user_by_name('user1'), get_meeting_by_id(2), False)
+    assert get_intervals(['user1']) == [(1000, 2000, 'none', None)]
+
+
+def test_ended_meetings_are_skipped():
+    assert get_intervals(['user2'], start=2500) == [
+        (2000, 3000, 'none', None),
+        (3000, 4000, 'daily', None),
+    ]
+
+
+def test_no_orm_objects():
+    db.session.expunge_all()
+    get_intervals(['user1', 'user2', 'user3'])
+    assert not any(isinstance(obj, Meeting) for obj in db.session.identity_map.values())
+
+
+def test_feeds_solver():
+    intervals = get_busy_intervals_for_several_users([get_user_by_name('user1'), get_user_by_name('user3')], 0)
+    assert find_first_free_window_among_meetings(intervals, window_size=500, start=1000) == 4000
+
+
+def test_repeated_only():
+    intervals = get_busy_intervals_for_several_users([get_user_by_name('user2')], 0, repeated_only=True)
+    assert [tuple(row) for row in intervals] == [(3000, 4000, 'daily', None)]
+
+
+def test_stream_one_off():
+    create_meeting(creator=get_user_by_name('user1'), start=500, end=1500)
+    stream = stream_one_off_busy_intervals_for_several_users([get_user_by_name('user1')], 1000)
+    # created and invited meetings are not merged like in a UNION, the same interval comes from both
+    assert [tuple(row) for row in stream] == [
+        (500, 1500, 'none', None),
+        (1000, 2000, 'none', None),
+        (1000, 2000, 'none', None),
+        (2000, 3000, 'none', None),
+    ]
+
+
+def test_stream_one_off_closed_early(monkeypatch):
+    monkeypatch.setattr('app.db_actions.STREAM_CHUNK_SIZE', 2)
+    user1 = get_user_by_name('user1')
+    for i in range(10):
+        create_meeting(creator=user1, start=10000 + i, end=20000)
+    with closing(stream_one_off_busy_intervals_for_several_users([user1], 0)) as stream:
+        assert [row.start for row in islice(stream, 4)] == [1000, 1000, 2000, 10000]
+
+
+def test_by_user():
+    users = [get_user_by_name(name) for name in ('user1', 'user2', 'user3')]
+    users.append(create_user('user4', password=''))
+    intervals = get_busy_intervals_by_user(users, 0)
+    assert {user_id: sorted((row.start, row.end) for row in rows) for user_id, rows in intervals.items()} == {
+        users[0].id: [(1000, 2000), (2000, 3000)],
+        users[1].id: [(1000, 2000), (2000, 3000), (3000, 4000)],
+        users[2].id: [(1000, 2000), (3000, 4000)],
+        users[3].id: [],
+    }
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+from flask import Flask
+import pytest
+
+from app import db
+from app.db_actions import (
+    create_meeting,
+    create_user,
+    get_meeting_by_id,
+    get_meeting_changes_for_user,
+    set_answer_for_invitation,
+)
+from app.exceptions import BadRequestException
+from app.models import (
+    Invitation,
+    Meeting,
+    User,
+)
+
+
+@pytest.fixture()
+def users(app: Flask) -> list[User]:
+    db.session.expire_on_commit = False
+    return [create_user('user{}'.format(i), password='') for i in range(1, 4)]
+
+
+def ids(changes) -> list[int]:
+    return [meeting.id for meeting in changes.meetings]
+
+
+def test_full_sync(users):
+    user1, user2, user3 = users
+    create_meeting(creator=user1, start=0, end=10)
+    create_meeting(creator=user2, start=0, end=10, invitees=[user1])
+    create_meeting(creator=user2, start=0, end=10, invitees=[user3])
+    changes = get_meeting_changes_for_user(user1, sync_token=None, limit=10)
+    assert ids(changes) == [1, 2]
+    assert changes.sync_token == [(2, 2)]
+    assert changes.more is False
+    # nothing changed since
+    changes = get_meeting_changes_for_user(user1, sync_token=changes.sync_token, limit=10)
+    assert (ids(changes), changes.sync_token) == ([], [(2, 2)])
+
+
+def test_incremental_sync(users):
+    user1, user2, user3 = users
+    first = create_meeting(creator=user1, start=0, end=10, invitees=[user2, user3])
+    token = get_meeting_changes_for_user(user3, sync_token=None, limit=10).sync_token
+    second = create_meeting(creator=user2, start=0, end=10, invitees=[user3])
+    changes = get_meeting_changes_for_user(user3, sync_token=token, limit=10)
+    assert ids(changes) == [second.id]
+    token = changes.sync_token
+
+    # an answer of another invitee changes the meeting for everyone in it, declined meetings are there too
+    set_answer_for_invitation(invitee=user2, meeting=get_meeting_by_id(first.id), answer=False)
+    changes = get_meeting_changes_for_user(user3, sync_token=token, limit=10)
+    assert ids(changes) == [first.id]
+    assert [invitation.answer for invitation in changes.meetings[0].invitations] == [False, None]
+    assert ids(get_meeting_changes_for_user(user2, sync_token=token, limit=10)) == [first.id]
+    assert ids(get_meeting_changes_for_user(user1, sync_token=token, limit=10)) == [first.id]
+
+
+def test_limit(users):
+    user1 = users[0]
+    for _ in range(5):
+        create_meeting(creator=user1, start=0, end=10)
+    changes = get_meeting_changes_for_user(user1, sync_token=None, limit=3)
+    assert (ids(changes), changes.more) == ([1, 2, 3], True)
+    changes = get_meeting_changes_for_user(user1, sync_token=changes.sync_token, limit=3)
+    assert (ids(changes), changes.more) == ([4, 5], False)
+
+
+def test_meetings_without_numbers(users):
+    # e.g. generated by flask seed, they all have updated_seq 0
+    user1, user2, _ = users
+    for meeting_id in range(1, 11):
+        db.session.add(Meeting(id=meeting_id, creator_id=user1.id, start=0, end=10))
+        db.session.add(Invitation(meeting_id=meeting_id, invitee_id=user2.id))
+    db.session.commit()
+    for user in (user1, user2):
+        changes = get_meeting_changes_for_user(user, sync_token=None, limit=5)
+        assert (ids(changes), changes.sync_token, changes.more) == ([1, 2, 3, 4, 5], [(0, 5)], True)
+        changes = get_meeting_changes_for_user(user, sync_token=changes.sync_token, limit=5)
+        assert (ids(changes), changes.sync_token, changes.more) == ([6, 7, 8, 9, 10], [(0, 10)], False)
+        assert ids(get_meeting_changes_for_user(user, sync_token=changes.sync_token, limit=5)) == []
+    # changed later, on top of them
+    create_meeting(creator=user1, start=0, end=10)
+    assert ids(get_meeting_changes_for_user(user1, sync_token=[(0, 10)], limit=5)) == [11]
+
+
+def test_wrong_token(users):
+    with pytest.raises(BadRequestException) as excinfo:
+        get_meeting_changes_for_user(users[0], sync_token=[(1, 1), (2, 2)], limit=10)
+    assert excinfo.value.code == 400
+    assert excinfo.value.args == ('sync_token is not valid, sync again without it',)
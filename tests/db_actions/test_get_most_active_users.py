@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from flask import Flask
+
+from app.db_actions import (
+    create_meeting,
+    create_user,
+    get_most_active_users,
+)
+
+
+def test_get_most_active_users(app: Flask):
+    user1 = create_user('user1', password='')
+    user2 = create_user('user2', password='')
+    user3 = create_user('user3', password='')
+    create_user('user4', password='')
+
+    create_meeting(creator=user1, start=1000, end=2000, invitees=[user2, user3])
+    create_meeting(creator=user2, start=2000, end=3000)
+    create_meeting(creator=user3, start=3000, end=4000, invitees=[user2])
+
+    assert [user.name for user in get_most_active_users(10)] == ['user2', 'user3', 'user1']
+    assert [user.name for user in get_most_active_users(2)] == ['user2', 'user3']
+
+
+def test_get_most_active_users_without_meetings(app: Flask):
+    create_user('user1', password='')
+    assert get_most_active_users(10) == []
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from flask import Flask
+import pytest
+
+from app import db
+from app.db_actions import get_user_by_id
+from app.exceptions import NotFoundException
+from app.models import User
+
+
+@pytest.fixture(autouse=True)
+def init_db(app: Flask) -> None:
+    db.session.add(User(id=7, name='existing_username', password_hash='foo'))
+    db.session.commit()
+
+
+def test_ok():
+    user = get_user_by_id(7)
+    assert user.name == 'existing_username'
+
+
+def test_not_existing_user():
+    with pytest.raises(NotFoundException) as excinfo:
+        get_user_by_id(8)
+    assert excinfo.value.code == 404
+    assert excinfo.value.args == ('User with id "8" does not exist',)
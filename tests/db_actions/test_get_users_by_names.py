@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from flask import Flask
+import pytest
+
+from app.db_actions import (
+    create_user,
+    get_users_by_names,
+)
+from app.exceptions import NotFoundException
+
+
+@pytest.fixture(autouse=True)
+def init_db(app: Flask) -> None:
+    for name in ('user1', 'user2', 'user3'):
+        create_user(name, password='')
+
+
+def test_ok():
+    users = get_users_by_names(['user3', 'user1', 'user3'])
+    assert [user.name for user in users] == ['user3', 'user1']
+
+
+def test_empty():
+    assert get_users_by_names([]) == []
+
+
+def test_many_users(monkeypatch):
+    monkeypatch.setattr('app.db_actions.IN_CHUNK_SIZE', 2)
+    users = get_users_by_names(['user1', 'user2', 'user3'])
+    assert [user.name for user in users] == ['user1', 'user2', 'user3']
+
+
+@pytest.mark.parametrize('names,message', [
+    (['user1', 'unknown'], 'User "unknown" does not exist'),
+    (['unknown2', 'user1', 'unknown1'], 'Users "unknown2", "unknown1" do not exist'),
+])
+def test_not_existing_users(names, message):
+    with pytest.raises(NotFoundException) as excinfo:
+        get_users_by_names(names)
+    assert excinfo.value.code == 404
+    assert excinfo.value.args == (message,)
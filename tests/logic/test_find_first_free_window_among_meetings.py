@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+from collections import namedtuple
 from datetime import (
     datetime,
     timezone,
@@ -11,8 +12,20 @@ from app.db_actions import (
     create_meeting,
     create_user,
 )
-from app.logic import find_first_free_window_among_meetings
-from app.types import RepeatTypeEnum
+from app.logic import (
+    DEADLINE_CHECK_INTERVAL,
+    find_first_free_window_among_meetings,
+    FreeWindowSearch,
+    search_free_window_among_meetings,
+)
+from app.types import (
+    FreeWindowSearchStatusEnum,
+    RepeatTypeEnum,
+)
+
+from tests.utils import Clock
+
+Interval = namedtuple('Interval', ['start', 'end', 'repeat_type', 'recurrence_rule'])
 
 
 @pytest.fixture()
@@ -89,3 +102,50 @@ def test_find_first_free_window_among_meetings_no_window(infinite_daily_meeting)
         start=datetime.fromisoformat('2022-06-22T17:00+00:00'),
     )
     assert start is None
+
+
+@pytest.mark.parametrize('horizon,budget,expected', [
+    (None, None, FreeWindowSearch(start=None, status=FreeWindowSearchStatusEnum.horizon_reached, searched_until=1971300600, iterations=3651)),
+    (3 * 24 * 60 * 60, None, FreeWindowSearch(start=None, status=FreeWindowSearchStatusEnum.horizon_reached, searched_until=1656199800, iterations=4)),
+    (None, 5, FreeWindowSearch(start=None, status=FreeWindowSearchStatusEnum.budget_exhausted, searched_until=1656286200, iterations=5)),
+])
+def test_search_free_window_among_meetings_gives_up(infinite_daily_meeting, horizon, budget, expected):
+    kwargs = {} if horizon is None else dict(horizon=horizon)
+    search = search_free_window_among_meetings(
+        meetings=[infinite_daily_meeting],
+        window_size=60*60,
+        start=datetime.fromisoformat('2022-06-22T17:00+00:00'),
+        budget=budget,
+        **kwargs,
+    )
+    assert search == expected
+
+
+def test_search_free_window_among_meetings_found(many_meetings):
+    assert search_free_window_among_meetings(many_meetings, 900, 600, horizon=5401, budget=4) == FreeWindowSearch(
+        start=6000, status=FreeWindowSearchStatusEnum.found, searched_until=6000, iterations=4,
+    )
+
+
+def test_search_free_window_among_meetings_window_after_horizon(many_meetings):
+    search = search_free_window_among_meetings(many_meetings, 900, 600, horizon=5400)
+    assert search.status == FreeWindowSearchStatusEnum.horizon_reached
+
+
+def test_search_free_window_among_meetings_deadline(monkeypatch):
+    # 23.5 hours busy every day for 3000 days, the window is found only after the last of them
+    meetings = [Interval(0, 24 * 60 * 60 - 1800, RepeatTypeEnum.custom, 'FREQ=DAILY;COUNT=3000')]
+    expected = search_free_window_among_meetings(meetings, 3600, 0)
+    assert expected.start == 2999 * 24 * 60 * 60 + expected.start % (24 * 60 * 60)
+
+    monkeypatch.setattr('app.logic.time', Clock())
+    search = search_free_window_among_meetings(meetings, 3600, 0, deadline=3)
+    assert search.status == FreeWindowSearchStatusEnum.deadline_exceeded
+    assert search.start is None
+    assert search.iterations == 2 * DEADLINE_CHECK_INTERVAL
+    assert 0 < search.searched_until < expected.start
+    continued = search_free_window_among_meetings(meetings, 3600, search.searched_until)
+    assert continued.start == expected.start
+
+    search = search_free_window_among_meetings(meetings, 3600, 0, deadline=0)
+    assert (search.status, search.searched_until, search.iterations) == (FreeWindowSearchStatusEnum.deadline_exceeded, 0, 0)
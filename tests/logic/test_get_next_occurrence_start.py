@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import random
+
+import pytest
+
+from app.logic import (
+    get_next_occurrence_start,
+    get_occurrence_start,
+)
+from app.types import RepeatTypeEnum
+
+DAY = 60 * 60 * 24
+
+
+def test_not_repeated():
+    assert get_next_occurrence_start(1000, RepeatTypeEnum.none, 500) == 1000
+    assert get_next_occurrence_start(1000, RepeatTypeEnum.none, 1000) == 1000
+    assert get_next_occurrence_start(1000, RepeatTypeEnum.none, 1001) is None
+
+
+def test_fixed_step():
+    assert get_next_occurrence_start(1000, RepeatTypeEnum.daily, 0) == 1000
+    assert get_next_occurrence_start(1000, RepeatTypeEnum.daily, 1001) == 1000 + DAY
+    assert get_next_occurrence_start(1000, RepeatTypeEnum.daily, 1000 + 100 * DAY) == 1000 + 100 * DAY
+    assert get_next_occurrence_start(1000, RepeatTypeEnum.weekly, 1000 + 8 * DAY) == 1000 + 14 * DAY
+
+
+def test_calendar_step():
+    assert get_next_occurrence_start(0, RepeatTypeEnum.monthly, 1) == 31 * DAY
+    assert get_next_occurrence_start(0, RepeatTypeEnum.yearly, 1) == 365 * DAY
+    assert get_next_occurrence_start(1950000, RepeatTypeEnum.every_working_day, 1950001) == 1950000 + 3 * DAY
+
+
+def test_every_working_day_far_ahead():
+    friday = 1950000
+    assert get_next_occurrence_start(friday, RepeatTypeEnum.every_working_day, friday + 70 * DAY + 1) == friday + 73 * DAY
+    saturday = friday + DAY
+    assert get_next_occurrence_start(saturday, RepeatTypeEnum.every_working_day, saturday + 1) == saturday + 2 * DAY
+    assert get_next_occurrence_start(saturday, RepeatTypeEnum.every_working_day, saturday + 7 * DAY) == saturday + 9 * DAY
+
+
+@pytest.mark.parametrize('repeat_type', [
+    RepeatTypeEnum.daily,
+    RepeatTypeEnum.weekly,
+    RepeatTypeEnum.monthly,
+    RepeatTypeEnum.yearly,
+    RepeatTypeEnum.every_working_day,
+])
+def test_same_as_stepping(repeat_type):
+    rng = random.Random(0)
+    for _ in range(300):
+        start = rng.randrange(-50 * 365 * DAY, 50 * 365 * DAY)
+        not_before = start + rng.randrange(-DAY, 3 * 365 * DAY)
+        index = 0
+        while get_occurrence_start(start, repeat_type, index) < not_before:
+            index += 1
+        assert get_next_occurrence_start(start, repeat_type, not_before) == get_occurrence_start(start, repeat_type, index)
+
+
+def test_monthly_after_short_month():
+    jan_31 = 1643587200  # 2022-01-31
+    assert get_next_occurrence_start(jan_31, RepeatTypeEnum.monthly, jan_31 + 1) == jan_31 + 28 * DAY
+    assert get_next_occurrence_start(jan_31, RepeatTypeEnum.monthly, jan_31 + 28 * DAY + 1) == jan_31 + 59 * DAY
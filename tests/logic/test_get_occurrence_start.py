@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from datetime import (
+    datetime,
+    timezone,
+)
+
+import pytest
+
+from app.logic import get_occurrence_start
+from app.types import RepeatTypeEnum
+
+DAY = 60 * 60 * 24
+
+
+def ts(value: str) -> int:
+    return int(datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp())
+
+
+def test_next_occurrence():
+    assert get_occurrence_start(0, RepeatTypeEnum.daily, 1) == DAY
+    assert get_occurrence_start(0, RepeatTypeEnum.weekly, 1) == 7 * DAY
+    assert get_occurrence_start(0, RepeatTypeEnum.monthly, 1) == 31 * DAY
+    assert get_occurrence_start(3000000, RepeatTypeEnum.monthly, 1) == 3000000 + 28 * DAY  # that was february
+    assert get_occurrence_start(28857600, RepeatTypeEnum.monthly, 1) == 28857600 + 31 * DAY  # that was december
+    assert get_occurrence_start(0, RepeatTypeEnum.yearly, 1) == 365 * DAY
+    assert get_occurrence_start(63072000, RepeatTypeEnum.yearly, 1) == 63072000 + 366 * DAY  # that was leap year
+    assert get_occurrence_start(0, RepeatTypeEnum.every_working_day, 1) == DAY
+    assert get_occurrence_start(1950000, RepeatTypeEnum.every_working_day, 1) == 1950000 + 3 * DAY  # that was friday
+
+    with pytest.raises(AssertionError):
+        get_occurrence_start(0, RepeatTypeEnum.none, 1)
+
+
+@pytest.mark.parametrize('start,repeat_type,index,expected', [
+    ('2022-01-31T10:00', RepeatTypeEnum.monthly, 1, '2022-02-28T10:00'),
+    ('2022-01-31T10:00', RepeatTypeEnum.monthly, 2, '2022-03-31T10:00'),
+    ('2022-01-31T10:00', RepeatTypeEnum.monthly, 3, '2022-04-30T10:00'),
+    ('2024-01-31T10:00', RepeatTypeEnum.monthly, 1, '2024-02-29T10:00'),
+    ('2022-12-15T10:00', RepeatTypeEnum.monthly, 1, '2023-01-15T10:00'),
+    ('2022-10-31T10:00', RepeatTypeEnum.monthly, 14, '2023-12-31T10:00'),
+    ('2024-02-29T10:00', RepeatTypeEnum.yearly, 1, '2025-02-28T10:00'),
+    ('2024-02-29T10:00', RepeatTypeEnum.yearly, 4, '2028-02-29T10:00'),
+    ('2096-02-29T10:00', RepeatTypeEnum.yearly, 4, '2100-02-28T10:00'),
+    ('2022-06-24T10:00', RepeatTypeEnum.every_working_day, 5, '2022-07-01T10:00'),
+    ('2022-06-25T10:00', RepeatTypeEnum.every_working_day, 1, '2022-06-27T10:00'),
+    ('2022-06-26T10:00', RepeatTypeEnum.every_working_day, 6, '2022-07-04T10:00'),
+])
+def test_calendar_steps(start, repeat_type, index, expected):
+    assert get_occurrence_start(ts(start), repeat_type, index) == ts(expected)
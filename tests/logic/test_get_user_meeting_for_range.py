@@ -9,9 +9,15 @@ from app.db_actions import (
     create_meeting,
     get_user_by_name,
 )
-from app.logic import get_user_meetings_for_range
+from app.logic import (
+    DEADLINE_CHECK_INTERVAL,
+    get_user_meetings_for_range,
+    search_user_meetings_for_range,
+)
 from app.types import RepeatTypeEnum
 
+from tests.utils import Clock
+
 
 @pytest.fixture()
 def prepare(app: Flask):
@@ -101,3 +107,20 @@ def test_repeating_meeting(repeating_meeting):
     assert meetings[2].id == 1
     assert meetings[2].start_datetime.isoformat() == '2022-06-24T17:00:00+00:00'
     assert meetings[2].end_datetime.isoformat() == '2022-06-24T18:00:00+00:00'
+
+
+def test_deadline(repeating_meeting, monkeypatch):
+    user = get_user_by_name('user1')
+    start = datetime.fromisoformat('2022-06-22T10:00+00:00')
+    end = datetime.fromisoformat('2032-06-22T10:00+00:00')
+    expected = [meeting.start for meeting in get_user_meetings_for_range(user=user, start=start, end=end)]
+
+    monkeypatch.setattr('app.logic.time', Clock())
+    search = search_user_meetings_for_range(user=user, start=start, end=end, deadline=2)
+    assert search.complete is False
+    assert len(search.meetings) == DEADLINE_CHECK_INTERVAL
+    assert search.searched_until == expected[DEADLINE_CHECK_INTERVAL]
+    assert all(meeting.start < search.searched_until for meeting in search.meetings)
+    rest = search_user_meetings_for_range(user=user, start=search.searched_until, end=end)
+    assert rest.complete is True
+    assert [meeting.start for meeting in search.meetings + rest.meetings] == expected
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime
+from itertools import islice
+
+from flask import Flask
+import pytest
+
+from app.db_actions import (
+    create_meeting,
+    create_user,
+)
+from app.logic import iterate_meetings
+from app.types import RepeatTypeEnum
+
+
+@pytest.fixture()
+def meetings(app: Flask):
+    creator = create_user('creator', password='')
+    return [
+        create_meeting(
+            creator=creator,
+            start=datetime.fromisoformat('2022-06-22T10:00+00:00'),
+            end=datetime.fromisoformat('2022-06-22T11:00+00:00'),
+            repeat_type=RepeatTypeEnum.custom,
+            recurrence_rule='FREQ=WEEKLY;BYDAY=MO,WE',
+        ),
+        create_meeting(
+            creator=creator,
+            start=datetime.fromisoformat('2022-06-23T10:00+00:00'),
+            end=datetime.fromisoformat('2022-06-23T11:00+00:00'),
+            repeat_type=RepeatTypeEnum.weekly,
+        ),
+        create_meeting(
+            creator=creator,
+            start=datetime.fromisoformat('2022-06-24T10:00+00:00'),
+            end=datetime.fromisoformat('2022-06-24T11:00+00:00'),
+        ),
+    ]
+
+
+def test_iterate_meetings(meetings):
+    assert [m.start_datetime.isoformat() for m in islice(iterate_meetings(meetings), 6)] == [
+        '2022-06-22T10:00:00+00:00',
+        '2022-06-23T10:00:00+00:00',
+        '2022-06-24T10:00:00+00:00',
+        '2022-06-27T10:00:00+00:00',
+        '2022-06-29T10:00:00+00:00',
+        '2022-06-30T10:00:00+00:00',
+    ]
+
+
+def test_iterate_meetings_from_start(meetings):
+    start = int(datetime.fromisoformat('2032-06-21T10:30+00:00').timestamp())
+    assert [(m.id, m.start_datetime.isoformat()) for m in islice(iterate_meetings(meetings, start), 4)] == [
+        (1, '2032-06-21T10:00:00+00:00'),
+        (1, '2032-06-23T10:00:00+00:00'),
+        (2, '2032-06-24T10:00:00+00:00'),
+        (1, '2032-06-28T10:00:00+00:00'),
+    ]
+
+
+def test_iterate_meetings_finite_rule(app: Flask):
+    meeting = create_meeting(
+        creator=create_user('creator', password=''),
+        start=0,
+        end=100,
+        repeat_type=RepeatTypeEnum.custom,
+        recurrence_rule='FREQ=DAILY;COUNT=3',
+    )
+    assert [m.start for m in iterate_meetings([meeting])] == [0, 60*60*24, 2*60*60*24]
+
+
+def test_iterate_meetings_with_sorted_meetings(meetings):
+    repeated, one_off = meetings[:2], [meetings[2]]
+    assert [m.start_datetime.isoformat() for m in islice(iterate_meetings(repeated, sorted_meetings=one_off), 4)] == [
+        '2022-06-22T10:00:00+00:00',
+        '2022-06-23T10:00:00+00:00',
+        '2022-06-24T10:00:00+00:00',
+        '2022-06-27T10:00:00+00:00',
+    ]
+
+
+def test_sorted_meetings_are_read_lazily(app: Flask):
+    creator = create_user('creator', password='')
+    repeated = create_meeting(creator=creator, start=0, end=10, repeat_type=RepeatTypeEnum.daily)
+    read = []
+
+    def one_off():
+        for i in range(1000):
+            meeting = create_meeting(creator=creator, start=i * 100 + 50, end=i * 100 + 60)
+            read.append(meeting)
+            yield meeting
+
+    assert [m.start for m in islice(iterate_meetings([repeated], start=120, sorted_meetings=one_off()), 3)] == [
+        150, 250, 350,
+    ]
+    assert len(read) == 4  # the next one is already in the queue
+
+
+def test_ended_sorted_meetings_are_skipped(app: Flask):
+    creator = create_user('creator', password='')
+    one_off = [
+        create_meeting(creator=creator, start=0, end=100),
+        create_meeting(creator=creator, start=50, end=200),
+        create_meeting(creator=creator, start=150, end=300),
+    ]
+    assert [m.start for m in iterate_meetings([], start=100, sorted_meetings=one_off)] == [50, 150]
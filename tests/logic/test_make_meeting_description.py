@@ -11,6 +11,7 @@ from app.db_actions import (
 )
 from app.logic import make_meeting_description
 from app.models import Meeting
+from app.types import RepeatTypeEnum
 
 
 @pytest.fixture()
@@ -99,3 +100,16 @@ def test_make_meeting_description_private_requester_unknown(private_meeting: Mee
         'start_datetime': private_meeting.start_datetime.isoformat(),
         'end_datetime': private_meeting.end_datetime.isoformat(),
     }
+
+
+def test_make_meeting_description_custom_repeat(app: Flask):
+    meeting = create_meeting(
+        creator=create_user('creator', password=''),
+        start=1000,
+        end=2000,
+        repeat_type=RepeatTypeEnum.custom,
+        recurrence_rule='FREQ=MONTHLY;BYDAY=-1FR',
+    )
+    description = make_meeting_description(meeting)
+    assert description['repeat_type'] == 'custom'
+    assert description['recurrence_rule'] == 'FREQ=MONTHLY;BYDAY=-1FR'
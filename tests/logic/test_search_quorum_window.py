@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+from collections import namedtuple
+import random
+
+import pytest
+
+from app.logic import search_quorum_window
+from app.types import (
+    FreeWindowSearchStatusEnum,
+    RepeatTypeEnum,
+)
+
+Interval = namedtuple('Interval', ['start', 'end', 'repeat_type', 'recurrence_rule'])
+DAY = 60 * 60 * 24
+
+
+def once(start: int, end: int) -> Interval:
+    return Interval(start, end, RepeatTypeEnum.none, None)
+
+
+def daily(start: int, end: int) -> Interval:
+    return Interval(start, end, RepeatTypeEnum.daily, None)
+
+
+def test_everybody_free():
+    search = search_quorum_window({1: [once(0, 10)], 2: [once(5, 20)]}, required=[1, 2], window_size=10, start=0)
+    assert search.status == FreeWindowSearchStatusEnum.found
+    assert (search.start, search.unavailable) == (20, ())
+
+
+def test_optional_attendee_is_skipped_when_always_busy():
+    search = search_quorum_window(
+        {1: [once(0, 10)], 2: [daily(0, DAY)]}, required=[1], window_size=10, start=0, horizon=10 * DAY,
+    )
+    assert (search.start, search.unavailable) == (10, (2,))
+
+
+def test_fewest_conflicts():
+    meetings = {
+        1: [once(0, 100)],
+        2: [once(100, 200), once(300, 400)],
+        3: [once(150, 350)],
+        4: [once(0, 1000)],
+    }
+    search = search_quorum_window(meetings, required=[1], window_size=50, start=0, horizon=500)
+    assert (search.start, search.unavailable) == (400, (4,))
+
+
+def test_min_free_returns_first_good_enough_window():
+    meetings = {
+        1: [once(0, 100)],
+        2: [once(100, 200)],
+        3: [once(0, 300)],
+    }
+    search = search_quorum_window(meetings, required=[1], window_size=50, start=0, horizon=500, min_free=1)
+    assert (search.start, search.unavailable) == (100, (2, 3))
+    search = search_quorum_window(meetings, required=[1], window_size=50, start=0, horizon=500, min_free=2)
+    assert (search.start, search.unavailable) == (200, (3,))
+    search = search_quorum_window(meetings, required=[1], window_size=50, start=0, horizon=500, min_free=3)
+    assert (search.start, search.unavailable) == (300, ())
+
+
+def test_min_free_within_horizon():
+    search = search_quorum_window(
+        {1: [], 2: [daily(0, DAY // 2)], 3: [daily(DAY // 2, DAY)]},
+        required=[1], window_size=DAY // 2 + 1, start=0, horizon=5 * DAY, min_free=2,
+    )
+    assert search.status == FreeWindowSearchStatusEnum.horizon_reached
+    assert search.searched_until == 5 * DAY
+
+
+def test_required_attendee_always_busy():
+    search = search_quorum_window(
+        {1: [daily(0, DAY)], 2: []}, required=[1], window_size=10, start=0, horizon=3 * DAY,
+    )
+    assert search.status == FreeWindowSearchStatusEnum.horizon_reached
+
+
+def test_meetings_before_start_are_ignored():
+    search = search_quorum_window({1: [once(0, 100), once(150, 160)]}, required=[1], window_size=50, start=120)
+    assert search.start == 160
+
+
+def test_budget_exhausted():
+    search = search_quorum_window(
+        {1: [daily(0, DAY)], 2: [daily(0, DAY)]}, required=[1, 2], window_size=10, start=0, budget=5,
+    )
+    assert search.status == FreeWindowSearchStatusEnum.budget_exhausted
+    assert search.iterations == 5
+
+
+def brute_force(meetings: dict, required: set, window_size: int, start: int, horizon: int, min_free: int = None):
+    best = None
+    for t in range(start, start + horizon):
+        busy = tuple(sorted(
+            attendee for attendee, intervals in meetings.items()
+            if any(i.start < t + window_size and t < i.end for i in intervals)
+        ))
+        if required & set(busy):
+            continue
+        if best is None or len(busy) < len(best[1]):
+            best = (t, busy)
+            if min_free is not None and len(meetings) - len(busy) >= min_free:
+                break
+    if best is None or min_free is not None and len(meetings) - len(best[1]) < min_free:
+        return None
+    return best
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_same_as_brute_force(seed):
+    rng = random.Random(seed)
+    meetings = {}
+    for attendee in range(rng.randint(1, 5)):
+        meetings[attendee] = []
+        for _ in range(rng.randint(0, 6)):
+            meeting_start = rng.randint(0, 200)
+            meetings[attendee].append(once(meeting_start, meeting_start + rng.randint(1, 60)))
+    required = set(rng.sample(sorted(meetings), rng.randint(0, len(meetings))))
+    window_size = rng.randint(1, 40)
+    start = rng.randint(0, 50)
+    min_free = rng.choice([None, rng.randint(1, len(meetings))])
+
+    search = search_quorum_window(meetings, required, window_size, start, horizon=300, min_free=min_free)
+    expected = brute_force(meetings, required, window_size, start, 300, min_free)
+    if expected is None:
+        assert search.status == FreeWindowSearchStatusEnum.horizon_reached
+    else:
+        assert (search.start, search.unavailable) == expected
+
+
+def test_deadline():
+    meetings = {1: [daily(0, DAY - 1800)], 2: [daily(0, DAY - 1800)]}
+    search = search_quorum_window(meetings, required=[1], window_size=3600, start=0, deadline=0)
+    assert search.status == FreeWindowSearchStatusEnum.deadline_exceeded
+    assert (search.start, search.searched_until, search.iterations) == (None, 0, 0)
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+from datetime import (
+    date,
+    datetime,
+    timedelta,
+    timezone,
+)
+from itertools import islice
+import random
+
+from app.calendar_math import (
+    add_months,
+    add_working_days,
+    civil_from_days,
+    count_working_days,
+    DAY,
+    days_from_civil,
+    days_in_month,
+    is_leap_year,
+    iterate_months,
+    iterate_working_days,
+    month_index,
+    weekday,
+)
+
+EPOCH = date(1970, 1, 1)
+FIRST_DAY = (date(1700, 1, 1) - EPOCH).days
+LAST_DAY = (date(2300, 1, 1) - EPOCH).days
+
+
+def reference_add_months(day: date, months: int) -> date:
+    year, month = divmod(day.year * 12 + day.month - 1 + months, 12)
+    month += 1
+    for day_of_month in range(day.day, 27, -1):
+        try:
+            return date(year, month, day_of_month)
+        except ValueError:
+            continue
+    return date(year, month, day.day)
+
+
+def reference_add_working_days(day: date, count: int) -> date:
+    for _ in range(count):
+        day += timedelta(days=1)
+        while day.weekday() >= 5:
+            day += timedelta(days=1)
+    return day
+
+
+def test_civil_days_roundtrip():
+    for days in range(-200000, 200000, 17):
+        current = EPOCH + timedelta(days=days)
+        assert civil_from_days(days) == (current.year, current.month, current.day)
+        assert days_from_civil(current.year, current.month, current.day) == days
+        assert weekday(days) == current.weekday()
+
+
+def test_every_day_of_six_centuries():
+    current = EPOCH + timedelta(days=FIRST_DAY)
+    for days in range(FIRST_DAY, LAST_DAY):
+        assert civil_from_days(days) == (current.year, current.month, current.day)
+        assert days_from_civil(current.year, current.month, current.day) == days
+        assert weekday(days) == current.weekday()
+        current += timedelta(days=1)
+
+
+def test_months():
+    for year in range(1700, 2300):
+        assert is_leap_year(year) == ((date(year, 3, 1) - date(year, 2, 1)).days == 29)
+        for month in range(1, 13):
+            next_month = date(year + month // 12, month % 12 + 1, 1)
+            assert days_in_month(year, month) == (next_month - date(year, month, 1)).days
+
+
+def test_add_months():
+    rng = random.Random(0)
+    for days in range(FIRST_DAY, LAST_DAY, 3):
+        current = EPOCH + timedelta(days=days)
+        seconds = rng.randrange(DAY)
+        for months in (1, 12, rng.randint(-1200, 1200)):
+            expected = reference_add_months(current, months)
+            assert add_months(days * DAY + seconds, months) == (expected - EPOCH).days * DAY + seconds
+
+
+def test_month_index():
+    for days in range(FIRST_DAY, LAST_DAY, 7):
+        current = EPOCH + timedelta(days=days)
+        assert month_index(days * DAY + 100) == current.year * 12 + current.month - 1
+
+
+def test_add_working_days():
+    rng = random.Random(0)
+    for days in range(FIRST_DAY, LAST_DAY, 5):
+        current = EPOCH + timedelta(days=days)
+        count = rng.randint(0, 30)
+        expected = reference_add_working_days(current, count)
+        assert add_working_days(days * DAY + 600, count) == (expected - EPOCH).days * DAY + 600
+
+
+def test_count_working_days():
+    rng = random.Random(0)
+    for _ in range(5000):
+        timestamp = rng.randrange(FIRST_DAY * DAY, LAST_DAY * DAY)
+        not_before = timestamp + rng.randrange(-DAY, 40 * DAY)
+        count = count_working_days(timestamp, not_before)
+        assert add_working_days(timestamp, count) >= not_before
+        assert count == 0 or add_working_days(timestamp, count - 1) < not_before
+
+
+def test_timestamps_before_epoch():
+    timestamp = int(datetime(1969, 12, 31, 23, 0, tzinfo=timezone.utc).timestamp())
+    assert add_months(timestamp, 2) == int(datetime(1970, 2, 28, 23, 0, tzinfo=timezone.utc).timestamp())
+
+
+def test_iterate_months():
+    rng = random.Random(0)
+    for _ in range(300):
+        timestamp = rng.randrange(FIRST_DAY * DAY, LAST_DAY * DAY)
+        step, first = rng.choice([1, 12]), rng.randint(0, 100)
+        expected = [add_months(timestamp, step * i) for i in range(first, first + 30)]
+        assert list(islice(iterate_months(timestamp, step, first), 30)) == expected
+
+
+def test_iterate_working_days():
+    rng = random.Random(0)
+    for _ in range(300):
+        timestamp = rng.randrange(FIRST_DAY * DAY, LAST_DAY * DAY)
+        first = rng.choice([0, rng.randint(1, 100)])
+        expected = [add_working_days(timestamp, i) for i in range(first, first + 30)]
+        assert list(islice(iterate_working_days(timestamp, first), 30)) == expected
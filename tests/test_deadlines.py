@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import time
+
+from flask import (
+    Flask,
+    g,
+)
+from flask.testing import FlaskClient
+import pytest
+
+from app import create_app
+from app.db_actions import (
+    create_meeting,
+    create_user,
+)
+from app.deadlines import (
+    DEADLINE_HEADER,
+    get_deadline,
+)
+from app.types import RepeatTypeEnum
+
+# time.monotonic() is past such a deadline by the time the search looks at the clock
+EXPIRED = {DEADLINE_HEADER: '1e-9'}
+
+
+@pytest.fixture(autouse=True)
+def daily_meeting(app: Flask):
+    user = create_user('user1', password='')
+    create_meeting(creator=user, start=0, end=23 * 60 * 60, repeat_type=RepeatTypeEnum.daily)
+
+
+def test_deadline_from_config_and_header(app: Flask):
+    with app.test_request_context('/ping'):
+        app.preprocess_request()
+        assert get_deadline() == pytest.approx(time.monotonic() + app.config['REQUEST_DEADLINE'], abs=1)
+    with app.test_request_context('/ping', headers={DEADLINE_HEADER: '0.5'}):
+        app.preprocess_request()
+        assert get_deadline() == pytest.approx(time.monotonic() + 0.5, abs=0.1)
+    with app.test_request_context('/ping', headers={DEADLINE_HEADER: '1000000'}):
+        app.preprocess_request()
+        assert get_deadline() == pytest.approx(time.monotonic() + app.config['REQUEST_DEADLINE_MAX'], abs=1)
+    assert get_deadline() is None
+
+
+@pytest.mark.parametrize('value', ['soon', '0', '-1', 'inf', 'nan'])
+def test_wrong_header(client: FlaskClient, value: str):
+    response = client.get('/ping', headers={DEADLINE_HEADER: value})
+    assert response.status_code == 400
+    assert response.json == dict(status='error', error='X-Request-Timeout should be a positive number of seconds')
+
+
+def test_deadlines_can_be_disabled():
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'REQUEST_DEADLINE': None})
+    with app.test_request_context('/ping', headers={DEADLINE_HEADER: '1'}):
+        app.preprocess_request()
+        assert 'deadline' not in g
+
+
+def test_free_window_search_after_deadline(client: FlaskClient):
+    response = client.get(
+        '/find_free_window_for_users',
+        query_string=dict(usernames='user1', window_size=7200, start='1970-01-01T00:00+00:00'),
+        headers=EXPIRED,
+    )
+    assert response.status_code == 200
+    assert response.json == dict(
+        status='partial',
+        searched_until='1970-01-01T00:00:00+00:00',
+        search=dict(result='deadline_exceeded', searched_until='1970-01-01T00:00:00+00:00', occurrences_checked=0),
+    )
+
+
+def test_quorum_search_after_deadline(client: FlaskClient):
+    response = client.get(
+        '/find_free_window_for_users',
+        query_string=dict(usernames='user1', window_size=7200, start='1970-01-01T00:00+00:00', min_attendees=1),
+        headers=EXPIRED,
+    )
+    assert response.status_code == 200
+    assert response.json['status'] == 'partial'
+    assert response.json['search']['result'] == 'deadline_exceeded'
+
+
+def test_meetings_for_range_after_deadline(client: FlaskClient):
+    query_string = dict(start='1970-01-02T00:00+00:00', end='1970-01-05T00:00+00:00')
+    response = client.get('/users/user1/meetings', query_string=query_string, headers=EXPIRED)
+    assert response.status_code == 200
+    assert response.json == dict(status='partial', meetings=[], searched_until='1970-01-02T00:00:00+00:00')
+
+    response = client.get('/users/user1/meetings', query_string=query_string)
+    assert response.json['status'] == 'ok'
+    assert len(response.json['meetings']) == 3
+    assert 'searched_until' not in response.json
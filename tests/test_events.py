@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+from flask import Flask
+import pytest
+
+from app import (
+    create_app,
+    db,
+)
+from app.db_actions import (
+    create_meeting,
+    create_user,
+    get_meeting_by_id,
+    get_user_by_name,
+    set_answer_for_invitation,
+)
+from app.events import EventBroker
+from app.models import Event
+
+from tests.utils import make_headers
+
+HEADERS = make_headers(name='user1', password='password')
+
+
+def parse(body: bytes) -> list[dict]:
+    messages = []
+    for block in body.decode().split('\n\n')[:-1]:
+        message = {}
+        for line in block.split('\n'):
+            name, _, value = line.partition(': ')
+            message[name] = value
+        messages.append(message)
+    return messages
+
+
+@pytest.fixture()
+def app() -> Flask:
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'CREATE_SCHEMA_ON_STARTUP': True,
+        'EVENTS_STREAM_TIMEOUT': 0,  # streams return what is there right away
+    })
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture()
+def users(app: Flask):
+    return create_user('user1', password='password'), create_user('user2', password='password')
+
+
+def test_subscribe_and_publish():
+    broker = EventBroker()
+    with broker.subscribe(1) as first, broker.subscribe(1) as second, broker.subscribe(2) as other:
+        broker.publish([1, 3])
+        assert first.is_set() and second.is_set()
+        assert not other.is_set()
+    assert broker._subscribers == {}
+
+
+def test_changes_are_logged(users):
+    user1, user2 = users
+    meeting = create_meeting(creator=user1, start=0, end=10, invitees=[user2])
+    set_answer_for_invitation(invitee=user2, meeting=get_meeting_by_id(meeting.id), answer=True)
+    events = [(event.user_id, event.kind, event.data) for event in db.session.query(Event).order_by(Event.id)]
+    answer = '{"meeting_id": 1, "username": "user2", "answer": true}'
+    assert events == [
+        (user1.id, 'meeting_created', '{"meeting_id": 1}'),
+        (user2.id, 'invited', '{"meeting_id": 1, "creator": "user1"}'),
+        (user1.id, 'invitation_answered', answer),
+        (user2.id, 'invitation_answered', answer),
+    ]
+
+
+def test_changes_are_not_logged_without_events():
+    app = create_app({
+        'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'CREATE_SCHEMA_ON_STARTUP': True, 'EVENTS_ENABLED': False,
+    })
+    with app.app_context():
+        create_meeting(creator=create_user('user1', password='password'), start=0, end=10)
+        assert db.session.query(Event).count() == 0
+        assert app.test_client().get('/users/user1/events', headers=HEADERS).status_code == 404
+
+
+def test_stream(client, users):
+    user1, user2 = users
+    create_meeting(creator=user2, start=0, end=10, invitees=[user1])
+    create_meeting(creator=user2, start=0, end=10)
+    create_meeting(creator=user1, start=0, end=10)
+
+    response = client.get('/users/user1/events', headers=HEADERS)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    # without the last event id only new events are streamed
+    assert parse(response.data) == [{'retry': '1000'}]
+
+    response = client.get('/users/user1/events', headers=dict(HEADERS, **{'Last-Event-ID': '0'}))
+    assert parse(response.data) == [
+        {'retry': '1000'},
+        {'id': '2', 'event': 'invited', 'data': '{"meeting_id": 1, "creator": "user2"}'},
+        {'id': '4', 'event': 'meeting_created', 'data': '{"meeting_id": 3}'},
+    ]
+    response = client.get('/users/user1/events', query_string=dict(last_event_id=2), headers=HEADERS)
+    assert [message.get('id') for message in parse(response.data)] == [None, '4']
+
+
+def test_stream_errors(client, users):
+    assert client.get('/users/user1/events').status_code == 401
+    assert client.get('/users/user2/events', headers=HEADERS).status_code == 403
+    response = client.get('/users/user1/events', headers=dict(HEADERS, **{'Last-Event-ID': 'abc'}))
+    assert response.status_code == 400
+    assert response.json == dict(status='error', error='Last-Event-ID should be an event id')
+
+
+def test_expired_events(app, client, users, monkeypatch):
+    user1, user2 = users
+    monkeypatch.setattr('app.events.PRUNE_EVERY', 2)
+    create_meeting(creator=user1, start=0, end=10)
+    db.session.query(Event).update({Event.created: 0})
+    db.session.commit()
+    create_meeting(creator=user1, start=0, end=10)
+    assert [event.id for event in db.session.query(Event)] == [2]
+    # the first event is gone, the client has to reload the calendar
+    response = client.get('/users/user1/events', headers=dict(HEADERS, **{'Last-Event-ID': '0'}))
+    assert [message.get('event') for message in parse(response.data)] == [None, 'reset', 'meeting_created']
+    response = client.get('/users/user1/events', headers=dict(HEADERS, **{'Last-Event-ID': '1'}))
+    assert [message.get('event') for message in parse(response.data)] == [None, 'meeting_created']
+
+
+@pytest.fixture()
+def live_app(tmp_path) -> Flask:
+    # the stream and the changes are in different threads, so the database is a file shared by all connections
+    config = {
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///{}'.format(tmp_path / 'app.db'),
+        'EVENTS_POLL_INTERVAL': 30,
+        'EVENTS_STREAM_TIMEOUT': 30,
+    }
+    app = create_app(dict(config, CREATE_SCHEMA_ON_STARTUP=True))
+    with app.app_context():
+        create_user('user1', password='password')
+        create_user('user2', password='password')
+    return app
+
+
+def create_meeting_later(app: Flask, delay: float) -> None:
+    def target():
+        time.sleep(delay)
+        with app.app_context():
+            create_meeting(creator=get_user_by_name('user2'), start=0, end=10, invitees=[get_user_by_name('user1')])
+    threading.Thread(target=target).start()
+
+
+def test_events_are_pushed(live_app):
+    response = live_app.test_client().get('/users/user1/events', headers=HEADERS, buffered=False)
+    messages = iter(response.response)
+    assert next(messages) == b'retry: 1000\n\n'
+    started = time.monotonic()
+    create_meeting_later(live_app, delay=0.1)
+    assert parse(next(messages))[0]['event'] == 'invited'
+    assert time.monotonic() - started < 5  # not after the poll interval
+    response.close()
+
+
+def test_events_of_other_processes_are_polled(live_app):
+    live_app.extensions['event_broker'].poll_interval = 0.1
+    other_process_app = create_app(live_app.config)  # with a broker of its own
+    response = live_app.test_client().get('/users/user1/events', headers=HEADERS, buffered=False)
+    messages = iter(response.response)
+    next(messages)
+    create_meeting_later(other_process_app, delay=0.3)
+    message = next(messages)
+    while message == b': keepalive\n\n':
+        message = next(messages)
+    assert parse(message)[0]['event'] == 'invited'
+    response.close()
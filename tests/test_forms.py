@@ -67,6 +67,8 @@ class TestMeetingsModel:
         dict(default_args, repeat_type='yearly'),
         dict(default_args, repeat_type='every_working_day'),
         dict(default_args, is_private='true'),
+        dict(default_args, remind_before='600'),
+        dict(default_args, repeat_type='custom', recurrence_rule='FREQ=WEEKLY;BYDAY=MO,WE'),
     ])
     def test_ok(self, form):
         MeetingsModel(**form)
@@ -87,8 +89,12 @@ class TestMeetingsModel:
         (dict(default_args, invitees='aa,1aa'), ('invitees', 1), 'string does not match regex "^[a-zA-Z_]\\w*$"'),
         (dict(default_args, invitees='1aa'), ('invitees', 0), 'string does not match regex "^[a-zA-Z_]\\w*$"'),
         (dict(default_args, invitees='a'*31), ('invitees', 0), 'ensure this value has at most 30 characters'),
-        (dict(default_args, repeat_type='abyrvalg'), ('repeat_type', ), "value is not a valid enumeration member; permitted: 'none', 'daily', 'weekly', 'every_working_day', 'yearly', 'monthly'"),
+        (dict(default_args, repeat_type='abyrvalg'), ('repeat_type', ), "value is not a valid enumeration member; permitted: 'none', 'daily', 'weekly', 'every_working_day', 'yearly', 'monthly', 'custom'"),
+        (dict(default_args, repeat_type='custom'), ('__root__', ), 'recurrence_rule should be given if and only if repeat_type is custom'),
+        (dict(default_args, recurrence_rule='FREQ=DAILY'), ('__root__', ), 'recurrence_rule should be given if and only if repeat_type is custom'),
+        (dict(default_args, repeat_type='custom', recurrence_rule='FREQ=HOURLY'), ('recurrence_rule', ), 'FREQ should be one of DAILY, WEEKLY, MONTHLY, YEARLY'),
         (dict(default_args, is_private='something'), ('is_private', ), 'value could not be parsed to a boolean'),
+        (dict(default_args, remind_before=-1), ('remind_before', ), 'ensure this value is greater than or equal to 0'),
     ])
     def test_not_ok(self, form, loc, msg):
         with pytest.raises(ValidationError) as excinfo:
@@ -181,6 +187,8 @@ class TestFindFreeWindowForUsersModel:
     @pytest.mark.parametrize('form', [
         default_args,
         dict(default_args, start='2022-06-22T19:00'),
+        dict(default_args, optional_usernames='inv4,inv5', min_attendees=5),
+        dict(default_args, optional_usernames='inv3', min_attendees=3),
     ])
     def test_ok(self, form):
         FindFreeWindowForUsersModel(**form)
@@ -194,6 +202,13 @@ class TestFindFreeWindowForUsersModel:
         (dict(default_args, usernames='aa,1aa'), ('usernames', 1), 'string does not match regex "^[a-zA-Z_]\\w*$"'),
         (dict(default_args, usernames='1aa'), ('usernames', 0), 'string does not match regex "^[a-zA-Z_]\\w*$"'),
         (dict(default_args, usernames='a'*31), ('usernames', 0), 'ensure this value has at most 30 characters'),
+        (dict(default_args, optional_usernames='1aa'), ('optional_usernames', 0), 'string does not match regex "^[a-zA-Z_]\\w*$"'),
+        (dict(default_args, min_attendees=0), ('min_attendees',), 'ensure this value is greater than 0'),
+        (
+            dict(default_args, optional_usernames='inv3,inv4', min_attendees=5),
+            ('__root__',),
+            'min_attendees should not be greater than the number of attendees',
+        ),
     ])
     def test_not_ok(self, form, loc, msg):
         with pytest.raises(ValidationError) as excinfo:
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+from flask import Flask
+import pytest
+
+from app import create_app
+from app.db_actions import (
+    create_meeting,
+    create_user,
+    get_user_by_name,
+    set_answer_for_invitation,
+)
+from app.free_window_cache import get_free_window_cache
+from app.logic import FreeWindowSearch
+from app.types import FreeWindowSearchStatusEnum
+
+HOUR = 60 * 60
+
+
+@pytest.fixture()
+def users(app: Flask):
+    user1 = create_user('user1', password='')
+    user2 = create_user('user2', password='')
+    create_meeting(creator=user1, start=HOUR, end=2 * HOUR)
+    return [user1, user2]
+
+
+def find(client, start: int, usernames: str = 'user1,user2', window_size: int = HOUR, **args):
+    return client.get('/find_free_window_for_users', query_string=dict(
+        usernames=usernames,
+        window_size=window_size,
+        start='1970-01-01T{:02}:{:02}:00+00:00'.format(start // HOUR, start % HOUR // 60),
+        **args,
+    ))
+
+
+def found(window_start: int) -> FreeWindowSearch:
+    return FreeWindowSearch(
+        start=window_start, status=FreeWindowSearchStatusEnum.found, searched_until=window_start, iterations=1,
+    )
+
+
+def test_cache_is_disabled():
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'CREATE_SCHEMA_ON_STARTUP': True, 'FREE_WINDOW_CACHE_SIZE': 0})
+    assert 'free_window_cache' not in app.extensions
+
+
+def test_second_request_is_cached(client, users):
+    cache = get_free_window_cache()
+    assert find(client, 0, window_size=2 * HOUR).json['window']['start'] == '1970-01-01T02:00:00+00:00'
+    assert cache.cache_info() == (0, 1, 1)
+    response = find(client, 30 * 60, window_size=2 * HOUR)
+    assert response.json['window']['start'] == '1970-01-01T02:00:00+00:00'
+    assert cache.cache_info() == (1, 1, 1)
+
+
+def test_new_meeting_invalidates(client, users):
+    find(client, 0, window_size=2 * HOUR)
+    create_meeting(creator=get_user_by_name('user2'), start=2 * HOUR, end=3 * HOUR)
+    assert find(client, 0, window_size=2 * HOUR).json['window']['start'] == '1970-01-01T03:00:00+00:00'
+    assert get_free_window_cache().cache_info().hits == 0
+
+
+def test_answer_invalidates(client, users):
+    meeting = create_meeting(creator=users[0], start=2 * HOUR, end=3 * HOUR, invitees=[users[1]])
+    assert find(client, 0, usernames='user2', window_size=3 * HOUR).json['window']['start'] == '1970-01-01T03:00:00+00:00'
+    set_answer_for_invitation(get_user_by_name('user2'), meeting, False)
+    assert find(client, 0, usernames='user2', window_size=3 * HOUR).json['window']['start'] == '1970-01-01T00:00:00+00:00'
+    assert get_free_window_cache().cache_info().hits == 0
+
+
+def test_other_users_meetings_do_not_invalidate(client, users):
+    find(client, 0)
+    create_meeting(creator=create_user('user3', password=''), start=0, end=HOUR)
+    find(client, 0)
+    assert get_free_window_cache().cache_info().hits == 1
+
+
+def test_horizon_reached_is_cached(client, users):
+    response = find(client, 30 * 60, usernames='user1', horizon=60 * 60)
+    assert response.json['search']['result'] == 'horizon_reached'
+    assert response.json['search']['searched_until'] == '1970-01-01T02:00:00+00:00'
+    # the cached search covers the whole horizon of the later start
+    response = find(client, 45 * 60, usernames='user1', horizon=60 * 60)
+    assert response.json['search']['result'] == 'horizon_reached'
+    assert get_free_window_cache().cache_info().hits == 1
+    response = find(client, 61 * 60, usernames='user1', horizon=60 * 60)
+    assert response.json['window']['start'] == '1970-01-01T02:00:00+00:00'
+    assert get_free_window_cache().cache_info().hits == 1
+
+
+class TestApplies:
+    @pytest.fixture(autouse=True)
+    def _setup(self, app: Flask, users):
+        self.cache = get_free_window_cache()
+        self.users = users
+        self.versions = (0, 0)
+
+    def test_earlier_start(self):
+        self.cache.put(self.users, self.versions, HOUR, HOUR, 100, found(200))
+        assert self.cache.get(self.users, self.versions, HOUR, HOUR, 99) is None
+
+    def test_start_between(self):
+        self.cache.put(self.users, self.versions, HOUR, HOUR, 100, found(200))
+        assert self.cache.get(self.users, self.versions, HOUR, HOUR, 200) == found(200)
+
+    def test_start_after_window(self):
+        self.cache.put(self.users, self.versions, HOUR, HOUR, 100, found(200))
+        assert self.cache.get(self.users, self.versions, HOUR, HOUR, 201) is None
+
+    def test_other_bucket(self):
+        self.cache.put(self.users, self.versions, HOUR, 5 * HOUR, HOUR - 1, found(2 * HOUR))
+        assert self.cache.get(self.users, self.versions, HOUR, 5 * HOUR, HOUR) is None
+
+    def test_horizon_reached(self):
+        search = FreeWindowSearch(
+            start=None, status=FreeWindowSearchStatusEnum.horizon_reached, searched_until=1000, iterations=5,
+        )
+        self.cache.put(self.users, self.versions, HOUR, 500, 100, search)
+        assert self.cache.get(self.users, self.versions, HOUR, 500, 500) == search
+        assert self.cache.get(self.users, self.versions, HOUR, 500, 501) is None
+
+    def test_budget_exhausted_is_not_stored(self):
+        search = FreeWindowSearch(
+            start=None, status=FreeWindowSearchStatusEnum.budget_exhausted, searched_until=1000, iterations=5,
+        )
+        self.cache.put(self.users, self.versions, HOUR, HOUR, 100, search)
+        assert self.cache.get(self.users, self.versions, HOUR, HOUR, 100) is None
+
+    def test_users_order_does_not_matter(self):
+        self.cache.put(self.users, self.versions, HOUR, HOUR, 100, found(200))
+        assert self.cache.get(list(reversed(self.users)), self.versions, HOUR, HOUR, 100) == found(200)
+
+    def test_least_recently_used_are_evicted(self):
+        self.cache.size = 2
+        self.cache.put(self.users, self.versions, 1, HOUR, 100, found(200))
+        self.cache.put(self.users, self.versions, 2, HOUR, 100, found(200))
+        assert self.cache.get(self.users, self.versions, 1, HOUR, 100) is not None
+        self.cache.put(self.users, self.versions, 3, HOUR, 100, found(200))
+        assert self.cache.get(self.users, self.versions, 1, HOUR, 100) is not None
+        assert self.cache.get(self.users, self.versions, 2, HOUR, 100) is None
+        assert self.cache.get(self.users, self.versions, 3, HOUR, 100) is not None
@@ -1,7 +1,62 @@
 # -*- coding: utf-8 -*-
+from contextlib import closing
+import sqlite3
+import subprocess
+import sys
+
+from sqlalchemy import inspect
+
 from app import create_app
+from app.models import db
 
 
 def test_create_app():
     assert create_app().testing is False
     assert create_app({'TESTING': True}).testing is True
+
+
+def test_create_app_does_not_create_schema(tmp_path):
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///{}'.format(tmp_path / 'app.db')})
+    with app.app_context():
+        assert inspect(db.engine).get_table_names() == []
+
+
+def test_db_init_command(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///{}'.format(tmp_path / 'app.db'),
+        'SHARD_DATABASE_URIS': ['sqlite:///{}'.format(tmp_path / 'shard{}.db'.format(i)) for i in range(2)],
+    })
+    for _ in range(2):  # the second run finds all tables in place
+        result = app.test_cli_runner().invoke(args=['db-init'])
+        assert result.exit_code == 0, result.output
+        assert result.output == 'schema is up to date\n'
+    with app.app_context():
+        engines = [db.engine] + app.extensions['shards'].engines
+        for engine in engines:
+            assert {'users', 'meetings', 'invitations', 'meeting_id_sequence', 'events'} <= set(
+                inspect(engine).get_table_names()
+            )
+
+
+def test_db_init_command_fails_on_old_schema(tmp_path):
+    path = tmp_path / 'app.db'
+    with closing(sqlite3.connect(path)) as connection:
+        connection.execute('CREATE TABLE users (id INTEGER PRIMARY KEY, name VARCHAR(20), password_hash VARCHAR(120))')
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///{}'.format(path)})
+    result = app.test_cli_runner().invoke(args=['db-init'])
+    assert result.exit_code == 1
+    assert 'has no columns users.calendar_version, migrate or recreate it' in result.output
+
+
+def test_views_are_imported_on_first_request():
+    code = '\n'.join([
+        'import sys',
+        'from app import create_app',
+        "app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'CREATE_SCHEMA_ON_STARTUP': True})",
+        "print(sorted(name for name in ('app.views', 'app.logic', 'app.db_actions') if name in sys.modules))",
+        "assert app.test_client().get('/ping').status_code == 200",
+        "print(sorted(name for name in ('app.views', 'app.logic', 'app.db_actions') if name in sys.modules))",
+    ])
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    assert output.splitlines() == ['[]', "['app.db_actions', 'app.logic', 'app.views']"]
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+import copy
+import threading
+import time
+
+from flask import Flask
+import pytest
+
+from app import create_app
+from app.db_actions import (
+    create_meeting,
+    create_user,
+    get_user_by_name,
+)
+from app.jobs import (
+    HANDLERS,
+    Job,
+    JobLostException,
+    JobQueue,
+    Progress,
+)
+from app.types import (
+    JobKindEnum,
+    JobStateEnum,
+)
+
+from tests.utils import make_headers
+
+HEADERS = make_headers(name='user1', password='password')
+
+
+def make_meeting(**kwargs) -> dict:
+    return dict(dict(creator_username='user1', start='2022-06-22T10:00+00:00', end='2022-06-22T11:00+00:00'), **kwargs)
+
+
+@pytest.fixture()
+def app(tmp_path) -> Flask:
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'CREATE_SCHEMA_ON_STARTUP': True,
+        'JOBS_DATABASE': str(tmp_path / 'jobs.db'),
+        'JOBS_STALE_TIMEOUT': 60,
+        'JOBS_MAX_ATTEMPTS': 2,
+    })
+    with app.app_context():
+        create_user('user1', password='password')
+        create_user('user2', password='password')
+        yield app
+
+
+@pytest.fixture()
+def queue(app: Flask) -> JobQueue:
+    return app.extensions['job_queue']
+
+
+def test_jobs_are_claimed_in_order(queue):
+    first = queue.submit(JobKindEnum.export_meetings, {'username': 'user1'}, owner_id=1, now=100)
+    second = queue.submit(JobKindEnum.export_meetings, {}, owner_id=1, now=101)
+    job = queue.claim(now=102)
+    assert (job.id, job.state, job.attempts, job.started) == (first, JobStateEnum.running, 1, 102)
+    assert job.params == {'username': 'user1'}
+    assert queue.claim(now=102).id == second
+    assert queue.claim(now=102) is None
+
+
+def test_progress_and_result(queue):
+    job_id = queue.submit(JobKindEnum.export_meetings, {}, owner_id=1, now=100)
+    queue.claim(now=100)
+    queue.set_progress(job_id, 5, 10, now=101)
+    job = queue.get(job_id)
+    assert (job.state, job.done, job.total) == (JobStateEnum.running, 5, 10)
+    queue.finish(job_id, {'meetings': []}, now=102)
+    job = queue.get(job_id)
+    assert (job.state, job.result, job.finished) == (JobStateEnum.done, {'meetings': []}, 102)
+    assert queue.get(job_id + 1) is None
+
+
+def test_stale_jobs_are_queued_again(queue):
+    job_id = queue.submit(JobKindEnum.export_meetings, {}, owner_id=1, now=100)
+    queue.claim(now=100)
+    queue.set_progress(job_id, 1, 10, now=130)
+    assert queue.claim(now=180) is None  # progress was reported 50 seconds ago
+    job = queue.claim(now=200)
+    assert (job.id, job.attempts, job.done) == (job_id, 2, 0)
+    # a job which was given to another worker is not updated by the old one anymore
+    queue.worker = 'other'
+    assert queue.finish(job_id, {}, now=201) is False
+    assert queue.set_progress(job_id, 2, 10, now=201) is False
+    with pytest.raises(JobLostException):
+        queue.record_item(job_id, 0, 1, now=201)
+    assert queue.get(job_id).state == JobStateEnum.running
+    assert queue.get_items(job_id) == {}
+    # no attempts left
+    assert queue.claim(now=300) is None
+    job = queue.get(job_id)
+    assert (job.state, job.error) == (JobStateEnum.failed, 'Worker stopped responding')
+
+
+def test_import_meetings(app, queue):
+    client = app.test_client()
+    meetings = [make_meeting(invitees='user2'), make_meeting(repeat_type='custom', recurrence_rule='FREQ=DAILY')]
+    response = client.post('/jobs', json=dict(kind='import_meetings', params=dict(meetings=meetings)), headers=HEADERS)
+    assert response.status_code == 202
+    job_id = response.json['job_id']
+    assert client.get('/jobs/{}'.format(job_id), headers=HEADERS).json['job']['state'] == 'queued'
+
+    assert queue.run_next().id == job_id
+    assert queue.run_next() is None
+    response = client.get('/jobs/{}'.format(job_id), headers=HEADERS)
+    job = response.json['job']
+    assert job['state'] == 'done'
+    assert job['progress'] == dict(done=2, total=2)
+    assert {'created', 'started', 'finished'} <= set(job)
+    meeting_ids = job['result']['meeting_ids']
+    assert len(meeting_ids) == 2
+    meeting = client.get('/meetings/{}'.format(meeting_ids[0])).json['meeting_description']
+    assert meeting['invitees'] == [dict(username='user2', accepted_invitation=None)]
+
+
+def test_queued_again_import_continues(app, queue):
+    meetings = [make_meeting(description=str(i)) for i in range(3)]
+    job_id = queue.submit(JobKindEnum.import_meetings, dict(meetings=meetings), owner_id=1, now=100)
+    queue.claim(now=100)
+    # the first attempt created the first meeting and was killed
+    first = create_meeting(creator=get_user_by_name('user1'), start=0, end=10)
+    queue.record_item(job_id, 0, first.id, now=101)
+
+    assert queue.run_next().attempts == 2
+    job = queue.get(job_id)
+    assert job.state == JobStateEnum.done
+    assert job.result['meeting_ids'][0] == first.id
+    assert sorted(job.result['meeting_ids']) == [first.id, first.id + 1, first.id + 2]
+    assert app.test_client().get('/meetings/{}'.format(first.id + 3)).status_code == 404
+
+
+OTHER_WORKER = []  # queue of another worker and the jobs it claimed
+
+
+def other_worker(queue: JobQueue) -> None:
+    other = copy.copy(queue)
+    other.worker = 'other'
+    other._local = threading.local()
+    OTHER_WORKER[:] = [other, []]
+
+
+def slow_handler(job: Job, progress: Progress) -> dict:
+    other, claimed = OTHER_WORKER
+    time.sleep(other.stale_timeout * 2)
+    claimed.append(other.claim(time.time()))
+    return {}
+
+
+def taken_away_handler(job: Job, progress: Progress) -> dict:
+    other, claimed = OTHER_WORKER
+    claimed.append(other.claim(time.time() + 1000))
+    progress(1, 2)
+    return {}
+
+
+def test_heartbeat_keeps_job_running(queue, monkeypatch):
+    queue.stale_timeout = 0.1
+    other_worker(queue)
+    monkeypatch.setitem(HANDLERS, JobKindEnum.export_meetings, '{}.slow_handler'.format(__name__))
+    job_id = queue.submit(JobKindEnum.export_meetings, {}, owner_id=1, now=time.time())
+    queue.run_next()
+    assert OTHER_WORKER[1] == [None]
+    assert queue.get(job_id).state == JobStateEnum.done
+
+
+def test_job_taken_away_is_stopped(queue, monkeypatch, caplog):
+    other_worker(queue)
+    monkeypatch.setitem(HANDLERS, JobKindEnum.export_meetings, '{}.taken_away_handler'.format(__name__))
+    job_id = queue.submit(JobKindEnum.export_meetings, {}, owner_id=1, now=time.time())
+    queue.run_next()
+    assert OTHER_WORKER[1][0].id == job_id
+    job = queue.get(job_id)
+    assert (job.state, job.done, job.attempts) == (JobStateEnum.running, 0, 2)
+    assert 'Job {} was given to another worker, stopped'.format(job_id) in caplog.messages
+
+
+def test_failed_import_creates_nothing(app, queue):
+    client = app.test_client()
+    meetings = [make_meeting(), make_meeting(invitees='nobody')]
+    job_id = client.post(
+        '/jobs', json=dict(kind='import_meetings', params=dict(meetings=meetings)), headers=HEADERS,
+    ).json['job_id']
+    queue.run_next()
+    job = client.get('/jobs/{}'.format(job_id), headers=HEADERS).json['job']
+    assert (job['state'], job['error']) == ('failed', 'User "nobody" does not exist')
+    assert 'result' not in job
+    assert client.get('/meetings/1').status_code == 404
+
+
+def test_export_meetings(app, queue):
+    user1, user2 = create_user('user3', password=''), create_user('user4', password='')
+    create_meeting(creator=user1, start=1000, end=2000, invitees=[user2], is_private=True, description='secret')
+    client = app.test_client()
+    params = dict(username='user3', start='1970-01-01T00:00', end='1970-01-02T00:00')
+    job_id = client.post('/jobs', json=dict(kind='export_meetings', params=params), headers=HEADERS).json['job_id']
+    queue.run_next()
+    job = client.get('/jobs/{}'.format(job_id), headers=HEADERS).json['job']
+    assert job['state'] == 'done'
+    # private details are not shown to the owner of the job
+    assert job['result'] == dict(meetings=[dict(
+        id=1, start_datetime='1970-01-01T00:16:40+00:00', end_datetime='1970-01-01T00:33:20+00:00',
+    )])
+
+
+def test_submit_errors(app):
+    client = app.test_client()
+    body = dict(kind='import_meetings', params=dict(meetings=[make_meeting()]))
+    assert client.post('/jobs', json=body).status_code == 401
+    response = client.post('/jobs', json=body, headers=make_headers(name='user2', password='password'))
+    assert response.status_code == 403
+    response = client.post('/jobs', json=dict(kind='nothing', params={}), headers=HEADERS)
+    assert response.status_code == 400
+    assert list(response.json['error']) == ['kind']
+    response = client.post('/jobs', json=dict(kind='import_meetings', params=dict(meetings=[])), headers=HEADERS)
+    assert response.status_code == 400
+    assert list(response.json['error']) == ['meetings']
+
+
+def test_get_errors(app, queue):
+    client = app.test_client()
+    job_id = queue.submit(JobKindEnum.export_meetings, {}, owner_id=1, now=100)
+    assert client.get('/jobs/{}'.format(job_id)).status_code == 401
+    response = client.get('/jobs/{}'.format(job_id), headers=make_headers(name='user2', password='password'))
+    assert response.status_code == 403
+    response = client.get('/jobs/{}'.format(job_id + 1), headers=HEADERS)
+    assert response.status_code == 404
+    assert response.json == dict(status='error', error='Job with id "{}" does not exist'.format(job_id + 1))
+
+
+def test_worker_command(app, queue):
+    job_id = queue.submit(JobKindEnum.import_meetings, dict(meetings=[make_meeting()]), owner_id=1, now=100)
+    result = app.test_cli_runner().invoke(args=['jobs-worker', '--concurrency', '1', '--burst'])
+    assert result.exit_code == 0, result.output
+    assert queue.get(job_id).state == JobStateEnum.done
+
+
+def test_jobs_are_disabled_without_database():
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+    assert app.test_client().post('/jobs', json={}).status_code == 404
+    result = app.test_cli_runner().invoke(args=['jobs-worker'])
+    assert result.exit_code == 1
+    assert 'JOBS_DATABASE is not set' in result.output
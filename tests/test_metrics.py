@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime
+import json
+import os
+import subprocess
+import sys
+
+from app import create_app
+from app.db_actions import (
+    create_meeting,
+    create_user,
+)
+from app.metrics import Metrics
+from app.types import RepeatTypeEnum
+
+
+def get_metrics(client) -> dict[str, float]:
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    values = {}
+    for line in response.data.decode().splitlines():
+        if not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            values[name] = float(value)
+    return values
+
+
+def test_request_metrics(client):
+    client.get('/ping')
+    client.get('/ping')
+    client.get('/meetings/1')
+    metrics = get_metrics(client)
+    assert metrics['http_requests_total{endpoint="ping",status="200"}'] == 2
+    assert metrics['http_requests_total{endpoint="get_meeting",status="404"}'] == 1
+    assert metrics['http_request_duration_seconds_count{endpoint="ping"}'] == 2
+    assert metrics['http_request_duration_seconds_bucket{endpoint="ping",le="+Inf"}'] == 2
+    assert metrics['http_request_sql_statements_count{endpoint="get_meeting"}'] == 1
+    assert metrics['http_request_sql_statements_sum{endpoint="get_meeting"}'] == 1
+    assert metrics['http_request_sql_statements_sum{endpoint="ping"}'] == 0
+    assert metrics['http_request_sql_statements_bucket{endpoint="ping",le="0.0"}'] == 2
+
+
+def test_scheduling_metrics(client):
+    create_meeting(
+        creator=create_user('busy', password=''),
+        start=datetime.fromisoformat('2022-06-22T00:00+00:00'),
+        end=datetime.fromisoformat('2022-06-22T23:30+00:00'),
+        repeat_type=RepeatTypeEnum.daily,
+    )
+    client.get('/find_free_window_for_users', query_string=dict(usernames='busy', window_size=3600, start='2022-06-22T00:00+00:00'))
+    client.get('/users/busy/meetings', query_string=dict(start='2022-06-22T00:00+00:00', end='2022-06-25T00:00+00:00'))
+    metrics = get_metrics(client)
+    assert metrics['free_window_horizon_hits_total{endpoint="find_free_window"}'] == 1
+    assert metrics['http_request_free_window_iterations_sum{endpoint="find_free_window"}'] > 3000
+    assert metrics['http_request_occurrences_expanded_sum{endpoint="user_meetings"}'] == 4
+
+
+def test_cache_metrics(client):
+    create_user('user1', password='')
+    client.post('/meetings', json=dict(
+        creator_username='user1', start='2022-06-22T10:00', end='2022-06-22T11:00',
+        repeat_type='custom', recurrence_rule='FREQ=DAILY',
+    ))
+    client.get('/users/user1/meetings', query_string=dict(start='2022-06-22T00:00+00:00', end='2022-06-25T00:00+00:00'))
+    metrics = get_metrics(client)
+    assert 'cache_entries{cache="recurrence_rules"}' in metrics
+    assert 'cache_hits_total{cache="recurrence_rules"}' in metrics
+
+
+def test_metrics_are_merged_across_processes(tmp_path):
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'CREATE_SCHEMA_ON_STARTUP': True, 'METRICS_DIR': str(tmp_path)})
+    other_process = Metrics()
+    other_process.inc('http_requests_total', (('endpoint', 'ping'), ('status', '200')), 5)
+    other_process.observe('http_request_duration_seconds', (('endpoint', 'ping'),), 0.003)
+    snapshot = other_process.snapshot()
+    snapshot['gauges'].append(['cache_entries', [['cache', 'recurrence_rules']], 1000])
+    (tmp_path / 'metrics_{}.json'.format(os.getppid())).write_text(json.dumps(snapshot))
+
+    client = app.test_client()
+    client.get('/ping')
+    metrics = get_metrics(client)
+    assert metrics['http_requests_total{endpoint="ping",status="200"}'] == 6
+    assert metrics['http_request_duration_seconds_count{endpoint="ping"}'] == 2
+    assert metrics['http_request_duration_seconds_bucket{endpoint="ping",le="0.0025"}'] <= 1
+    assert metrics['cache_entries{cache="recurrence_rules"}'] < 1000  # gauges are not summed
+    assert len(list(tmp_path.glob('metrics_*.json'))) == 2
+
+
+def test_metrics_of_exited_processes_are_archived(tmp_path):
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'CREATE_SCHEMA_ON_STARTUP': True, 'METRICS_DIR': str(tmp_path)})
+    exited = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'], capture_output=True, text=True)
+    other_process = Metrics()
+    other_process.inc('http_requests_total', (('endpoint', 'ping'), ('status', '200')), 5)
+    (tmp_path / 'metrics_{}.json'.format(exited.stdout.strip())).write_text(json.dumps(other_process.snapshot()))
+
+    client = app.test_client()
+    client.get('/ping')
+    metrics = get_metrics(client)
+    assert metrics['http_requests_total{endpoint="ping",status="200"}'] == 6
+    assert [path.name for path in tmp_path.glob('metrics_*.json')] == ['metrics_{}.json'.format(os.getpid())]
+
+    # this process exits, a new one starts
+    app.extensions['metrics']._archive_own()
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'CREATE_SCHEMA_ON_STARTUP': True, 'METRICS_DIR': str(tmp_path)})
+    metrics = get_metrics(app.test_client())
+    assert metrics['http_requests_total{endpoint="ping",status="200"}'] == 6
+    assert metrics['http_request_duration_seconds_count{endpoint="ping"}'] == 1
+
+
+def test_metrics_can_be_disabled():
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'CREATE_SCHEMA_ON_STARTUP': True, 'METRICS_ENABLED': False})
+    assert app.test_client().get('/metrics').status_code == 404
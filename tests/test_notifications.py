@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from flask import Flask
+import pytest
+
+from app.db_actions import (
+    create_meeting,
+    create_user,
+    set_answer_for_invitation,
+)
+from app.notifications import ReminderScheduler
+from app.types import RepeatTypeEnum
+
+DAY = 60 * 60 * 24
+
+
+@pytest.fixture()
+def scheduler(app: Flask) -> ReminderScheduler:
+    return ReminderScheduler(app)
+
+
+@pytest.fixture()
+def users(app: Flask):
+    return create_user('creator', password=''), create_user('user1', password=''), create_user('user2', password='')
+
+
+def test_one_off_meeting(scheduler, users):
+    creator, user1, user2 = users
+    meeting = create_meeting(creator=creator, start=10000, end=11000, invitees=[user1, user2], remind_before=600)
+    scheduler.schedule(meeting, now=0)
+    assert scheduler.seconds_until_next(0) == 9400
+    assert scheduler.pop_due(9399) == []
+
+    [reminder] = scheduler.pop_due(9400)
+    assert reminder.meeting_id == meeting.id
+    assert reminder.start == 10000
+    assert reminder.end == 11000
+    assert reminder.series.attendees == ('creator', 'user1', 'user2')
+    assert len(scheduler) == 0
+    assert scheduler.seconds_until_next(9400) is None
+
+
+def test_meeting_without_reminder_is_not_scheduled(scheduler, users):
+    scheduler.schedule(create_meeting(creator=users[0], start=10000, end=11000), now=0)
+    assert len(scheduler) == 0
+
+
+def test_past_meeting_is_not_scheduled(scheduler, users):
+    scheduler.schedule(create_meeting(creator=users[0], start=10000, end=11000, remind_before=600), now=9500)
+    assert len(scheduler) == 0
+
+
+def test_recurring_meeting_is_rearmed(scheduler, users):
+    meeting = create_meeting(
+        creator=users[0], start=DAY, end=DAY + 3600, repeat_type=RepeatTypeEnum.daily, remind_before=60,
+    )
+    scheduler.schedule(meeting, now=0)
+
+    [reminder] = scheduler.pop_due(DAY - 60)
+    assert reminder.start == DAY
+    assert len(scheduler) == 1
+    assert scheduler.seconds_until_next(DAY - 60) == DAY
+
+    [reminder] = scheduler.pop_due(2 * DAY - 60)
+    assert reminder.start == 2 * DAY
+    assert reminder.end == 2 * DAY + 3600
+
+
+def test_old_series_starts_from_next_occurrence(scheduler, users):
+    meeting = create_meeting(
+        creator=users[0], start=0, end=3600, repeat_type=RepeatTypeEnum.weekly, remind_before=60,
+    )
+    scheduler.schedule(meeting, now=100 * 7 * DAY + 1)
+    [reminder] = scheduler.pop_due(200 * 7 * DAY)
+    assert reminder.start == 101 * 7 * DAY
+
+
+def test_missed_occurrences_fire_once(scheduler, users):
+    meeting = create_meeting(
+        creator=users[0], start=DAY, end=DAY + 3600, repeat_type=RepeatTypeEnum.daily, remind_before=60,
+    )
+    scheduler.schedule(meeting, now=0)
+    assert len(scheduler.pop_due(10 * DAY)) == 1
+    assert scheduler.seconds_until_next(10 * DAY) == DAY - 60
+
+
+def test_answer_updates_attendees(scheduler, users):
+    creator, user1, user2 = users
+    meeting = create_meeting(creator=creator, start=10000, end=11000, invitees=[user1, user2], remind_before=600)
+    set_answer_for_invitation(user1, meeting, False)
+    scheduler.schedule(meeting, now=0)  # as refresh does with the changed meeting
+
+    [reminder] = scheduler.pop_due(9400)
+    assert reminder.series.attendees == ('creator', 'user2')
+
+
+def test_first_refresh_loads_meetings_with_reminders(scheduler, users):
+    create_meeting(creator=users[0], start=0, end=3600, repeat_type=RepeatTypeEnum.daily, remind_before=60)
+    create_meeting(creator=users[0], start=0, end=3600, repeat_type=RepeatTypeEnum.daily)
+    scheduler.refresh(now=0)
+    assert len(scheduler) == 1
+
+
+def test_refresh_reads_changed_meetings(scheduler, users):
+    creator, user1, _ = users
+    scheduler.refresh(now=0)
+    assert len(scheduler) == 0
+    meeting = create_meeting(
+        creator=creator, start=0, end=3600, invitees=[user1], repeat_type=RepeatTypeEnum.daily, remind_before=60,
+    )
+    scheduler.refresh(now=0)
+    assert len(scheduler) == 1
+    set_answer_for_invitation(user1, meeting, False)
+    scheduler.refresh(now=0)
+    assert len(scheduler) == 1
+    [reminder] = scheduler.pop_due(2 ** 40)
+    assert reminder.series.attendees == ('creator',)
+
+
+def test_fire_logs_reminder(scheduler, users, caplog):
+    scheduler.schedule(create_meeting(creator=users[0], start=10000, end=11000, remind_before=600), now=0)
+    with caplog.at_level(logging.INFO, logger='app.notifications'):
+        for reminder in scheduler.pop_due(9400):
+            scheduler.fire(reminder)
+    assert caplog.messages == ['Meeting 1 starts at 1970-01-01T02:46:40+00:00, reminding creator']
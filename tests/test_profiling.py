@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import pstats
+
+import pytest
+
+from app import create_app
+from app.db_actions import create_user
+
+
+@pytest.fixture()
+def profiled_client(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'CREATE_SCHEMA_ON_STARTUP': True,
+        'PROFILING_TOKEN': 'secret',
+        'PROFILING_DIR': str(tmp_path),
+        'PROFILING_TOP': 5,
+    })
+    with app.app_context():
+        create_user('user1', password='')
+        yield app.test_client()
+
+
+def test_profiled_request(profiled_client, tmp_path):
+    response = profiled_client.get(
+        '/find_free_window_for_users',
+        query_string=dict(usernames='user1', window_size=3600, start='2022-06-22T00:00+00:00'),
+        headers={'X-Profile': 'secret'},
+    )
+    assert response.status_code == 200
+    filename = response.headers['X-Profile-File']
+    assert filename == 'find_free_window_{}.prof'.format(response.headers['X-Request-Id'])
+    stats = pstats.Stats(str(tmp_path / filename))
+    assert any(name == 'search_free_window_among_meetings' for _, _, name in stats.stats)
+    summary = response.headers['X-Profile-Summary'].split('; ')
+    assert len(summary) == 5
+    assert 'cumulative_ms=' in summary[0]
+
+
+@pytest.mark.parametrize('headers', [{}, {'X-Profile': 'wrong'}])
+def test_not_profiled_request(profiled_client, tmp_path, headers):
+    response = profiled_client.get('/ping', headers=headers)
+    assert response.status_code == 200
+    assert 'X-Profile-File' not in response.headers
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_profiling_is_off_without_token(app):
+    assert 'request_profiler' not in app.extensions
+    response = app.test_client().get('/ping', headers={'X-Profile': ''})
+    assert 'X-Profile-File' not in response.headers
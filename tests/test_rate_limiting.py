@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+import time
+
+from flask import Flask
+import pytest
+
+from app import create_app
+from app.db_actions import (
+    create_meeting,
+    create_user,
+    get_user_by_name,
+)
+from app.models import User
+from app.rate_limiting import (
+    Admission,
+    RateLimiter,
+)
+
+from tests.utils import make_headers
+
+FREE_WINDOW_QUERY = dict(usernames='user1', window_size=3600, start='2022-06-22T00:00+00:00')
+
+
+@pytest.fixture()
+def config(tmp_path) -> dict:
+    return {
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'CREATE_SCHEMA_ON_STARTUP': True,
+        'RATE_LIMIT_DATABASE': str(tmp_path / 'rate_limits.db'),
+        'RATE_LIMIT_CAPACITY': 10,
+        'RATE_LIMIT_RATE': 1,
+        'RATE_LIMIT_COSTS': {'find_free_window': 4, 'ping': 0},
+        'RATE_LIMIT_CONCURRENCY': {'find_free_window': 2},
+        'RATE_LIMIT_SLOT_TIMEOUT': 60,
+    }
+
+
+@pytest.fixture()
+def limiter(config) -> RateLimiter:
+    return create_app(config).extensions['rate_limiter']
+
+
+@pytest.fixture()
+def limited_app(config) -> Flask:
+    app = create_app(config)
+    with app.app_context():
+        create_user('user1', password='password')
+        yield app
+
+
+def test_bucket_is_refilled(limiter):
+    assert [limiter.admit('ip:1', 'users', 3, now=100).admitted for _ in range(4)] == [True, True, True, False]
+    assert limiter.admit('ip:1', 'users', 3, now=100) == Admission(admitted=False, retry_after=2)
+    assert limiter.admit('ip:2', 'users', 3, now=100).admitted is True  # other clients have their own buckets
+    assert limiter.admit('ip:1', 'users', 3, now=101.5).admitted is False
+    assert limiter.admit('ip:1', 'users', 3, now=102).admitted is True
+    # a bucket never holds more than the capacity
+    assert [limiter.admit('ip:1', 'users', 10, now=1000 + i).admitted for i in range(2)] == [True, False]
+    # requests which cost more than the capacity take the whole bucket
+    assert limiter.admit('ip:3', 'users', 100, now=0).admitted is True
+
+
+def test_state_is_shared_between_processes(config, limiter):
+    other_process_limiter = create_app(config).extensions['rate_limiter']
+    assert limiter.admit('ip:1', 'users', 6, now=100).admitted is True
+    assert other_process_limiter.admit('ip:1', 'users', 6, now=100).admitted is False
+
+
+def test_concurrency_slots(limiter):
+    slots = [limiter.admit('ip:{}'.format(i), 'find_free_window', 1, now=100) for i in range(3)]
+    assert [admission.admitted for admission in slots] == [True, True, False]
+    assert slots[2].retry_after == 1
+    assert limiter.admit('ip:3', 'users', 1, now=100).admitted is True  # other endpoints are not limited
+    limiter.release(slots[0].slot)
+    assert limiter.admit('ip:4', 'find_free_window', 1, now=100).admitted is True
+    assert limiter.admit('ip:5', 'find_free_window', 1, now=100).admitted is False
+    # slots which were never released, e.g. because the worker crashed, are freed after the timeout
+    assert limiter.admit('ip:5', 'find_free_window', 1, now=161).admitted is True
+
+
+def test_too_many_requests(limited_app):
+    client = limited_app.test_client()
+    responses = [client.get('/find_free_window_for_users', query_string=FREE_WINDOW_QUERY) for _ in range(3)]
+    assert [response.status_code for response in responses] == [200, 200, 429]
+    assert responses[2].json == dict(status='error', error='Too many requests')
+    assert 1 <= int(responses[2].headers['Retry-After']) <= 2
+    assert client.get('/ping').status_code == 200  # free
+    # an authenticated user has a bucket of their own
+    headers = make_headers(name='user1', password='password')
+    response = client.get('/find_free_window_for_users', query_string=FREE_WINDOW_QUERY, headers=headers)
+    assert response.status_code == 200
+    # a wrong password or a made up name does not give a fresh bucket
+    for name, password in (('user1', 'wrong'), ('nobody', 'password')):
+        headers = make_headers(name=name, password=password)
+        response = client.get('/find_free_window_for_users', query_string=FREE_WINDOW_QUERY, headers=headers)
+        assert response.status_code == 429
+
+
+def test_checked_credentials_are_cached(limited_app, monkeypatch):
+    checked = []
+    check_password = User.check_password
+    monkeypatch.setattr(User, 'check_password', lambda user, password: checked.append(password) or check_password(user, password))
+    meeting = create_meeting(creator=get_user_by_name('user1'), start=0, end=3600)
+    client = limited_app.test_client()
+    url = '/meetings/{}'.format(meeting.id)
+    for _ in range(3):
+        assert client.get(url, headers=make_headers(name='user1', password='password')).status_code == 200
+    assert client.get(url, headers=make_headers(name='user1', password='wrong')).status_code == 403
+    assert checked == ['password', 'wrong', 'wrong']  # the wrong one is checked by the limiter and the view
+
+
+def test_concurrency_limit_of_free_window_endpoint(limited_app):
+    # slots are released when requests end, so here they are held by another process
+    limiter = limited_app.extensions['rate_limiter']
+    for i in range(2):
+        limiter.admit('ip:10.0.0.{}'.format(i), 'find_free_window', 1, now=time.time())
+    client = limited_app.test_client()
+    assert client.get('/find_free_window_for_users', query_string=FREE_WINDOW_QUERY).status_code == 429
+    assert client.post('/users', json=dict(username='user2', password='password')).status_code == 200
+
+
+def test_slots_are_released(limited_app):
+    client = limited_app.test_client()
+    for _ in range(2):
+        assert client.get('/find_free_window_for_users', query_string=FREE_WINDOW_QUERY).status_code == 200
+    admission = limited_app.extensions['rate_limiter'].admit('ip:other', 'find_free_window', 1, now=time.time())
+    assert admission.admitted is True
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+from datetime import (
+    datetime,
+    timezone,
+)
+from itertools import islice
+
+import pytest
+
+from app.recurrence import (
+    compile_rule,
+    parse_rule,
+)
+
+
+def ts(value: str) -> int:
+    return int(datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp())
+
+
+def occurrences(rule: str, start: str, count: int = 6, after: str = None) -> list[str]:
+    starts = compile_rule(rule).iterate(ts(start), None if after is None else ts(after))
+    return [datetime.fromtimestamp(t, tz=timezone.utc).strftime('%Y-%m-%d %H:%M') for t in islice(starts, count)]
+
+
+@pytest.mark.parametrize('text,normalized', [
+    ('FREQ=DAILY', 'FREQ=DAILY'),
+    ('RRULE:freq=weekly;byday=we,mo;interval=2', 'FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,WE'),
+    ('FREQ=MONTHLY;BYDAY=-1FR,2MO', 'FREQ=MONTHLY;BYDAY=-1FR,2MO'),
+    ('FREQ=MONTHLY;BYMONTHDAY=-1,15;COUNT=10', 'FREQ=MONTHLY;BYMONTHDAY=-1,15;COUNT=10'),
+    ('FREQ=YEARLY;BYMONTH=6;BYDAY=3SU;UNTIL=20300101', 'FREQ=YEARLY;BYDAY=3SU;BYMONTH=6;UNTIL=20300101T235959Z'),
+])
+def test_parse_rule(text, normalized):
+    assert str(parse_rule(text)) == normalized
+    assert parse_rule(normalized) == parse_rule(text)
+
+
+@pytest.mark.parametrize('text,msg', [
+    ('FREQ=HOURLY', 'FREQ should be one of DAILY, WEEKLY, MONTHLY, YEARLY'),
+    ('INTERVAL=2', 'FREQ should be one of DAILY, WEEKLY, MONTHLY, YEARLY'),
+    ('FREQ=DAILY;INTERVAL=0', 'INTERVAL should be positive'),
+    ('FREQ=DAILY;INTERVAL=x', 'INTERVAL should be an integer'),
+    ('FREQ=DAILY;COUNT=2;UNTIL=20300101', 'COUNT and UNTIL should not be used together'),
+    ('FREQ=DAILY;UNTIL=2030', 'UNTIL should be a date or a utc date-time'),
+    ('FREQ=DAILY;BYSETPOS=1', 'unsupported parts: BYSETPOS'),
+    ('FREQ=DAILY;FREQ=DAILY', 'duplicated part "FREQ"'),
+    ('FREQ=DAILY;', 'malformed part ""'),
+    ('FREQ=MONTHLY;BYDAY=6MO', 'malformed BYDAY value "6MO"'),
+    ('FREQ=MONTHLY;BYMONTHDAY=32', 'BYMONTHDAY value 32 is out of range'),
+    ('FREQ=MONTHLY;BYMONTH=2', 'BYMONTH is supported only for YEARLY rules'),
+    ('FREQ=WEEKLY;BYDAY=1MO', 'n-th weekday is supported only for MONTHLY and YEARLY rules'),
+    ('FREQ=DAILY;BYMONTHDAY=1', 'BYMONTHDAY and BYMONTH are supported only for MONTHLY and YEARLY rules'),
+    ('FREQ=YEARLY;BYDAY=20MO', 'malformed BYDAY value "20MO"'),
+    ('FREQ=YEARLY;BYDAY=1MO', 'n-th weekday of a YEARLY rule is supported only with BYMONTH'),
+])
+def test_parse_rule_errors(text, msg):
+    with pytest.raises(ValueError) as excinfo:
+        parse_rule(text)
+    assert excinfo.value.args == (msg,)
+
+
+def test_compile_rule_is_cached():
+    assert compile_rule('FREQ=DAILY') is compile_rule('FREQ=DAILY')
+
+
+@pytest.mark.parametrize('rule,start,expected', [
+    ('FREQ=DAILY;INTERVAL=3', '2022-06-22T10:00', [
+        '2022-06-22 10:00', '2022-06-25 10:00', '2022-06-28 10:00', '2022-07-01 10:00', '2022-07-04 10:00', '2022-07-07 10:00',
+    ]),
+    ('FREQ=DAILY;INTERVAL=2;BYDAY=MO,TU', '2022-06-22T10:00', [
+        '2022-06-22 10:00', '2022-06-28 10:00', '2022-07-04 10:00', '2022-07-12 10:00', '2022-07-18 10:00', '2022-07-26 10:00',
+    ]),
+    ('FREQ=WEEKLY;BYDAY=MO,WE,FR', '2022-06-22T10:00', [
+        '2022-06-22 10:00', '2022-06-24 10:00', '2022-06-27 10:00', '2022-06-29 10:00', '2022-07-01 10:00', '2022-07-04 10:00',
+    ]),
+    ('FREQ=WEEKLY;INTERVAL=2;BYDAY=TU,TH', '2022-06-22T10:00', [
+        '2022-06-22 10:00', '2022-06-23 10:00', '2022-07-05 10:00', '2022-07-07 10:00', '2022-07-19 10:00', '2022-07-21 10:00',
+    ]),
+    ('FREQ=MONTHLY;BYDAY=-1FR', '2022-06-22T10:00', [
+        '2022-06-22 10:00', '2022-06-24 10:00', '2022-07-29 10:00', '2022-08-26 10:00', '2022-09-30 10:00', '2022-10-28 10:00',
+    ]),
+    ('FREQ=MONTHLY;BYDAY=2MO', '2022-11-01T10:00', [
+        '2022-11-01 10:00', '2022-11-14 10:00', '2022-12-12 10:00', '2023-01-09 10:00', '2023-02-13 10:00', '2023-03-13 10:00',
+    ]),
+    ('FREQ=MONTHLY', '2022-01-31T10:00', [
+        '2022-01-31 10:00', '2022-03-31 10:00', '2022-05-31 10:00', '2022-07-31 10:00', '2022-08-31 10:00', '2022-10-31 10:00',
+    ]),
+    ('FREQ=MONTHLY;BYMONTHDAY=1,-1;COUNT=5', '2022-01-31T10:00', [
+        '2022-01-31 10:00', '2022-02-01 10:00', '2022-02-28 10:00', '2022-03-01 10:00', '2022-03-31 10:00',
+    ]),
+    ('FREQ=YEARLY', '2020-02-29T10:00', [
+        '2020-02-29 10:00', '2024-02-29 10:00', '2028-02-29 10:00', '2032-02-29 10:00', '2036-02-29 10:00', '2040-02-29 10:00',
+    ]),
+    ('FREQ=YEARLY;BYMONTH=6;BYDAY=3SU', '2022-01-01T10:00', [
+        '2022-01-01 10:00', '2022-06-19 10:00', '2023-06-18 10:00', '2024-06-16 10:00', '2025-06-15 10:00', '2026-06-21 10:00',
+    ]),
+    ('FREQ=DAILY;UNTIL=20220625', '2022-06-22T10:00', [
+        '2022-06-22 10:00', '2022-06-23 10:00', '2022-06-24 10:00', '2022-06-25 10:00',
+    ]),
+    ('FREQ=DAILY;COUNT=1', '2022-06-22T10:00', ['2022-06-22 10:00']),
+    ('FREQ=YEARLY;BYMONTH=2;BYMONTHDAY=30', '2022-06-22T10:00', ['2022-06-22 10:00']),
+    # BYDAY limits BYMONTHDAY
+    ('FREQ=MONTHLY;BYDAY=FR;BYMONTHDAY=13', '2022-01-01T10:00', [
+        '2022-01-01 10:00', '2022-05-13 10:00', '2023-01-13 10:00', '2023-10-13 10:00', '2024-09-13 10:00', '2024-12-13 10:00',
+    ]),
+    ('FREQ=YEARLY;BYMONTH=6,7;BYDAY=SU;BYMONTHDAY=-1,1', '2022-01-01T10:00', [
+        '2022-01-01 10:00', '2022-07-31 10:00', '2024-06-30 10:00', '2025-06-01 10:00', '2029-07-01 10:00', '2030-06-30 10:00',
+    ]),
+    # without BYMONTH a YEARLY rule with BYDAY or BYMONTHDAY matches days of every month
+    ('FREQ=YEARLY;BYDAY=MO', '2022-01-01T10:00', [
+        '2022-01-01 10:00', '2022-01-03 10:00', '2022-01-10 10:00', '2022-01-17 10:00', '2022-01-24 10:00', '2022-01-31 10:00',
+    ]),
+    ('FREQ=YEARLY;BYMONTHDAY=1', '2022-01-15T10:00', [
+        '2022-01-15 10:00', '2022-02-01 10:00', '2022-03-01 10:00', '2022-04-01 10:00', '2022-05-01 10:00', '2022-06-01 10:00',
+    ]),
+    ('FREQ=YEARLY;INTERVAL=2;BYMONTHDAY=-1', '2022-11-15T10:00', [
+        '2022-11-15 10:00', '2022-11-30 10:00', '2022-12-31 10:00', '2024-01-31 10:00', '2024-02-29 10:00', '2024-03-31 10:00',
+    ]),
+])
+def test_iterate(rule, start, expected):
+    assert occurrences(rule, start) == expected
+
+
+@pytest.mark.parametrize('rule,after,expected', [
+    ('FREQ=WEEKLY;BYDAY=MO,WE,FR', '2030-06-25T00:00', ['2030-06-26 10:00', '2030-06-28 10:00', '2030-07-01 10:00']),
+    ('FREQ=WEEKLY;BYDAY=MO,WE,FR;COUNT=5', '2022-06-25T00:00', ['2022-06-27 10:00', '2022-06-29 10:00', '2022-07-01 10:00']),
+    ('FREQ=MONTHLY;BYDAY=-1FR', '2030-06-25T00:00', ['2030-06-28 10:00', '2030-07-26 10:00', '2030-08-30 10:00']),
+    ('FREQ=MONTHLY;BYMONTHDAY=-1;COUNT=3', '2022-07-01T00:00', ['2022-07-31 10:00']),
+    ('FREQ=DAILY', '2022-06-22T10:00', ['2022-06-22 10:00', '2022-06-23 10:00', '2022-06-24 10:00']),
+    ('FREQ=DAILY', '2022-06-22T10:01', ['2022-06-23 10:00', '2022-06-24 10:00', '2022-06-25 10:00']),
+])
+def test_iterate_after(rule, after, expected):
+    assert occurrences(rule, '2022-06-22T10:00', count=3, after=after) == expected
+
+
+def test_count_is_not_walked_past_its_end(monkeypatch):
+    rule = compile_rule('FREQ=MONTHLY;BYMONTHDAY=1;COUNT=3')
+    months = []
+    days_of_month = rule._days_of_month
+    monkeypatch.setattr(rule, '_days_of_month', lambda *args: months.append(args) or days_of_month(*args))
+    assert list(rule.iterate(ts('2022-06-01T10:00'), ts('2400-01-01T00:00'))) == []
+    assert len(months) <= 3
+
+
+@pytest.mark.parametrize('rule', [
+    'FREQ=DAILY;INTERVAL=5;BYDAY=MO,SA',
+    'FREQ=WEEKLY;INTERVAL=3;BYDAY=SU,TH;COUNT=40',
+    'FREQ=MONTHLY;INTERVAL=2;BYDAY=1MO,-2TU,FR',
+    'FREQ=MONTHLY;BYMONTHDAY=31,-3;COUNT=30',
+    'FREQ=YEARLY;BYMONTH=2,8;BYMONTHDAY=29',
+])
+def test_seeking_matches_iteration(rule):
+    everything = list(islice(compile_rule(rule).iterate(ts('2021-03-05T08:00')), 70))
+    for position in range(0, len(everything), 7):
+        sought = list(islice(compile_rule(rule).iterate(ts('2021-03-05T08:00'), everything[position] - 1), 10))
+        expected = everything[position:position + 10]
+        assert sought[:len(expected)] == expected
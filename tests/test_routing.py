@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import shutil
+
+from flask import Flask
+import pytest
+from sqlalchemy import event
+
+from app import create_app
+from app.models import db
+from app.routing import LAST_WRITE_COOKIE
+
+from tests.utils import make_headers
+
+
+def make_app(tmp_path, read_your_writes_window: float) -> Flask:
+    return create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///{}'.format(tmp_path / 'app.db'),
+        'CREATE_SCHEMA_ON_STARTUP': True,
+        'READ_REPLICA_DATABASE_URI': 'sqlite:///{}'.format(tmp_path / 'replica.db'),
+        'READ_YOUR_WRITES_WINDOW': read_your_writes_window,
+    })
+
+
+def count_statements(app: Flask) -> dict[str, list[str]]:
+    statements = dict(primary=[], replica=[])
+    with app.app_context():
+        for name, engine in (('primary', db.get_engine()), ('replica', db.get_engine(bind='replica'))):
+            event.listen(engine, 'before_cursor_execute', lambda *args, name=name: statements[name].append(args[2]))
+    return statements
+
+
+@pytest.fixture()
+def meeting_id(tmp_path) -> int:
+    # the replica is a copy of the primary made after the meeting was created
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///{}'.format(tmp_path / 'app.db'), 'CREATE_SCHEMA_ON_STARTUP': True})
+    client = app.test_client()
+    client.post('/users', json=dict(username='user1', password='password'))
+    response = client.post(
+        '/meetings',
+        json=dict(creator_username='user1', start='2022-06-22T10:00', end='2022-06-22T11:00'),
+        headers=make_headers(name='user1', password='password'),
+    )
+    shutil.copy(tmp_path / 'app.db', tmp_path / 'replica.db')
+    return response.json['meeting_id']
+
+
+def test_get_views_read_from_replica(tmp_path, meeting_id):
+    app = make_app(tmp_path, 0)
+    statements = count_statements(app)
+    client = app.test_client()
+
+    assert client.get('/meetings/{}'.format(meeting_id)).status_code == 200
+    assert client.get('/users/user1/meetings', query_string=dict(
+        start='2022-06-22T00:00', end='2022-06-23T00:00',
+    )).json['meetings'][0]['id'] == meeting_id
+    assert client.get('/find_free_window_for_users', query_string=dict(
+        usernames='user1', window_size=3600, start='2022-06-22T10:00',
+    )).json['window']['start'] == '2022-06-22T11:00:00+00:00'
+    assert statements['primary'] == []
+    assert len(statements['replica']) > 3
+
+
+def test_writes_go_to_primary(tmp_path, meeting_id):
+    app = make_app(tmp_path, 0)
+    statements = count_statements(app)
+    response = app.test_client().post('/users', json=dict(username='user2', password='password'))
+    assert response.status_code == 200
+    assert any(statement.startswith('INSERT INTO users') for statement in statements['primary'])
+    assert statements['replica'] == []
+    assert LAST_WRITE_COOKIE not in response.headers.get('Set-Cookie', '')
+
+
+def test_read_your_writes(tmp_path, meeting_id):
+    app = make_app(tmp_path, 60)
+    statements = count_statements(app)
+    client = app.test_client()
+    query_string = dict(start='2022-06-22T00:00', end='2022-06-23T00:00')
+
+    response = client.post('/users', json=dict(username='user2', password='password'))
+    assert LAST_WRITE_COOKIE in response.headers['Set-Cookie']
+    assert client.get('/users/user2/meetings', query_string=query_string).status_code == 200
+    assert statements['replica'] == []
+
+    # the replica is not updated in the test, so without the cookie the new user is not found
+    client.cookie_jar.clear()
+    assert client.get('/users/user2/meetings', query_string=query_string).status_code == 404
+    assert len(statements['replica']) == 1
+
+
+def test_no_replica(app):
+    assert 'read_replica' not in app.extensions
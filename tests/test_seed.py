@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+from flask import Flask
+import pytest
+
+from app import (
+    create_app,
+    db,
+)
+from app.db_actions import create_user
+from app.models import (
+    Invitation,
+    Meeting,
+    User,
+)
+from app.seed import (
+    generate,
+    parse_weights,
+    SeedConfig,
+)
+from app.types import RepeatTypeEnum
+
+
+def dump_tables() -> list[tuple]:
+    return [
+        tuple(row) for model in (User, Meeting, Invitation)
+        for row in db.session.query(*model.__table__.columns).all()
+    ]
+
+
+def test_seed_command(app: Flask):
+    result = app.test_cli_runner().invoke(args=[
+        'seed', '--users', '20', '--meetings', '200', '--seed', '1', '--now', '2022-06-22',
+        '--repeat-types', 'none=1,daily=1', '--invitees', '2=1', '--private-ratio', '1',
+    ])
+    assert result.exit_code == 0, result.output
+    assert db.session.query(User).count() == 20
+    assert db.session.query(Meeting).count() == 200
+    invitations = db.session.query(Invitation).count()
+    assert 200 < invitations <= 400
+    assert result.output == 'created 20 users, 200 meetings, {} invitations\n'.format(invitations)
+    assert {m.repeat_type for m in db.session.query(Meeting)} == {'none', 'daily'}
+    assert all(m.is_private for m in db.session.query(Meeting))
+
+
+def test_seed_command_is_reproducible_by_default(tmp_path):
+    tables = []
+    for i in range(2):
+        app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///{}'.format(tmp_path / 'app{}.db'.format(i)),
+            'CREATE_SCHEMA_ON_STARTUP': True,
+        })
+        result = app.test_cli_runner().invoke(args=['seed', '--users', '5', '--meetings', '20'])
+        assert result.exit_code == 0, result.output
+        with app.app_context():
+            tables.append(dump_tables())
+            # around the fixed date, not today
+            assert max(meeting.start for meeting in db.session.query(Meeting)) < 1_700_000_000
+    assert tables[0] == tables[1]
+
+
+def test_seed_command_around_today(app: Flask):
+    result = app.test_cli_runner().invoke(args=['seed', '--users', '5', '--meetings', '20', '--now', 'today'])
+    assert result.exit_code == 0, result.output
+    assert max(meeting.start for meeting in db.session.query(Meeting)) > 1_700_000_000
+
+
+def test_seed_command_validates_options(app: Flask):
+    result = app.test_cli_runner().invoke(args=['seed', '--repeat-types', 'weird=1'])
+    assert result.exit_code == 2
+    result = app.test_cli_runner().invoke(args=['seed', '--accept-ratio', '0.7', '--decline-ratio', '0.7'])
+    assert result.exit_code == 2
+
+
+def test_seed_command_username_collision(app: Flask):
+    create_user('user3', password='')
+    result = app.test_cli_runner().invoke(args=['seed', '--users', '2', '--meetings', '0'])
+    assert result.exit_code == 1
+    assert 'already exist' in result.output
+
+
+def test_generate_is_deterministic():
+    config = SeedConfig(users=30, meetings=300, seed=5, now=1_700_000_000)
+    dumps = []
+    for _ in range(2):
+        app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'CREATE_SCHEMA_ON_STARTUP': True})
+        with app.app_context():
+            generate(config)
+            dumps.append(dump_tables())
+            db.session.remove()
+    assert dumps[0] == dumps[1]
+
+
+def test_generate_appends_to_existing_data(app: Flask):
+    generate(SeedConfig(users=5, meetings=10, username_prefix='first'))
+    generate(SeedConfig(users=5, meetings=10, username_prefix='second'))
+    assert db.session.query(User).count() == 10
+    assert db.session.query(Meeting).count() == 20
+
+
+def test_generate_ratios(app: Flask):
+    generate(SeedConfig(users=50, meetings=2000, accept_ratio=0.25, decline_ratio=0.25, private_ratio=0.5))
+    answers = [i.answer for i in db.session.query(Invitation)]
+    assert 0.2 < answers.count(True) / len(answers) < 0.3
+    assert 0.2 < answers.count(False) / len(answers) < 0.3
+    private = db.session.query(Meeting).filter_by(is_private=True).count()
+    assert 0.45 < private / 2000 < 0.55
+
+
+def test_parse_weights():
+    assert parse_weights('none=1, daily=2.5', RepeatTypeEnum) == {RepeatTypeEnum.none: 1, RepeatTypeEnum.daily: 2.5}
+    assert parse_weights('0=1,10=3', int) == {0: 1, 10: 3}
+    with pytest.raises(ValueError):
+        parse_weights('none', RepeatTypeEnum)
+    with pytest.raises(ValueError):
+        parse_weights('none=0', RepeatTypeEnum)
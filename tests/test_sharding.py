@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+from datetime import (
+    datetime,
+    timezone,
+)
+
+from flask import Flask
+import pytest
+
+from app import create_app
+from app.db_actions import (
+    create_meeting,
+    create_user,
+    get_all_meetings_for_several_users,
+    get_calendar_versions,
+    get_meeting_by_id,
+    get_meeting_changes_for_user,
+    get_most_active_users,
+    set_answer_for_invitation,
+    stream_one_off_busy_intervals_for_several_users,
+)
+from app.models import (
+    db,
+    Event,
+    Invitation,
+    Meeting,
+    User,
+)
+from app.seed import (
+    generate,
+    SeedConfig,
+)
+from app.sharding import get_shards
+
+from tests.test_events import parse
+from tests.utils import make_headers
+
+SHARDS = 3
+
+
+@pytest.fixture()
+def sharded_app(tmp_path) -> Flask:
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'CREATE_SCHEMA_ON_STARTUP': True,
+        'SHARD_DATABASE_URIS': ['sqlite:///{}'.format(tmp_path / 'shard{}.db'.format(i)) for i in range(SHARDS)],
+    })
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture()
+def users(sharded_app) -> list[User]:
+    # with crc32 of the ids users 1-10 are spread over all shards
+    return [create_user('user{}'.format(i), password='') for i in range(1, 11)]
+
+
+def count_rows(model) -> list[int]:
+    return [session.query(model).count() for session in get_shards().sessions()]
+
+
+def test_users_are_copied_to_every_shard(users):
+    assert db.session.query(User).count() == 10
+    assert count_rows(User) == [10] * SHARDS
+
+
+def test_meetings_are_stored_on_creator_shard(users):
+    shards = get_shards()
+    assert len({shards.index_for_user(user.id) for user in users}) == SHARDS
+    meetings = [create_meeting(creator=user, start=0, end=10, invitees=[users[0]]) for user in users for _ in range(2)]
+    assert len({meeting.id for meeting in meetings}) == len(meetings)
+    for meeting in meetings:
+        assert shards.index_for_meeting(meeting.id) == shards.index_for_user(meeting.creator_id)
+        assert get_meeting_by_id(meeting.id).creator.name == meeting.creator.name
+    assert sum(count_rows(Meeting)) == len(meetings)
+    assert sum(count_rows(Invitation)) == len(meetings)
+    assert db.session.query(Meeting).count() == 0
+
+
+def test_cross_shard_reads(users):
+    shards = get_shards()
+    other = next(user for user in users if shards.index_for_user(user.id) != shards.index_for_user(users[0].id))
+    own = create_meeting(creator=users[0], start=0, end=10)
+    invited = create_meeting(creator=other, start=20, end=30, invitees=[users[0]])
+    declined = create_meeting(creator=other, start=40, end=50, invitees=[users[0]])
+    set_answer_for_invitation(invitee=users[0], meeting=declined, answer=False)
+    meetings = get_all_meetings_for_several_users([users[0]], 0)
+    assert sorted(meeting.id for meeting in meetings) == sorted([own.id, invited.id])
+
+
+def test_stream_is_merged_across_shards(users):
+    for i, user in enumerate(users):
+        create_meeting(creator=user, start=100 - i * 10, end=200, invitees=[users[0]])
+    stream = stream_one_off_busy_intervals_for_several_users([users[0]], 0)
+    # the first meeting is both created by the user and the one they are invited to
+    assert [row.start for row in stream] == [100 - i * 10 for i in reversed(range(len(users)))] + [100]
+
+
+def test_most_active_users_are_counted_across_shards(users):
+    # every user creates one meeting on their own shard, all of them invite user1 and the first five invite user2
+    for i, user in enumerate(users):
+        create_meeting(creator=user, start=0, end=10, invitees=[users[0]] + ([users[1]] if i < 5 else []))
+    assert [user.name for user in get_most_active_users(2)] == ['user1', 'user2']
+
+
+def test_meeting_changes_have_a_sequence_per_shard(users):
+    shards = get_shards()
+    for user in users:
+        create_meeting(creator=user, start=0, end=10, invitees=[users[0]])
+    changes = get_meeting_changes_for_user(users[0], sync_token=None, limit=100)
+    assert sorted(meeting.creator_id for meeting in changes.meetings) == [user.id for user in users]
+    # one change per meeting on every shard
+    assert [seq for seq, _ in changes.sync_token] == count_rows(Meeting)
+    assert get_meeting_changes_for_user(users[0], sync_token=changes.sync_token, limit=100).meetings == []
+
+    meeting = next(meeting for meeting in changes.meetings if shards.index_for_meeting(meeting.id) == 1)
+    set_answer_for_invitation(invitee=users[0], meeting=get_meeting_by_id(meeting.id), answer=True)
+    later = get_meeting_changes_for_user(users[0], sync_token=changes.sync_token, limit=100)
+    assert [m.id for m in later.meetings] == [meeting.id]
+    assert later.sync_token[1] == (changes.sync_token[1][0] + 1, meeting.id)
+    assert later.sync_token[::2] == changes.sync_token[::2]
+
+
+def test_calendar_versions_are_bumped_on_the_shard_of_the_change(users):
+    shards = get_shards()
+    creator = next(user for user in users if shards.index_for_user(user.id) != shards.index_for_user(users[0].id))
+    meeting = create_meeting(creator=creator, start=0, end=10, invitees=[users[0]])
+    set_answer_for_invitation(invitee=users[0], meeting=get_meeting_by_id(meeting.id), answer=True)
+    create_meeting(creator=users[0], start=0, end=10)
+    versions = [
+        dict(session.query(User.id, User.calendar_version).filter(User.id.in_([creator.id, users[0].id])))
+        for session in [db.session] + shards.sessions()
+    ]
+    assert versions[0] == {creator.id: 0, users[0].id: 0}
+    assert versions[1 + shards.index_for_user(creator.id)] == {creator.id: 1, users[0].id: 2}
+    assert versions[1 + shards.index_for_user(users[0].id)] == {creator.id: 0, users[0].id: 1}
+    assert get_calendar_versions([users[0], creator]) == (3, 1)
+
+
+def test_events_are_logged_on_the_shard_of_the_change(sharded_app, users):
+    sharded_app.extensions['event_broker'].stream_timeout = 0
+    shards = get_shards()
+    creator = next(user for user in users if shards.index_for_user(user.id) != shards.index_for_user(users[0].id))
+    meeting = create_meeting(creator=creator, start=0, end=10, invitees=[users[0]])
+    create_meeting(creator=users[0], start=0, end=10)
+    assert db.session.query(Event).count() == 0
+    counts = [0] * SHARDS
+    counts[shards.index_for_user(creator.id)] = 2
+    counts[shards.index_for_user(users[0].id)] = 1
+    assert count_rows(Event) == counts
+
+    client = sharded_app.test_client()
+    headers = make_headers(name=users[0].name, password='')
+    url = '/users/{}/events'.format(users[0].name)
+    assert parse(client.get(url, headers=headers).data) == [{'retry': '1000'}]
+    messages = parse(client.get(url, query_string=dict(last_event_id='0.0.0'), headers=headers).data)[1:]
+    # the id of a message is the last event id of every shard, events of different shards are ordered by time
+    ids = [0] * SHARDS
+    ids[shards.index_for_user(creator.id)] = 2
+    ids[shards.index_for_user(users[0].id)] = 1
+    assert sorted(message['event'] for message in messages) == ['invited', 'meeting_created']
+    assert messages[-1]['id'] == '.'.join(map(str, ids))
+    invited = next(message for message in messages if message['event'] == 'invited')
+    assert invited['data'] == '{{"meeting_id": {}, "creator": "{}"}}'.format(meeting.id, creator.name)
+    set_answer_for_invitation(invitee=users[0], meeting=get_meeting_by_id(meeting.id), answer=True)
+    messages = parse(client.get(url, headers=dict(headers, **{'Last-Event-ID': messages[1]['id']})).data)[1:]
+    assert [message['event'] for message in messages] == ['invitation_answered']
+    assert client.get(url, headers=dict(headers, **{'Last-Event-ID': '0'})).status_code == 400
+
+
+def test_views(sharded_app, users):
+    client = sharded_app.test_client()
+    creator = next(user for user in users if get_shards().index_for_user(user.id) != get_shards().index_for_user(users[0].id))
+    response = client.post('/meetings', json=dict(
+        creator_username=creator.name, start='2022-06-22T10:00', end='2022-06-22T11:00',
+        invitees=users[0].name, is_private=True,
+    ), headers=make_headers(name=creator.name, password=''))
+    assert response.status_code == 200
+    meeting_id = response.json['meeting_id']
+
+    response = client.get('/users/{}/meetings'.format(users[0].name), query_string=dict(
+        start='2022-06-22T00:00', end='2022-06-23T00:00',
+    ), headers=make_headers(name=users[0].name, password=''))
+    assert [meeting['id'] for meeting in response.json['meetings']] == [meeting_id]
+    assert response.json['meetings'][0]['invitees'] == [dict(username=users[0].name, accepted_invitation=None)]
+
+    response = client.post('/invitations', json=dict(
+        username=users[0].name, meeting_id=meeting_id, answer=False,
+    ), headers=make_headers(name=users[0].name, password=''))
+    assert response.status_code == 200
+    find_query = dict(usernames='{},{}'.format(users[0].name, creator.name), window_size=3600, start='2022-06-22T10:00')
+    response = client.get('/find_free_window_for_users', query_string=find_query)
+    assert response.json['window']['start'] == '2022-06-22T11:00:00+00:00'
+    # the version is bumped on the shard of the creator, the cached search is not used
+    create_meeting(
+        creator=creator,
+        start=datetime(2022, 6, 22, 11, tzinfo=timezone.utc),
+        end=datetime(2022, 6, 22, 12, tzinfo=timezone.utc),
+    )
+    response = client.get('/find_free_window_for_users', query_string=find_query)
+    assert response.json['window']['start'] == '2022-06-22T12:00:00+00:00'
+
+
+def test_seed(sharded_app):
+    users, meetings, invitations = generate(SeedConfig(users=20, meetings=300))
+    shards = get_shards()
+    assert sum(count_rows(Meeting)) == 300
+    assert sum(count_rows(Invitation)) == invitations
+    for index, session in enumerate(shards.sessions()):
+        for meeting in session.query(Meeting):
+            assert shards.index_for_meeting(meeting.id) == index
+            assert shards.index_for_user(meeting.creator_id) == index
+        assert session.query(Invitation).join(Invitation.meeting).count() == session.query(Invitation).count()
+
+    user = db.session.query(User).first()
+    meeting = create_meeting(creator=user, start=0, end=10)
+    assert shards.index_for_meeting(meeting.id) == shards.index_for_user(user.id)
+    assert sum(count_rows(Meeting)) == 301
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import logging
+
+import pytest
+from sqlalchemy import text
+
+from app import (
+    create_app,
+    db,
+)
+from app.db_actions import (
+    create_meeting,
+    create_user,
+)
+
+
+@pytest.fixture()
+def traced_app():
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'CREATE_SCHEMA_ON_STARTUP': True,
+        'SLOW_QUERY_THRESHOLD': 0,
+        'SLOW_QUERY_EXPLAIN': True,
+        'REPEATED_QUERY_THRESHOLD': 2,
+    })
+    with app.app_context():
+        yield app
+
+
+def test_slow_queries_are_logged_with_plan(traced_app, caplog):
+    create_user('user1', password='')
+    caplog.clear()
+    with caplog.at_level(logging.WARNING, logger='app.sql_tracing'):
+        traced_app.test_client().get('/meetings/1')
+    messages = [record.getMessage() for record in caplog.records]
+    assert len(messages) == 1
+    assert messages[0].startswith('Slow query took ')
+    assert 'FROM meetings' in messages[0]
+    assert 'parameters: (1, 1, 0)' in messages[0]
+    assert 'SEARCH meetings USING INTEGER PRIMARY KEY' in messages[0]
+
+
+def test_repeated_statements_are_logged(traced_app, caplog):
+    user = create_user('user1', password='')
+    invitees = [create_user('invitee{}'.format(i), password='') for i in range(3)]
+    create_meeting(creator=user, start=0, end=10, invitees=invitees)
+    traced_app.extensions['slow_query_log'].threshold = 1000
+    caplog.clear()
+    with caplog.at_level(logging.WARNING, logger='app.sql_tracing'):
+        traced_app.test_client().get('/meetings/1')
+    messages = [record.getMessage() for record in caplog.records]
+    assert len(messages) == 1
+    assert messages[0].startswith('Statement executed 4 times during GET /meetings/1 (6 statements in total)')
+
+
+def test_fast_queries_are_not_logged(client, caplog):
+    with caplog.at_level(logging.WARNING, logger='app.sql_tracing'):
+        client.get('/meetings/1')
+    assert caplog.records == []
+
+
+def test_sql_tracing_can_be_disabled():
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'CREATE_SCHEMA_ON_STARTUP': True, 'SLOW_QUERY_THRESHOLD': None})
+    assert 'slow_query_log' not in app.extensions
+
+
+def test_replica_and_shard_queries_are_traced(tmp_path, caplog):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'CREATE_SCHEMA_ON_STARTUP': True,
+        'READ_REPLICA_DATABASE_URI': 'sqlite:///{}'.format(tmp_path / 'replica.db'),
+        'SHARD_DATABASE_URIS': ['sqlite:///{}'.format(tmp_path / 'shard{}.db'.format(i)) for i in range(2)],
+        'SLOW_QUERY_THRESHOLD': 0,
+    })
+    with app.app_context():
+        engines = [db.get_engine(), db.get_engine(bind='replica')] + app.extensions['shards'].engines
+        with caplog.at_level(logging.WARNING, logger='app.sql_tracing'):
+            for engine in engines:
+                with engine.connect() as connection:
+                    connection.execute(text('SELECT 1'))
+    assert [record.getMessage().startswith('Slow query took ') for record in caplog.records] == [True] * 4
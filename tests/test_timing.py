@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+
+from app import (
+    create_app,
+    request_stats,
+)
+from app.db_actions import create_user
+
+
+def parse_server_timing(header: str) -> dict[str, float]:
+    durations = {}
+    for part in header.split(', '):
+        name, duration = part.split(';dur=')
+        durations[name] = float(duration)
+    return durations
+
+
+def test_server_timing_header(client, caplog):
+    create_user('user1', password='')
+    with caplog.at_level(logging.INFO, logger='app.timing'):
+        response = client.get(
+            '/find_free_window_for_users',
+            query_string=dict(usernames='user1', window_size=3600, start='2022-06-22T00:00+00:00'),
+        )
+    assert response.status_code == 200
+    durations = parse_server_timing(response.headers['Server-Timing'])
+    assert list(durations) == ['validation', 'auth', 'db', 'expansion', 'serialization', 'sql', 'total']
+    assert durations['validation'] > 0
+    assert durations['auth'] == 0
+    assert durations['db'] > 0
+    assert durations['total'] >= sum(durations[name] for name in ('validation', 'db', 'expansion', 'serialization'))
+
+    record = json.loads(caplog.records[-1].getMessage())
+    assert record['endpoint'] == 'find_free_window'
+    assert record['status'] == 200
+    assert record['sql_statements'] == 4  # users, repeated meetings and the two streams of one-off ones
+    assert record['db_ms'] == round(durations['db'], 3)
+
+
+def test_stages_are_exclusive(app, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr('app.request_stats.time.perf_counter', lambda: now[0])
+    with app.test_request_context():
+        request_stats.reset()
+        with request_stats.stage('auth'):
+            now[0] += 1
+            with request_stats.stage('db'):
+                now[0] += 2
+            now[0] += 4
+        with request_stats.stage('db'):
+            now[0] += 8
+        assert request_stats.get_timings() == {'auth': 5, 'db': 10}
+
+
+def test_stages_outside_of_request():
+    with request_stats.stage('db'):
+        pass
+    assert request_stats.get_timings() == {}
+
+
+def test_server_timing_can_be_disabled():
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'CREATE_SCHEMA_ON_STARTUP': True, 'SERVER_TIMING_ENABLED': False})
+    assert 'Server-Timing' not in app.test_client().get('/ping').headers
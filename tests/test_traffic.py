@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import json
+
+from flask import Flask
+import pytest
+
+from app import create_app
+from app.db_actions import create_user
+from app.traffic import (
+    make_http_sender,
+    make_in_process_sender,
+    read_records,
+    replay,
+)
+
+from tests.utils import make_headers
+
+
+@pytest.fixture()
+def capturing_app(tmp_path) -> Flask:
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'CREATE_SCHEMA_ON_STARTUP': True,
+        'CAPTURE_FILE': str(tmp_path / 'capture.jsonl'),
+        'CAPTURE_AUTHORIZATION': True,
+    })
+    with app.app_context():
+        yield app
+    app.extensions['traffic_capture'].close()
+
+
+def test_capture(capturing_app: Flask, tmp_path):
+    client = capturing_app.test_client()
+    client.post('/users', json=dict(username='user1', password='pwd'))
+    client.get(
+        '/users/user1/meetings',
+        query_string=dict(start='2022-06-22T10:00', end='2022-06-23T10:00'),
+        headers=make_headers('user1', 'pwd'),
+    )
+    client.get('/meetings/100')
+
+    with open(tmp_path / 'capture.jsonl') as f:
+        records = read_records(f)
+    assert [(r['method'], r['path'], r['endpoint'], r['status']) for r in records] == [
+        ('POST', '/users', 'users', 200),
+        ('GET', '/users/user1/meetings', 'user_meetings', 200),
+        ('GET', '/meetings/100', 'get_meeting', 404),
+    ]
+    assert records[0]['json'] == dict(username='user1', password='pwd')
+    assert records[1]['args'] == dict(start=['2022-06-22T10:00'], end=['2022-06-23T10:00'])
+    assert records[1]['authorization'] == make_headers('user1', 'pwd')['Authorization']
+    assert 'authorization' not in records[0]
+    assert all(r['duration_ms'] >= 0 for r in records)
+
+
+def test_credentials_are_not_captured_by_default(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'CREATE_SCHEMA_ON_STARTUP': True,
+        'CAPTURE_FILE': str(tmp_path / 'capture.jsonl'),
+    })
+    with app.app_context():
+        client = app.test_client()
+        client.post('/users', json=dict(username='user1', password='secret'))
+        client.get('/meetings/1', headers=make_headers('user1', 'secret'))
+    app.extensions['traffic_capture'].close()
+
+    with open(tmp_path / 'capture.jsonl') as f:
+        content = f.read()
+    assert 'secret' not in content
+    records = read_records(content.splitlines())
+    assert records[0]['json'] == dict(username='user1', password='redacted')
+    assert 'authorization' not in records[1]
+
+
+def test_capture_is_off_by_default(app: Flask):
+    assert 'traffic_capture' not in app.extensions
+
+
+RECORDS = [
+    dict(method='GET', path='/ping', endpoint='ping', args={}, json=None),
+    dict(method='GET', path='/ping', endpoint='ping', args={}, json=None),
+    dict(method='GET', path='/meetings/1', endpoint='get_meeting', args={}, json=None),
+    dict(method='POST', path='/users', endpoint='users', args={}, json=dict(username='replayed', password='pwd')),
+]
+
+
+def test_replay_in_process(app: Flask):
+    report = replay(RECORDS, make_in_process_sender(app), concurrency=2, rate=1000)
+    assert [(r['endpoint'], r['requests'], r['client_error_rate'], r['error_rate']) for r in report] == [
+        ('GET get_meeting', 1, 1.0, 0.0),
+        ('GET ping', 2, 0.0, 0.0),
+        ('POST users', 1, 0.0, 0.0),
+    ]
+    assert all(r['p50_ms'] <= r['p90_ms'] <= r['p99_ms'] for r in report)
+
+
+def test_replay_http_unreachable():
+    [report] = replay(RECORDS[:2], make_http_sender('http://127.0.0.1:9', timeout=1))
+    assert report['error_rate'] == 1.0
+
+
+def test_replay_command(app: Flask, tmp_path):
+    create_user('user1', password='')
+    capture_file = tmp_path / 'capture.jsonl'
+    capture_file.write_text(''.join(json.dumps(r) + '\n' for r in RECORDS))
+    result = app.test_cli_runner().invoke(args=['replay', str(capture_file), '--concurrency', '2'])
+    assert result.exit_code == 0, result.output
+    assert [json.loads(line)['endpoint'] for line in result.output.splitlines()] == [
+        'GET get_meeting', 'GET ping', 'POST users',
+    ]
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+
+import pytest
+
+from app import create_app
+from app.db_actions import (
+    create_meeting,
+    create_user,
+)
+from app.recurrence import compile_rule
+from app.types import RepeatTypeEnum
+from app.warmup import Warmup
+
+
+@pytest.fixture()
+def config(tmp_path) -> dict:
+    # warm-up runs in its own app context, so the database is a file shared by all connections
+    config = {'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///{}'.format(tmp_path / 'app.db')}
+    app = create_app(dict(config, CREATE_SCHEMA_ON_STARTUP=True))
+    with app.app_context():
+        user1 = create_user('user1', password='')
+        user2 = create_user('user2', password='')
+        create_meeting(
+            creator=user1, start=0, end=1800, invitees=[user2],
+            repeat_type=RepeatTypeEnum.custom, recurrence_rule='FREQ=WEEKLY;BYDAY=MO,WE',
+        )
+        create_meeting(creator=user2, start=10 ** 10, end=10 ** 10 + 1800)
+    return config
+
+
+def test_ready_without_warmup(config):
+    response = create_app(config).test_client().get('/ready')
+    assert response.status_code == 200
+    assert response.json == dict(status='ok')
+
+
+def test_warmup(config, caplog):
+    compile_rule.cache_clear()
+    with caplog.at_level(logging.INFO, logger='app.warmup'):
+        app = create_app(dict(config, WARMUP_ENABLED=True, WARMUP_IN_BACKGROUND=False))
+    warmup = app.extensions['warmup']
+    assert warmup.ready.is_set()
+    assert warmup.duration is not None
+    assert [record.levelname for record in caplog.records] == ['INFO']
+    assert compile_rule.cache_info().currsize == 1
+    assert app.test_client().get('/ready').status_code == 200
+
+
+def test_ready_waits_for_background_warmup(config, monkeypatch):
+    release = threading.Event()
+    original = Warmup._run_queries
+
+    def run_queries(self):
+        release.wait(5)
+        original(self)
+    monkeypatch.setattr(Warmup, '_run_queries', run_queries)
+
+    app = create_app(dict(config, WARMUP_ENABLED=True))
+    client = app.test_client()
+    assert client.get('/ping').status_code == 200
+    response = client.get('/ready')
+    assert response.status_code == 503
+    assert response.json == dict(status='error', error='warming up')
+
+    release.set()
+    app.extensions['warmup'].join(5)
+    assert client.get('/ready').status_code == 200
+
+
+def test_failed_warmup_is_logged(tmp_path, caplog):
+    # there are no tables
+    with caplog.at_level(logging.INFO, logger='app.warmup'):
+        app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///{}'.format(tmp_path / 'app.db'),
+            'WARMUP_ENABLED': True,
+            'WARMUP_IN_BACKGROUND': False,
+        })
+    assert caplog.records[0].getMessage() == 'Warm-up failed'
+    assert app.test_client().get('/ready').status_code == 200
@@ -17,3 +17,13 @@ def make_headers(name: str, password: str) -> dict[str, str]:
     return {
         'Authorization': make_auth_header(name, password)
     }
+
+
+class Clock:
+    # time.monotonic() which moves by a second every time it is read
+    def __init__(self):
+        self.now = 0
+
+    def monotonic(self) -> float:
+        self.now += 1
+        return self.now
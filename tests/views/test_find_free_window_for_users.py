@@ -130,4 +130,112 @@ class TestFindFreeWindowForUsersView:
                 'start': '2022-06-22T11:30+00:00'
             })
         assert response.status_code == 404
-        assert response.json == {'error': 'Impossible to find window for meeting', 'status': 'error'}
+        assert response.json == {
+            'error': 'Impossible to find window for meeting',
+            'status': 'error',
+            'search': {
+                'result': 'horizon_reached',
+                'searched_until': '2032-06-19T23:30:00+00:00',
+                'occurrences_checked': 3651,
+            },
+        }
+
+    def test_no_window_within_horizon(self):
+        response = self.client.get(
+            'find_free_window_for_users',
+            query_string={
+                'usernames': 'creator3',
+                'window_size': 60*60,
+                'start': '2022-06-22T11:30+00:00',
+                'horizon': 60*60*24*2,
+            })
+        assert response.status_code == 404
+        assert response.json['search'] == {
+            'result': 'horizon_reached',
+            'searched_until': '2022-06-24T23:30:00+00:00',
+            'occurrences_checked': 3,
+        }
+
+    def test_budget_exhausted(self, app):
+        app.config['FREE_WINDOW_EXPANSION_BUDGET'] = 10
+        response = self.client.get(
+            'find_free_window_for_users',
+            query_string={
+                'usernames': 'creator3',
+                'window_size': 60*60,
+                'start': '2022-06-22T11:30+00:00'
+            })
+        assert response.status_code == 200
+        assert response.json == {
+            'status': 'partial',
+            'searched_until': '2022-07-01T23:30:00+00:00',
+            'search': {
+                'result': 'budget_exhausted',
+                'searched_until': '2022-07-01T23:30:00+00:00',
+                'occurrences_checked': 10,
+            },
+        }
+
+    def test_window_within_budget(self, app):
+        app.config['FREE_WINDOW_EXPANSION_BUDGET'] = 4
+        response = self.client.get(
+            'find_free_window_for_users',
+            query_string={
+                'usernames': 'creator1,creator2',
+                'window_size': 60*60,
+                'start': '2022-06-22T11:30+00:00'
+            })
+        assert response.status_code == 200
+        assert response.json['window']['start'] == '2022-06-22T17:00:00+00:00'
+
+    def test_optional_attendees(self):
+        response = self.client.get(
+            'find_free_window_for_users',
+            query_string={
+                'usernames': 'creator1',
+                'optional_usernames': 'creator3',
+                'window_size': 60*60,
+                'start': '2022-06-22T11:30+00:00',
+                'horizon': 60*60*24*2,
+            })
+        assert response.status_code == 200
+        assert response.json == {
+            'status': 'ok',
+            'window': {
+                'start': '2022-06-22T15:00:00+00:00',
+                'end': '2022-06-22T16:00:00+00:00',
+            },
+            'unavailable': ['creator3'],
+        }
+
+    def test_min_attendees(self):
+        response = self.client.get(
+            'find_free_window_for_users',
+            query_string={
+                'usernames': 'creator1',
+                'optional_usernames': 'creator2,creator3',
+                'min_attendees': 2,
+                'window_size': 60*60,
+                'start': '2022-06-22T11:30+00:00',
+            })
+        assert response.status_code == 200
+        assert response.json['window']['start'] == '2022-06-22T17:00:00+00:00'
+        assert response.json['unavailable'] == ['creator3']
+
+    def test_min_attendees_not_reachable(self):
+        response = self.client.get(
+            'find_free_window_for_users',
+            query_string={
+                'usernames': 'creator3',
+                'optional_usernames': 'creator1',
+                'min_attendees': 2,
+                'window_size': 60*60,
+                'start': '2022-06-22T11:30+00:00',
+                'horizon': 60*60*24*2,
+            })
+        assert response.status_code == 404
+        assert response.json['search'] == {
+            'result': 'horizon_reached',
+            'searched_until': '2022-06-24T11:30:00+00:00',
+            'occurrences_checked': 6,
+        }
@@ -60,6 +60,15 @@ class TestMeetingsPostView:
         assert meeting.repeat_type == 'none'
         assert meeting.is_private is False
 
+    def test_not_existing_invitees(self):
+        response = self.client.post(
+            '/meetings',
+            json=dict(self.default_args, invitees='invitee1,unknown1,invitee2,unknown2'),
+            headers=self.headers,
+        )
+        assert response.status_code == 404
+        assert response.json == {'status': 'error', 'error': 'Users "unknown1", "unknown2" do not exist'}
+
     def test_not_authenticated(self):
         response = self.client.post('/meetings', json=self.default_args)
         assert response.status_code == 401
@@ -123,6 +132,26 @@ class TestMeetingsPostView:
         assert response.json == {'status': 'ok', 'meeting_id': 1}
         assert get_meeting_by_id(1).repeat_type == 'daily'
 
+    def test_ok_with_recurrence_rule(self):
+        response = self.client.post(
+            '/meetings',
+            json=dict(self.default_args, repeat_type='custom', recurrence_rule='freq=weekly;byday=mo,we'),
+            headers=self.headers,
+        )
+        assert response.status_code == 200
+        assert response.json == {'status': 'ok', 'meeting_id': 1}
+        assert get_meeting_by_id(1).repeat_type == 'custom'
+        assert get_meeting_by_id(1).recurrence_rule == 'FREQ=WEEKLY;BYDAY=MO,WE'
+
+    def test_invalid_recurrence_rule(self):
+        response = self.client.post(
+            '/meetings',
+            json=dict(self.default_args, repeat_type='custom', recurrence_rule='FREQ=WEEKLY;BYDAY=XX'),
+            headers=self.headers,
+        )
+        assert response.status_code == 400
+        assert response.json == {'status': 'error', 'error': {'recurrence_rule': ['malformed BYDAY value "XX"']}}
+
     def test_nonexistent_username(self):
         response = self.client.post('/meetings', json=dict(self.default_args, creator_username='FOO'))
         assert response.status_code == 404
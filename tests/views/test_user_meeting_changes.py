@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+from flask import Flask
+from flask.testing import FlaskClient
+import pytest
+
+from app.db_actions import (
+    create_meeting,
+    create_user,
+)
+
+from tests.utils import make_headers
+
+
+@pytest.fixture(autouse=True)
+def prepare(app: Flask):
+    user1 = create_user('user1', password='')
+    user2 = create_user('user2', password='')
+    create_meeting(creator=user1, start=0, end=3600, invitees=[user2], description='public')
+    create_meeting(creator=user2, start=0, end=3600, description='private', is_private=True)
+    create_meeting(creator=user2, start=0, end=3600, invitees=[user1], description='private', is_private=True)
+
+
+def test_sync(client: FlaskClient):
+    response = client.get('/users/user1/meetings/changes', headers=make_headers(name='user1', password=''))
+    assert response.status_code == 200
+    assert response.json['status'] == 'ok'
+    assert [meeting['id'] for meeting in response.json['meetings']] == [1, 3]
+    assert response.json['meetings'][1]['description'] == 'private'
+    assert response.json['sync_token'] == '3_3'
+    assert response.json['more'] is False
+
+    response = client.post(
+        '/invitations', json=dict(username='user1', meeting_id=3, answer=True),
+        headers=make_headers(name='user1', password=''),
+    )
+    assert response.status_code == 200
+    response = client.get('/users/user1/meetings/changes', query_string=dict(sync_token='3_3'))
+    assert [meeting['id'] for meeting in response.json['meetings']] == [3]
+    assert 'description' not in response.json['meetings'][0]  # not authenticated
+    assert response.json['sync_token'] == '4_3'
+
+
+def test_empty_sync_token_is_a_full_sync(client: FlaskClient):
+    response = client.get('/users/user1/meetings/changes', query_string=dict(sync_token=''))
+    assert response.status_code == 200
+    assert [meeting['id'] for meeting in response.json['meetings']] == [1, 3]
+
+
+@pytest.mark.parametrize('sync_token, error', [
+    ('abc_1', {'sync_token': ['value is not a valid integer']}),
+    ('-1_1', {'sync_token': ['ensure this value is greater than or equal to 0']}),
+    ('1', {'sync_token': ['wrong tuple length 1, expected 2']}),
+    ('1_1.2_2', 'sync_token is not valid, sync again without it'),
+])
+def test_wrong_sync_token(client: FlaskClient, sync_token: str, error):
+    response = client.get('/users/user1/meetings/changes', query_string=dict(sync_token=sync_token))
+    assert response.status_code == 400
+    assert response.json == dict(status='error', error=error)
+
+
+def test_not_existing_user(client: FlaskClient):
+    response = client.get('/users/nobody/meetings/changes')
+    assert response.status_code == 404